@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Concurrency benchmark of the async read views against their sync DRF equivalents under uvicorn.
+
+Usage (from the project root, with the requirements installed):
+
+    python scripts/bench_async_views.py [--requests 2000] [--concurrency 64] [--port 8765]
+
+Creates a throwaway SQLite database in a temp dir (migrations + one order, stock rows and an
+admin token), starts `uvicorn` (one worker) on this module, which serves the normal URLs plus
+/bench/sync/... copies of the same reads as sync DRF views, and fires keep-alive HTTP/1.1
+requests from `--concurrency` connections per endpoint. Prints requests/s and p50/p95 latency.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / 'src'
+
+
+def _configure(db_path):
+    sys.path.insert(0, str(SRC))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'memory_box.settings')
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.ROOT_URLCONF = __name__
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['*']
+    import django
+    django.setup()
+
+
+urlpatterns = []
+
+if os.environ.get('BENCH_DB') and os.environ.get('BENCH_SERVE'):
+    # Imported by uvicorn: serve the project URLs plus the sync copies.
+    _configure(os.environ['BENCH_DB'])
+    from django.core.asgi import get_asgi_application
+    from django.urls import include, path
+    from rest_framework.permissions import IsAuthenticated
+    from rest_framework.response import Response
+    from rest_framework.views import APIView
+
+    from config.views import HomeBackgroundSettingsView, PricesSettingsView
+    from orders.models import Stock
+    from orders.serializers import StockSerializer
+    from orders.views import OrderViewSet
+
+    class SyncStockListView(APIView):
+        permission_classes = [IsAuthenticated]
+
+        def get(self, request):
+            return Response(StockSerializer(Stock.objects.order_by('variant', 'box_type'), many=True).data)
+
+    urlpatterns = [
+        path('bench/sync/settings/prices/', PricesSettingsView.as_view()),
+        path('bench/sync/settings/home-background/', HomeBackgroundSettingsView.as_view()),
+        path('bench/sync/orders/<int:pk>/', OrderViewSet.as_view({'get': 'retrieve'})),
+        path('bench/sync/stock/', SyncStockListView.as_view()),
+        path('', include('memory_box.urls')),
+    ]
+    application = get_asgi_application()
+
+
+def _seed(db_path):
+    _configure(db_path)
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from config.views import get_settings
+    from orders.models import Order
+    from users.models import AdminUser
+    get_settings()
+    order = Order.objects.create(client_name='bench', box_type='no_light', variant='wood')
+    user = AdminUser.objects.create_user('bench', 'bench@example.com', 'bench')
+    return order.id, str(RefreshToken.for_user(user).access_token)
+
+
+async def _worker(port, path, headers, count, latencies):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    request = f'GET {path} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n'.encode()
+    try:
+        for _ in range(count):
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            status = int(head.split(b' ', 2)[1])
+            if status != 200:
+                raise RuntimeError(f'{path}: HTTP {status}')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        writer.close()
+
+
+async def _run(port, path, headers, total, concurrency):
+    latencies = []
+    per_worker = max(1, total // concurrency)
+    started = time.perf_counter()
+    await asyncio.gather(*(_worker(port, path, headers, per_worker, latencies) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def _wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            asyncio.run(_run(port, '/api/settings/prices/', '', 1, 1))
+            return
+        except (OSError, RuntimeError, asyncio.IncompleteReadError):
+            time.sleep(0.2)
+    raise SystemExit('uvicorn did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint (default 2000).')
+    parser.add_argument('--concurrency', type=int, default=64, help='Open connections (default 64).')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench-async-')
+    db_path = os.path.join(tmp, 'db.sqlite3')
+    order_id, token = _seed(db_path)
+    auth = f'Authorization: Bearer {token}\r\n'
+    cases = [
+        ('settings/prices', '/api/settings/prices/', '/bench/sync/settings/prices/', ''),
+        ('settings/home-background', '/api/settings/home-background/', '/bench/sync/settings/home-background/', ''),
+        ('orders/<id>', f'/api/orders/{order_id}/', f'/bench/sync/orders/{order_id}/', ''),
+        ('stock (auth)', '/api/stock/', '/bench/sync/stock/', auth),
+    ]
+
+    env = {**os.environ, 'BENCH_DB': db_path, 'BENCH_SERVE': '1', 'PYTHONPATH': str(SRC)}
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', '--app-dir', str(Path(__file__).parent), '--port', str(args.port),
+         '--log-level', 'warning', '--no-access-log', 'bench_async_views:application'],
+        env=env,
+    )
+    try:
+        _wait_for(args.port)
+        print(f'{args.requests} requests per endpoint, {args.concurrency} connections, 1 uvicorn worker')
+        print(f'{"endpoint":<26} {"view":<6} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8}')
+        for name, async_path, sync_path, headers in cases:
+            for label, path in (('sync', sync_path), ('async', async_path)):
+                asyncio.run(_run(args.port, path, headers, min(200, args.requests), args.concurrency))  # warm-up
+                result = asyncio.run(_run(args.port, path, headers, args.requests, args.concurrency))
+                print(f'{name:<26} {label:<6} {result["rps"]:>8.0f} {result["p50"]:>8.1f} {result["p95"]:>8.1f}')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
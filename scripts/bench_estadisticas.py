@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+Benchmark of EstadisticasView.build on a large order history.
+
+Usage (from the project root, with the requirements installed):
+
+    python scripts/bench_estadisticas.py [--orders 100000] [--years 2] [--repeat 5]
+
+Creates a throwaway SQLite database in a temp dir, inserts ``--orders`` orders spread over
+``--years`` (about half of them sales with snapshots), rebuilds the SalesDaily rollup and times
+build() for several (days, months) windows: best of ``--repeat`` runs, with the query count.
+Then times a full GET through the response cache (miss, hit and 304).
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / 'src'
+
+
+def _configure(db_path):
+    sys.path.insert(0, str(SRC))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'memory_box.settings')
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['*']
+    import django
+    django.setup()
+
+
+def _seed(count, years):
+    from django.core.management import call_command
+    from django.utils import timezone
+    from config.views import get_settings
+    from orders.models import Order, OrderStatus
+
+    call_command('migrate', verbosity=0)
+    site = get_settings()
+    site.price_sin_luz, site.price_con_luz, site.price_pilas = 20000, 30000, 1500
+    site.save()
+
+    rng = random.Random(7)
+    now = timezone.now()
+    span = 60 * 24 * 365 * years
+    statuses = [OrderStatus.PROCESSING, OrderStatus.DELIVERED, OrderStatus.DRAFT, OrderStatus.IN_PROGRESS]
+    batch = []
+    for i in range(count):
+        created = now - timedelta(minutes=rng.randint(0, span))
+        status = rng.choice(statuses)
+        order = Order(
+            client_name=f'bench {i}', box_type=rng.choice(['no_light', 'with_light']),
+            variant=rng.choice(['wood', 'black', 'graphite', 'marble']), status=status,
+        )
+        if status in (OrderStatus.PROCESSING, OrderStatus.DELIVERED):
+            order.finalized_at = created + timedelta(hours=rng.randint(1, 72))
+            if rng.random() < 0.9:
+                order.price_snapshot = {'precio_venta': 20000 if order.box_type == 'no_light' else 31500}
+                order.sale_price = order.price_snapshot['precio_venta']
+            if rng.random() < 0.9:
+                total = rng.randint(3000, 9000)
+                order.cost_snapshot = {'cost_caja': total * 0.6, 'cost_pla': total * 0.3,
+                                       'cost_empaque': total * 0.1, 'cost_troqueles': 0, 'total': total}
+                order.production_cost = total
+        batch.append(order)
+        if len(batch) == 5000:
+            Order.objects.bulk_create(batch)
+            batch = []
+    Order.objects.bulk_create(batch)
+    # bulk_create no dispara las señales del rollup.
+    call_command('rebuild_sales_rollup', stdout=io.StringIO())
+
+
+def _time_build(days, months, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from orders.views import EstadisticasView
+
+    today = timezone.localdate()
+    best = None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            data = EstadisticasView().build(days, months, today)
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, len(queries), data['summary']['cantidad_ventas']
+
+
+def _time_request(token, repeat):
+    from django.core.cache import cache
+    from django.test import Client
+
+    client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+    url = '/api/estadisticas/?days=30&months=12'
+    results = {}
+    cache.clear()
+    started = time.perf_counter()
+    response = client.get(url)
+    results['miss'] = (time.perf_counter() - started) * 1000
+    etag = response['ETag']
+    for label, headers in (('hit', {}), ('304', {'HTTP_IF_NONE_MATCH': etag})):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            client.get(url, **headers)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = best * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--orders', type=int, default=100000, help='Orders to generate (default 100000).')
+    parser.add_argument('--years', type=int, default=2, help='Years of history (default 2).')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per case; the best is reported (default 5).')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='bench-stats-'), 'db.sqlite3')
+    _configure(db_path)
+    started = time.perf_counter()
+    _seed(args.orders, args.years)
+    print(f'{args.orders} orders over {args.years} years, seeded in {time.perf_counter() - started:.1f}s')
+
+    print(f'{"days":>5} {"months":>6} {"sales":>7} {"queries":>7} {"build ms":>9}')
+    for days, months in ((30, 12), (90, 12), (365, 24)):
+        ms, queries, sales = _time_build(days, months, args.repeat)
+        print(f'{days:>5} {months:>6} {sales:>7} {queries:>7} {ms:>9.1f}')
+
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from users.models import AdminUser
+    user = AdminUser.objects.create_user('bench', 'bench@example.com', 'bench')
+    request = _time_request(str(RefreshToken.for_user(user).access_token), args.repeat)
+    print('GET days=30: ' + ', '.join(f'{label} {ms:.1f} ms' for label, ms in request.items()))
+
+
+if __name__ == '__main__':
+    main()
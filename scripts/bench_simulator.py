@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Benchmark of the vectorized what-if simulator (orders.simulator) against a per-order Python loop.
+
+Usage (from the project root, with the requirements installed):
+
+    python scripts/bench_simulator.py [--orders 20000] [--scenarios 100 1000 10000] [--loop-scenarios 20]
+
+Creates a throwaway SQLite database in a temp dir with ``--orders`` sales over the last 3 years,
+loads the history once and, for each grid size, times simulator.evaluate on the 365-day window.
+The loop version prices and costs every order of the window for every scenario, with the same
+rounding as CostModel._compute, over ``--loop-scenarios`` scenarios (it is too slow for more);
+its margins are checked against the vectorized ones. Prints scenarios/s for both.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / 'src'
+
+
+def _configure(db_path):
+    sys.path.insert(0, str(SRC))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'memory_box.settings')
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = db_path
+    settings.DEBUG = False
+    import django
+    django.setup()
+
+
+def _seed(count):
+    from django.core.management import call_command
+    from django.utils import timezone
+    from config.views import get_settings
+    from orders.models import Order, OrderStatus
+
+    call_command('migrate', verbosity=0)
+    site = get_settings()
+    site.price_sin_luz, site.price_con_luz, site.price_pilas = 20000, 30000, 1500
+    site.save()
+
+    rng = random.Random(7)
+    now = timezone.now()
+    batch = []
+    for i in range(count):
+        box_type = rng.choice(['no_light', 'with_light'])
+        batch.append(Order(
+            client_name=f'bench {i}', box_type=box_type,
+            variant=rng.choice(['wood', 'black', 'graphite', 'marble']),
+            status=rng.choice([OrderStatus.PROCESSING, OrderStatus.DELIVERED]),
+            finalized_at=now - timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 3)),
+            sale_price=20000 if box_type == 'no_light' else 31500,
+            production_cost=rng.randint(3000, 9000),
+        ))
+        if len(batch) == 5000:
+            Order.objects.bulk_create(batch)
+            batch = []
+    Order.objects.bulk_create(batch)
+
+
+def _grid(size):
+    """Escenarios variando precio sin luz y costo por gramo, ``size`` en total."""
+    side = max(1, int(math.sqrt(size)))
+    return [
+        {'price_sin_luz': 18000 + 50 * i, 'pla_cost_per_gram': 10 + 0.5 * j, 'cost_empaque': 700}
+        for i in range(math.ceil(size / side)) for j in range(side)
+    ][:size]
+
+
+def _loop_margins(orders, scenarios, base):
+    """Margen total por escenario, pedido por pedido."""
+    margins = []
+    for scenario in scenarios:
+        params = {**base, **scenario}
+        fixed = math.ceil(params['cost_empaque']) + math.ceil(params['cost_troqueles'])
+        total = 0.0
+        for with_light, pla_key, grams in orders:
+            if with_light:
+                price = params['price_con_luz'] + params['price_pilas']
+                cost = math.ceil(params['cost_con_luz']) + fixed
+            else:
+                price = params['price_sin_luz']
+                per_gram = params['pla_cost_per_gram']
+                if isinstance(per_gram, dict):
+                    per_gram = per_gram.get(pla_key)
+                cost = fixed
+                if pla_key is not None and grams > 0 and per_gram is not None:
+                    cost += math.ceil(per_gram * params['pla_cost_factor'] * grams)
+            total += price - cost
+        margins.append(total)
+    return margins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--orders', type=int, default=20000, help='Sales to generate (default 20000).')
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[100, 1000, 10000], help='Grid sizes.')
+    parser.add_argument('--loop-scenarios', type=int, default=20, help='Scenarios for the loop version (default 20).')
+    parser.add_argument('--days', type=int, default=365, help='Simulation window (default 365).')
+    args = parser.parse_args()
+
+    _configure(os.path.join(tempfile.mkdtemp(prefix='bench-sim-'), 'db.sqlite3'))
+    _seed(args.orders)
+    from orders import simulator
+
+    started = time.perf_counter()
+    full = simulator.SalesHistory.load()
+    load_ms = (time.perf_counter() - started) * 1000
+    window_ms = None
+    for _ in range(5):
+        started = time.perf_counter()
+        history = full.window(args.days)
+        elapsed = (time.perf_counter() - started) * 1000
+        window_ms = elapsed if window_ms is None else min(window_ms, elapsed)
+    base = simulator.current_params(history)
+    print(f'{full.finalized.size} sales loaded in {load_ms:.0f} ms (one copy for {simulator.MAX_WINDOW_DAYS} days); '
+          f'{args.days}-day window: {history.size} orders, {len(history.counts)} groups, sliced in {window_ms:.1f} ms')
+
+    print(f'{"version":<11} {"scenarios":>9} {"ms":>9} {"scenarios/s":>12}')
+    for size in args.scenarios:
+        scenarios = _grid(size)
+        started = time.perf_counter()
+        simulator.evaluate(history, scenarios, base)
+        elapsed = time.perf_counter() - started
+        print(f'{"vectorized":<11} {len(scenarios):>9} {elapsed * 1000:>9.1f} {len(scenarios) / elapsed:>12.0f}')
+
+    scenarios = _grid(args.loop_scenarios)
+    variants = history.pla_variants
+    orders = [
+        (bool(light), variants[index] if index >= 0 else None, float(grams))
+        for light, index, grams in zip(
+            history.g_with_light[history.group_of], history.g_pla_index[history.group_of],
+            history.g_grams[history.group_of],
+        )
+    ]
+    started = time.perf_counter()
+    loop = _loop_margins(orders, scenarios, base)
+    elapsed = time.perf_counter() - started
+    print(f'{"loop":<11} {len(scenarios):>9} {elapsed * 1000:>9.1f} {len(scenarios) / elapsed:>12.0f}')
+
+    vectorized = simulator.evaluate(history, scenarios, base)['margin']
+    mismatches = sum(1 for a, b in zip(loop, vectorized) if abs(a - b) > 0.01)
+    print(f'loop vs vectorized margins: {mismatches} mismatches in {len(scenarios)} scenarios')
+
+
+if __name__ == '__main__':
+    main()
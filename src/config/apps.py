@@ -5,3 +5,7 @@ class ConfigAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'config'
     verbose_name = 'Site configuration'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from memory_box import checks  # noqa: F401
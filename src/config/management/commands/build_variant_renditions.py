@@ -0,0 +1,53 @@
+"""
+Genera (o regenera con --force) las renditions responsive de las imágenes de variantes ya cargadas.
+Procesa en paralelo con un pool de threads (Pillow libera el GIL al redimensionar/codificar).
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from config.models import BoxVariantImage
+from config.renditions import build_renditions, needs_renditions
+
+
+def _build(image_id):
+    close_old_connections()
+    try:
+        image = BoxVariantImage.objects.get(pk=image_id)
+        build_renditions(image)
+        return image_id, None
+    except Exception as exc:
+        return image_id, exc
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Build WebP/JPEG renditions and blur placeholders for existing BoxVariantImage files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Parallel workers (default 4).')
+        parser.add_argument('--force', action='store_true', help='Rebuild even if renditions are up to date.')
+
+    def handle(self, *args, **options):
+        images = BoxVariantImage.objects.exclude(file='').exclude(file__isnull=True)
+        pending = [img.pk for img in images if options['force'] or needs_renditions(img)]
+        if not pending:
+            self.stdout.write('All variant images already have renditions.')
+            return
+        self.stdout.write(f'Building renditions for {len(pending)} images with {options["workers"]} workers...')
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            futures = [pool.submit(_build, pk) for pk in pending]
+            for done, future in enumerate(as_completed(futures), start=1):
+                image_id, exc = future.result()
+                if exc is not None:
+                    failed += 1
+                    self.stderr.write(f'  image {image_id}: {exc}')
+                self.stdout.write(f'  {done}/{len(pending)}', ending='\r')
+        self.stdout.write('')
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Done with {failed} failures.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,29 @@
+"""
+Borra las subidas por partes abandonadas (abiertas, o completas sin usar por submit_images)
+más viejas que --hours, junto con sus archivos en CHUNKED_UPLOAD_ROOT. Pensado para cron diario.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from config.models import ChunkedUpload
+from config.uploads import discard
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads older than --hours and their temporary files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Age threshold in hours (default 24).')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        # Completed background media are already moved into MEDIA_ROOT; only the row is left.
+        stale = ChunkedUpload.objects.filter(created_at__lt=cutoff)
+        count = 0
+        for upload in stale.iterator():
+            discard(upload)
+            upload.delete()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} chunked uploads.'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:10
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('config', '0002_variant_image_renditions'),
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('purpose', models.CharField(choices=[('background_media', 'Background media'), ('image_crop', 'Image crop')], max_length=30)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField(help_text='Total bytes')),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('checksum', models.CharField(blank=True, help_text='Optional SHA-256 of the whole file', max_length=64)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('complete', 'Complete')], default='open', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(blank=True, help_text='Image crop only: order the image belongs to', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Chunked upload',
+                'verbose_name_plural': 'Chunked uploads',
+            },
+        ),
+    ]
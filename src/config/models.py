@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 
@@ -106,6 +108,10 @@ class BoxVariantImage(models.Model):
         null=True,
     )
     order = models.PositiveSmallIntegerField(default=0)
+    # Responsive copies stored next to the original (config.renditions): source + WebP/JPEG per width.
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    # Tiny blurred preview as a data URI, shown while the real image loads.
+    placeholder = models.TextField(blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -117,3 +123,53 @@ class BoxVariantImage(models.Model):
     def url(self):
         return self.file.url if self.file else None
 
+
+
+class ChunkedUpload(models.Model):
+    """
+    Resumable upload session (config.uploads): the client sends the file in numbered chunks,
+    each with its SHA-256, and completes it when all are stored. Used for large BackgroundMedia
+    files and for crop images from the public order page on slow links.
+    """
+    PURPOSE_BACKGROUND_MEDIA = 'background_media'
+    PURPOSE_IMAGE_CROP = 'image_crop'
+    PURPOSE_CHOICES = [
+        (PURPOSE_BACKGROUND_MEDIA, 'Background media'),
+        (PURPOSE_IMAGE_CROP, 'Image crop'),
+    ]
+    STATUS_OPEN = 'open'
+    STATUS_COMPLETE = 'complete'
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'Open'),
+        (STATUS_COMPLETE, 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    purpose = models.CharField(max_length=30, choices=PURPOSE_CHOICES)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(help_text='Total bytes')
+    chunk_size = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64, blank=True, help_text='Optional SHA-256 of the whole file')
+    order = models.ForeignKey(
+        'orders.Order', on_delete=models.CASCADE, null=True, blank=True, related_name='+',
+        help_text='Image crop only: order the image belongs to'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Chunked upload'
+        verbose_name_plural = 'Chunked uploads'
+
+    def __str__(self):
+        return f'{self.get_purpose_display()}: {self.filename} ({self.status})'
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def expected_chunk_length(self, index):
+        if index < self.total_chunks - 1:
+            return self.chunk_size
+        return self.size - self.chunk_size * (self.total_chunks - 1)
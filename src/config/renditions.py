@@ -0,0 +1,130 @@
+"""
+Responsive renditions for BoxVariantImage uploads.
+
+For each catalog image we store, next to the original, width-bucketed WebP and JPEG copies plus a
+tiny blurred placeholder (inline data URI). Building runs in a small thread pool after the upload
+commits (Pillow releases the GIL while resizing/encoding), so the admin request returns at once.
+The result is recorded in BoxVariantImage.renditions:
+
+    {'source': <original name>, 'sizes': [{'width': 320, 'webp': <name>, 'jpeg': <name>}, ...]}
+"""
+import base64
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageFilter, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+RENDITION_WIDTHS = (320, 640, 960, 1280)
+# (extension, formato Pillow, opciones de encode)
+RENDITION_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+PLACEHOLDER_WIDTH = 16
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'RENDITION_WORKERS', 2),
+            thread_name_prefix='renditions',
+        )
+    return _executor
+
+
+def needs_renditions(image):
+    """True if the image has a file whose renditions were not built yet (new upload or replaced file)."""
+    return bool(image.file) and (image.renditions or {}).get('source') != image.file.name
+
+
+def target_widths(original_width):
+    """Buckets smaller than the original; an image narrower than every bucket keeps its own width."""
+    widths = [w for w in RENDITION_WIDTHS if w < original_width]
+    return widths or [original_width]
+
+
+def _encode(img, fmt, options):
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def _placeholder(img):
+    height = max(1, round(img.height * PLACEHOLDER_WIDTH / img.width))
+    tiny = img.resize((PLACEHOLDER_WIDTH, height), Image.BILINEAR).filter(ImageFilter.GaussianBlur(1))
+    data = _encode(tiny, 'WEBP', {'quality': 40})
+    return 'data:image/webp;base64,' + base64.b64encode(data).decode('ascii')
+
+
+def delete_rendition_files(renditions, storage):
+    for size in (renditions or {}).get('sizes', []):
+        for ext, _, _ in RENDITION_FORMATS:
+            name = size.get(ext)
+            if name:
+                try:
+                    storage.delete(name)
+                except OSError as exc:
+                    logger.warning('renditions: could not delete %s: %s', name, exc)
+
+
+def build_renditions(image):
+    """Build and store renditions + placeholder for one BoxVariantImage (synchronous)."""
+    storage = image.file.storage
+    source = image.file.name
+    with image.file.open('rb') as f:
+        img = Image.open(f)
+        img = ImageOps.exif_transpose(img).convert('RGB')
+    base, _ = os.path.splitext(source)
+    sizes = []
+    for width in target_widths(img.width):
+        height = max(1, round(img.height * width / img.width))
+        resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+        entry = {'width': width}
+        for ext, fmt, options in RENDITION_FORMATS:
+            entry[ext] = storage.save(f'{base}_w{width}.{ext}', ContentFile(_encode(resized, fmt, options)))
+        sizes.append(entry)
+    old = image.renditions
+    image.renditions = {'source': source, 'sizes': sizes}
+    image.placeholder = _placeholder(img)
+    # save() (no update()) so the catalog version is bumped by config.signals.
+    image.save(update_fields=['renditions', 'placeholder'])
+    delete_rendition_files(old, storage)
+    return image
+
+
+def _build_in_worker(image_id):
+    from .models import BoxVariantImage
+    close_old_connections()
+    try:
+        image = BoxVariantImage.objects.filter(pk=image_id).first()
+        if image is not None and needs_renditions(image):
+            build_renditions(image)
+    except Exception:
+        logger.exception('renditions: failed for BoxVariantImage %s', image_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(image):
+    """Queue rendition building for ``image`` once the current transaction commits."""
+    image_id = image.pk
+    transaction.on_commit(lambda: _get_executor().submit(_build_in_worker, image_id))
+
+
+def srcset(renditions, ext, storage):
+    """'url 320w, url 640w' for one format, or '' if no renditions."""
+    return ', '.join(
+        f'{storage.url(size[ext])} {size["width"]}w'
+        for size in (renditions or {}).get('sizes', [])
+        if size.get(ext)
+    )
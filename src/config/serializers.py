@@ -1,5 +1,11 @@
+import os
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from .models import SiteSettings, BackgroundMedia, BoxVariant, BoxVariantImage
+from .models import SiteSettings, BackgroundMedia, BoxVariant, BoxVariantImage, ChunkedUpload
+from .uploads import MAX_CHUNK_SIZE, MIN_CHUNK_SIZE, is_sha256, received_chunks
 
 
 class SiteSettingsSerializer(serializers.ModelSerializer):
@@ -65,8 +71,65 @@ class BoxVariantSerializer(serializers.ModelSerializer):
             'order', 'images_no_light', 'images_with_light',
         ]
 
+    def _images(self, obj, box_type):
+        # Sobre obj.images.all() para aprovechar el prefetch del listado (sin query por variante).
+        images = sorted(obj.images.all(), key=lambda img: (img.order, img.id))
+        return [{'id': img.id, 'url': img.url} for img in images if img.box_type == box_type and img.url]
+
     def get_images_no_light(self, obj):
-        return [{'id': img.id, 'url': img.url} for img in obj.images.filter(box_type=BoxVariantImage.BOX_TYPE_NO_LIGHT).order_by('order') if img.url]
+        return self._images(obj, BoxVariantImage.BOX_TYPE_NO_LIGHT)
 
     def get_images_with_light(self, obj):
-        return [{'id': img.id, 'url': img.url} for img in obj.images.filter(box_type=BoxVariantImage.BOX_TYPE_WITH_LIGHT).order_by('order') if img.url]
+        return self._images(obj, BoxVariantImage.BOX_TYPE_WITH_LIGHT)
+
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    total_chunks = serializers.IntegerField(read_only=True)
+    received = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ChunkedUpload
+        fields = [
+            'id', 'purpose', 'filename', 'size', 'chunk_size', 'checksum', 'order',
+            'status', 'total_chunks', 'received', 'created_at', 'completed_at',
+        ]
+        read_only_fields = ['status', 'created_at', 'completed_at']
+        extra_kwargs = {'chunk_size': {'required': False}}
+
+    def get_received(self, obj):
+        if obj.status == ChunkedUpload.STATUS_COMPLETE:
+            return list(range(obj.total_chunks))
+        return received_chunks(obj)
+
+    def validate_filename(self, value):
+        # Sólo el nombre base, saneado como lo haría el storage: nada de rutas del cliente.
+        try:
+            return default_storage.get_valid_name(os.path.basename(value.replace('\\', '/')))
+        except SuspiciousFileOperation:
+            raise serializers.ValidationError('Invalid file name.')
+
+    def validate_checksum(self, value):
+        value = (value or '').strip().lower()
+        if value and not is_sha256(value):
+            raise serializers.ValidationError('Must be a SHA-256 hex digest.')
+        return value
+
+    def validate_chunk_size(self, value):
+        if not MIN_CHUNK_SIZE <= value <= MAX_CHUNK_SIZE:
+            raise serializers.ValidationError(f'Must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes.')
+        return value
+
+    def validate(self, attrs):
+        purpose = attrs['purpose']
+        max_size = settings.CHUNKED_UPLOAD_MAX_SIZE[purpose]
+        if not 0 < attrs['size'] <= max_size:
+            raise serializers.ValidationError({'size': f'Must be between 1 and {max_size} bytes.'})
+        if purpose == ChunkedUpload.PURPOSE_IMAGE_CROP:
+            if not attrs.get('order'):
+                raise serializers.ValidationError({'order': 'Required for image_crop uploads.'})
+            if not attrs['order'].accepts_images():
+                raise serializers.ValidationError({'order': 'This order no longer accepts images.'})
+        else:
+            attrs['order'] = None
+        attrs.setdefault('chunk_size', settings.CHUNKED_UPLOAD_CHUNK_SIZE)
+        return attrs
@@ -0,0 +1,33 @@
+"""Bump data versions when configuration changes so process-local caches rebuild (see memory_box.versioning)."""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from memory_box.versioning import bump_version_on_commit
+from .renditions import delete_rendition_files, needs_renditions, schedule_renditions
+from .models import SiteSettings, BoxVariant, BoxVariantImage
+
+SITE_SETTINGS_VERSION = 'site_settings'
+VARIANTS_VERSION = 'variants'
+
+
+@receiver([post_save, post_delete], sender=SiteSettings)
+def site_settings_changed(sender, **kwargs):
+    bump_version_on_commit(SITE_SETTINGS_VERSION)
+
+
+@receiver([post_save, post_delete], sender=BoxVariant)
+@receiver([post_save, post_delete], sender=BoxVariantImage)
+def variant_catalog_changed(sender, **kwargs):
+    bump_version_on_commit(VARIANTS_VERSION)
+
+
+@receiver(post_save, sender=BoxVariantImage)
+def variant_image_saved(sender, instance, **kwargs):
+    if needs_renditions(instance):
+        schedule_renditions(instance)
+
+
+@receiver(post_delete, sender=BoxVariantImage)
+def variant_image_deleted(sender, instance, **kwargs):
+    if instance.file:
+        delete_rendition_files(instance.renditions, instance.file.storage)
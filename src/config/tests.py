@@ -0,0 +1,350 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from config.models import BackgroundMedia, BoxVariant, BoxVariantImage, ChunkedUpload
+from config.renditions import build_renditions, needs_renditions
+from config.uploads import MIN_CHUNK_SIZE, assembled_path
+from config.views import (
+    _bootstrap_document, _build_variants_public, _site_settings, _variants_document, get_settings,
+)
+from orders.models import Order, OrderStatus
+from users.models import AdminUser
+
+
+class VersionedSingletonTests(TestCase):
+    """get_settings() y el catálogo público: sin queries una vez calientes, invalidados al commitear."""
+
+    def setUp(self):
+        cache.clear()
+        _site_settings.clear()
+        _variants_document.clear()
+
+    def test_get_settings_no_queries_after_warm_up(self):
+        get_settings()
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                get_settings()
+
+    def test_get_settings_returns_a_copy(self):
+        obj = get_settings()
+        obj.price_sin_luz = 1
+        self.assertNotEqual(get_settings().price_sin_luz, 1)
+
+    def test_save_invalidates_on_commit_only(self):
+        get_settings()
+        with self.captureOnCommitCallbacks() as callbacks:
+            obj = get_settings()
+            obj.price_sin_luz = 12345
+            obj.save()
+            # Todavía sin commit: la versión no cambió, se sigue sirviendo la copia cacheada.
+            with self.assertNumQueries(0):
+                get_settings()
+        for callback in callbacks:
+            callback()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_settings().price_sin_luz, 12345)
+        with self.assertNumQueries(0):
+            get_settings()
+
+    def test_variants_catalog_no_queries_after_warm_up(self):
+        BoxVariant.objects.create(code='wood', name='Madera')
+        first = _variants_document.get()
+        with self.assertNumQueries(0):
+            self.assertEqual(_variants_document.get()['etag'], first['etag'])
+
+    def test_variant_change_rebuilds_catalog(self):
+        _variants_document.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            BoxVariant.objects.create(code='black', name='Negro')
+        doc = _variants_document.get()
+        self.assertIn(b'black', doc['body'])
+
+
+class VariantsCatalogTests(TestCase):
+    """Catálogo público: una query, ETag por contenido, 304 sin queries y nuevo ETag al cambiar variantes."""
+    URL = '/api/settings/variants/public/'
+
+    def setUp(self):
+        cache.clear()
+        _variants_document.clear()
+        for i, code in enumerate(('wood', 'black', 'marble')):
+            variant = BoxVariant.objects.create(code=code, name=code.title(), order=i)
+            for box_type in ('no_light', 'with_light'):
+                name = f'variant_images/{code}_{box_type}.jpg'
+                BoxVariantImage.objects.create(
+                    variant=variant, box_type=box_type, file=name, renditions={'source': name},
+                )
+
+    def test_built_in_one_query(self):
+        with self.assertNumQueries(1):
+            catalog = _build_variants_public()
+        self.assertEqual([v['id'] for v in catalog['with_light']], ['wood_light', 'black_light', 'marble_light'])
+        self.assertEqual(len(catalog['no_light'][0]['images']), 1)
+
+    def test_matching_etag_gets_304_without_queries(self):
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=60', response['Cache-Control'])
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_variant_change_invalidates(self):
+        etag = self.client.get(self.URL)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            BoxVariant.objects.filter(code='black').update(visible_no_light=False)
+            BoxVariant.objects.get(code='marble').save()
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([v['id'] for v in response.json()['no_light']], ['wood', 'marble'])
+
+    def test_admin_list_query_count(self):
+        client = APIClient()
+        client.force_authenticate(AdminUser.objects.create_user('admin', 'admin@example.com', 'x'))
+        with self.assertNumQueries(2):
+            response = client.get('/api/settings/variants/')
+        self.assertEqual(len(response.json()), 3)
+
+
+class VariantRenditionsTests(TestCase):
+    """Copias WebP/JPEG por ancho (sin agrandar), placeholder y srcset en el catálogo; se limpian al reemplazar."""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        cache.clear()
+        _variants_document.clear()
+        self.variant = BoxVariant.objects.create(code='wood', name='Madera')
+
+    def _jpeg(self, width, height):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), (120, 80, 40)).save(buffer, format='JPEG')
+        return ContentFile(buffer.getvalue(), name='foto.jpg')
+
+    def _image(self, width=800, height=400):
+        image = BoxVariantImage(variant=self.variant, box_type='no_light')
+        image.file.save('foto.jpg', self._jpeg(width, height))
+        return image
+
+    def test_builds_width_buckets_and_placeholder(self):
+        image = self._image()
+        self.assertTrue(needs_renditions(image))
+        build_renditions(image)
+        image.refresh_from_db()
+        self.assertFalse(needs_renditions(image))
+        sizes = image.renditions['sizes']
+        self.assertEqual([size['width'] for size in sizes], [320, 640])
+        storage = image.file.storage
+        for size in sizes:
+            for ext in ('webp', 'jpeg'):
+                with storage.open(size[ext]) as f, Image.open(f) as img:
+                    self.assertEqual(img.size, (size['width'], size['width'] // 2))
+        self.assertTrue(image.placeholder.startswith('data:image/webp;base64,'))
+
+        source = _build_variants_public()['no_light'][0]['image_sources'][0]
+        self.assertEqual(source['url'], storage.url(image.file.name))
+        self.assertIn(' 320w, ', source['srcset_webp'])
+        self.assertTrue(source['srcset'].endswith(' 640w'))
+
+    def test_small_image_is_not_upscaled(self):
+        image = build_renditions(self._image(200, 100))
+        self.assertEqual([size['width'] for size in image.renditions['sizes']], [200])
+
+    def test_replaced_file_drops_old_renditions(self):
+        image = build_renditions(self._image())
+        old = [size['jpeg'] for size in image.renditions['sizes']]
+        image.file.save('otra.jpg', self._jpeg(400, 400))
+        self.assertTrue(needs_renditions(image))
+        # Sin reconstruir, el catálogo no publica las copias del archivo anterior.
+        self.assertEqual(_build_variants_public()['no_light'][0]['image_sources'][0]['srcset'], '')
+        build_renditions(image)
+        storage = image.file.storage
+        self.assertFalse(any(storage.exists(name) for name in old))
+        image.delete()
+        self.assertFalse(any(storage.exists(size['jpeg']) for size in image.renditions['sizes']))
+
+
+class BootstrapTests(TestCase):
+    """Documento de la página de pedido: 304 sin queries; cambia con los precios o con el catálogo."""
+    URL = '/api/settings/bootstrap/'
+
+    def setUp(self):
+        cache.clear()
+        _site_settings.clear()
+        _variants_document.clear()
+        _bootstrap_document.clear()
+        BoxVariant.objects.create(code='wood', name='Madera')
+
+    def test_document_and_304(self):
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        data = response.json()
+        self.assertEqual(set(data), {'prices', 'home_background', 'variants'})
+        self.assertEqual(data['prices']['price_sin_luz'], get_settings().price_sin_luz)
+        self.assertEqual([v['id'] for v in data['variants']['no_light']], ['wood'])
+        with self.assertNumQueries(0):
+            response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_prices_and_variants_change_the_etag(self):
+        etags = [self.client.get(self.URL)['ETag']]
+        site = get_settings()
+        site.price_sin_luz = 12345
+        with self.captureOnCommitCallbacks(execute=True):
+            site.save()
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etags[-1])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['prices']['price_sin_luz'], 12345)
+        etags.append(response['ETag'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BoxVariant.objects.create(code='black', name='Negro')
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etags[-1])
+        self.assertEqual(response.status_code, 200)
+        etags.append(response['ETag'])
+        self.assertEqual(len(set(etags)), 3)
+
+
+class ImageCropUploadTests(TestCase):
+    """Subidas image_crop públicas: sólo para pedidos que aceptan imágenes, con tope de sesiones abiertas."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.enterContext(override_settings(CHUNKED_UPLOAD_ROOT=self.root, CHUNKED_UPLOAD_MAX_OPEN_PER_ORDER=2))
+        self.order = Order.objects.create(client_name='Ana', box_type='no_light', variant='wood')
+
+    def _open(self, order=None):
+        return self.client.post('/api/settings/uploads/', {
+            'purpose': 'image_crop', 'filename': 'a.jpg', 'size': 3, 'order': (order or self.order).pk,
+        }, content_type='application/json')
+
+    def test_open_session_for_draft_order(self):
+        response = self._open()
+        self.assertEqual(response.status_code, 201)
+
+    def test_rejects_finalized_order(self):
+        Order.objects.filter(pk=self.order.pk).update(status=OrderStatus.PROCESSING)
+        response = self._open()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('order', response.json())
+
+    def test_caps_open_sessions_per_order(self):
+        self.assertEqual(self._open().status_code, 201)
+        self.assertEqual(self._open().status_code, 201)
+        self.assertEqual(self._open().status_code, 429)
+        # Otro pedido tiene su propio cupo.
+        other = Order.objects.create(client_name='Bea', box_type='no_light', variant='wood')
+        self.assertEqual(self._open(other).status_code, 201)
+
+    def test_completed_sessions_do_not_count(self):
+        self._open()
+        self._open()
+        ChunkedUpload.objects.filter(order=self.order).update(status=ChunkedUpload.STATUS_COMPLETE)
+        self.assertEqual(self._open().status_code, 201)
+
+    def test_chunks_rejected_once_order_is_finalized(self):
+        upload_id = self._open().json()['id']
+        Order.objects.filter(pk=self.order.pk).update(status=OrderStatus.PROCESSING)
+        response = self.client.put(
+            f'/api/settings/uploads/{upload_id}/chunks/0/', b'abc', content_type='application/octet-stream',
+            HTTP_X_CHUNK_CHECKSUM=hashlib.sha256(b'abc').hexdigest(),
+        )
+        self.assertEqual(response.status_code, 409)
+
+
+class BackgroundMediaUploadTests(TestCase):
+    """Subida por partes de punta a punta: partes fuera de orden, checksum inválido, complete."""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media, CHUNKED_UPLOAD_ROOT=os.path.join(media, '.chunked')))
+        self.client = APIClient()
+        self.client.force_authenticate(AdminUser.objects.create_user('admin', 'admin@example.com', 'x'))
+        self.content = os.urandom(2 * MIN_CHUNK_SIZE + 1000)
+        self.chunks = [self.content[i:i + MIN_CHUNK_SIZE] for i in range(0, len(self.content), MIN_CHUNK_SIZE)]
+
+    def _open(self, filename='../../clip.mp4'):
+        response = self.client.post('/api/settings/uploads/', {
+            'purpose': 'background_media', 'filename': filename, 'size': len(self.content),
+            'chunk_size': MIN_CHUNK_SIZE, 'checksum': hashlib.sha256(self.content).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def _put(self, upload_id, index, body, checksum=None):
+        return self.client.put(
+            f'/api/settings/uploads/{upload_id}/chunks/{index}/', body, content_type='application/octet-stream',
+            HTTP_X_CHUNK_CHECKSUM=checksum or hashlib.sha256(body).hexdigest(),
+        )
+
+    def _send_all(self, upload_id):
+        for index in (2, 0, 1):
+            self.assertEqual(self._put(upload_id, index, self.chunks[index]).status_code, 200)
+
+    def _complete(self, upload_id):
+        return self.client.post(
+            f'/api/settings/uploads/{upload_id}/complete/', {'type': 'video', 'name': 'Fondo'}, format='json'
+        )
+
+    def test_upload_and_complete(self):
+        upload = self._open()
+        self.assertEqual(upload['filename'], 'clip.mp4')
+        self.assertEqual(upload['total_chunks'], 3)
+
+        response = self._put(upload['id'], 1, self.chunks[1], checksum=hashlib.sha256(b'other').hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f'/api/settings/uploads/{upload["id"]}/').json()['received'], [])
+        self.assertEqual(self._complete(upload['id']).status_code, 409)
+
+        self._send_all(upload['id'])
+        self.assertEqual(self.client.get(f'/api/settings/uploads/{upload["id"]}/').json()['received'], [0, 1, 2])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._complete(upload['id'])
+        self.assertEqual(response.status_code, 201)
+
+        media = BackgroundMedia.objects.get(pk=response.json()['id'])
+        self.assertTrue(media.file.name.startswith('background_media/'))
+        self.assertTrue(media.file.name.endswith('clip.mp4'))
+        with media.file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(os.path.exists(os.path.dirname(assembled_path(ChunkedUpload.objects.get(pk=upload['id'])))))
+
+    def test_rolled_back_complete_keeps_the_assembled_file(self):
+        upload_id = self._open()['id']
+        self._send_all(upload_id)
+        upload = ChunkedUpload.objects.get(pk=upload_id)
+        with mock.patch.object(ChunkedUpload, 'save', side_effect=DatabaseError('boom')):
+            with self.assertRaises(DatabaseError):
+                self._complete(upload_id)
+        self.assertFalse(BackgroundMedia.objects.exists())
+        with open(assembled_path(upload), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+        # El reintento encuentra el archivo ensamblado y termina.
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._complete(upload_id)
+        self.assertEqual(response.status_code, 201)
+        with BackgroundMedia.objects.get().file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        # La copia del intento revertido no quedó huérfana en MEDIA_ROOT.
+        stored = [name for _, _, names in os.walk(os.path.join(settings.MEDIA_ROOT, 'background_media')) for name in names]
+        self.assertEqual(len(stored), 1)
@@ -0,0 +1,169 @@
+"""
+Resumable chunked uploads (ChunkedUpload).
+
+Protocol:
+1. POST   uploads/                        {purpose, filename, size[, chunk_size, checksum, order]}
+2. PUT    uploads/<id>/chunks/<index>/    raw bytes, header X-Chunk-Checksum: <sha256 hex>
+3. GET    uploads/<id>/                   received chunk indexes, so a client can resume
+4. POST   uploads/<id>/complete/
+
+Every chunk is streamed to its own file under CHUNKED_UPLOAD_ROOT/<id>/ (written to a temp name
+and renamed once its length and checksum match), so parallel or retried PUTs never clash and the
+server never holds a whole chunk in memory. Completion concatenates the chunks into one file; a
+hard link to it is renamed into MEDIA_ROOT by the storage (AssembledFile.temporary_file_path),
+without copying, and the assembled file itself is only removed once the transaction commits.
+"""
+import hashlib
+import os
+import re
+import shutil
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+
+CHECKSUM_HEADER = 'X-Chunk-Checksum'
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 32 * 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+ASSEMBLED_NAME = 'assembled'
+
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(ValueError):
+    """Invalid chunk or session state; the message is returned to the client with a 400/409."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class AssembledFile(File):
+    """Completed upload on disk; FileSystemStorage moves it into place instead of copying."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def is_sha256(value):
+    return bool(_SHA256_RE.match(value or ''))
+
+
+def upload_dir(upload):
+    return os.path.join(str(settings.CHUNKED_UPLOAD_ROOT), str(upload.pk))
+
+
+def _chunk_path(upload, index):
+    return os.path.join(upload_dir(upload), f'{index:06d}.part')
+
+
+def assembled_path(upload):
+    return os.path.join(upload_dir(upload), ASSEMBLED_NAME)
+
+
+def received_chunks(upload):
+    """Sorted indexes of the chunks already stored for ``upload``."""
+    try:
+        names = os.listdir(upload_dir(upload))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-5]) for name in names if name.endswith('.part') and name[:-5].isdigit())
+
+
+def write_chunk(upload, index, stream, checksum):
+    """
+    Stream one chunk from ``stream`` to disk, verifying its length and SHA-256.
+    Re-sending a stored chunk overwrites it (clients retry after timeouts).
+    """
+    if upload.status != upload.STATUS_OPEN:
+        raise UploadError('Upload already completed.', status=409)
+    if not 0 <= index < upload.total_chunks:
+        raise UploadError(f'Chunk index must be between 0 and {upload.total_chunks - 1}.')
+    checksum = (checksum or '').strip().lower()
+    if not is_sha256(checksum):
+        raise UploadError(f'Missing or invalid {CHECKSUM_HEADER} header (SHA-256 hex).')
+    expected = upload.expected_chunk_length(index)
+
+    directory = upload_dir(upload)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f'.{index:06d}.{uuid.uuid4().hex}.tmp')
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with open(tmp_path, 'wb') as out:
+            while True:
+                block = stream.read(min(COPY_BUFFER_SIZE, expected + 1 - written))
+                if not block:
+                    break
+                written += len(block)
+                if written > expected:
+                    raise UploadError(f'Chunk {index} is larger than the expected {expected} bytes.')
+                digest.update(block)
+                out.write(block)
+        if written != expected:
+            raise UploadError(f'Chunk {index} has {written} bytes, expected {expected}.')
+        if digest.hexdigest() != checksum:
+            raise UploadError(f'Checksum mismatch for chunk {index}.')
+        os.replace(tmp_path, _chunk_path(upload, index))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return written
+
+
+def assemble(upload):
+    """
+    Concatenate all chunks into the assembled file and verify the whole-file checksum (if given).
+    Returns the path. Chunk files are removed once assembled.
+    """
+    target = assembled_path(upload)
+    if os.path.exists(target):
+        # A previous completion assembled and verified it (e.g. the request failed afterwards).
+        return target
+    missing = sorted(set(range(upload.total_chunks)) - set(received_chunks(upload)))
+    if missing:
+        raise UploadError(f'Missing chunks: {missing[:20]}', status=409)
+    tmp_path = f'{target}.{uuid.uuid4().hex}.tmp'
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, 'wb') as out:
+            for index in range(upload.total_chunks):
+                with open(_chunk_path(upload, index), 'rb') as part:
+                    for block in iter(lambda: part.read(COPY_BUFFER_SIZE), b''):
+                        digest.update(block)
+                        out.write(block)
+        if upload.checksum and digest.hexdigest() != upload.checksum:
+            raise UploadError('Checksum mismatch for the assembled file.')
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    for index in range(upload.total_chunks):
+        os.remove(_chunk_path(upload, index))
+    return target
+
+
+def open_assembled(upload):
+    """AssembledFile for a completed upload (the caller closes it)."""
+    return AssembledFile(open(assembled_path(upload), 'rb'), name=upload.filename)
+
+
+def link_assembled(upload):
+    """
+    AssembledFile on a new hard link to the assembled file (the caller closes it), for the storage
+    to move into place: if the save is rolled back the assembled file is still there to retry.
+    """
+    source = assembled_path(upload)
+    link = f'{source}.{uuid.uuid4().hex}.link'
+    try:
+        os.link(source, link)
+    except OSError:
+        # Filesystem without hard links: a copy (the storage still renames it).
+        shutil.copyfile(source, link)
+    return AssembledFile(open(link, 'rb'), name=upload.filename)
+
+
+def discard(upload):
+    """Remove every file of the upload (chunks and assembled file)."""
+    shutil.rmtree(upload_dir(upload), ignore_errors=True)
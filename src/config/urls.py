@@ -1,24 +1,36 @@
 from django.urls import path
 from .views import (
-    PricesSettingsView,
-    HomeBackgroundSettingsView,
+    PricesSettingsAsyncView,
+    HomeBackgroundSettingsAsyncView,
     BackgroundMediaListCreateView,
     BackgroundMediaDetailView,
-    VariantsPublicView,
+    ChunkedUploadCreateView,
+    ChunkedUploadDetailView,
+    ChunkedUploadChunkView,
+    ChunkedUploadCompleteView,
+    VariantsPublicAsyncView,
+    BootstrapAsyncView,
     VariantsListView,
     VariantDetailView,
     VariantImageListCreateView,
     VariantImageDetailView,
 )
-from expenses.views import CostSettingsView
+from expenses.views import CostSettingsView, CostUnitTableView, ProfitAndLossView
 
 urlpatterns = [
-    path('prices/', PricesSettingsView.as_view(), name='settings-prices'),
+    path('prices/', PricesSettingsAsyncView.as_view(), name='settings-prices'),
     path('costs/', CostSettingsView.as_view(), name='settings-costs'),
-    path('home-background/', HomeBackgroundSettingsView.as_view(), name='settings-home-background'),
+    path('costs/unit-costs/', CostUnitTableView.as_view(), name='settings-cost-unit-table'),
+    path('costs/pnl/', ProfitAndLossView.as_view(), name='settings-cost-pnl'),
+    path('home-background/', HomeBackgroundSettingsAsyncView.as_view(), name='settings-home-background'),
     path('background-media/', BackgroundMediaListCreateView.as_view(), name='settings-background-media-list'),
     path('background-media/<int:pk>/', BackgroundMediaDetailView.as_view(), name='settings-background-media-detail'),
-    path('variants/public/', VariantsPublicView.as_view(), name='settings-variants-public'),
+    path('uploads/', ChunkedUploadCreateView.as_view(), name='settings-uploads-create'),
+    path('uploads/<uuid:pk>/', ChunkedUploadDetailView.as_view(), name='settings-uploads-detail'),
+    path('uploads/<uuid:pk>/chunks/<int:index>/', ChunkedUploadChunkView.as_view(), name='settings-uploads-chunk'),
+    path('uploads/<uuid:pk>/complete/', ChunkedUploadCompleteView.as_view(), name='settings-uploads-complete'),
+    path('variants/public/', VariantsPublicAsyncView.as_view(), name='settings-variants-public'),
+    path('bootstrap/', BootstrapAsyncView.as_view(), name='settings-bootstrap'),
     path('variants/', VariantsListView.as_view(), name='settings-variants-list'),
     path('variants/<int:pk>/', VariantDetailView.as_view(), name='settings-variant-detail'),
     path('variant-images/', VariantImageListCreateView.as_view(), name='settings-variant-images-list'),
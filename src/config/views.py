@@ -1,43 +1,77 @@
+import copy
+import hashlib
+import io
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 
-from .models import SiteSettings, BackgroundMedia, BoxVariant, BoxVariantImage
+from memory_box.async_views import AsyncReadView, cached_json_response, json_response, render_json, run_cpu
+from memory_box.media import versioned_url
+from memory_box.versioning import VersionedCache
+from orders.models import Order
+from .models import SiteSettings, BackgroundMedia, BoxVariant, BoxVariantImage, ChunkedUpload
+from .renditions import srcset
+from .uploads import CHECKSUM_HEADER, UploadError, assemble, discard, link_assembled, write_chunk
+from .signals import SITE_SETTINGS_VERSION, VARIANTS_VERSION
 from .serializers import (
     SiteSettingsSerializer,
     HomeBackgroundSerializer,
     BackgroundMediaSerializer,
+    ChunkedUploadSerializer,
     BoxVariantSerializer,
     BoxVariantImageSerializer,
 )
 
 
-def get_settings():
-    """Devuelve la única instancia de SiteSettings (crea con valores por defecto si no existe)."""
-    obj, _ = SiteSettings.objects.get_or_create(
-        pk=1,
-        defaults={
-            'price_mercadolibre': 35000,
-            'price_sin_luz': 24000,
-            'price_con_luz': 42000,
-            'price_pilas': 2500,
-            'transfer_alias': 'manu.perea13',
-            'transfer_bank': 'Mercado Pago',
-            'transfer_holder': 'Manuel Perea',
-            'contact_whatsapp': '+54 9 351 392 3790',
-            'contact_email': 'copiiworld@gmail.com',
-            'link_mercadolibre': 'https://mercadolibre.com',
-        'video_sin_luz': '/static/videos/video-navidad.mp4',
-        'video_con_luz': '/static/videos/background-video-2.mp4',
-        'audio_sin_luz': '/static/audio/cancion-navidad.mp3',
-        'audio_con_luz': '/static/audio/background-music-2.mp3',
-        }
-    )
+SITE_SETTINGS_DEFAULTS = {
+    'price_mercadolibre': 35000,
+    'price_sin_luz': 24000,
+    'price_con_luz': 42000,
+    'price_pilas': 2500,
+    'transfer_alias': 'manu.perea13',
+    'transfer_bank': 'Mercado Pago',
+    'transfer_holder': 'Manuel Perea',
+    'contact_whatsapp': '+54 9 351 392 3790',
+    'contact_email': 'copiiworld@gmail.com',
+    'link_mercadolibre': 'https://mercadolibre.com',
+    'video_sin_luz': '/static/videos/video-navidad.mp4',
+    'video_con_luz': '/static/videos/background-video-2.mp4',
+    'audio_sin_luz': '/static/audio/cancion-navidad.mp3',
+    'audio_con_luz': '/static/audio/background-music-2.mp3',
+}
+
+
+def _load_settings():
+    obj, _ = SiteSettings.objects.get_or_create(pk=1, defaults=SITE_SETTINGS_DEFAULTS)
     return obj
 
 
+_site_settings = VersionedCache(_load_settings, SITE_SETTINGS_VERSION)
+
+
+def get_settings():
+    """
+    Devuelve la única instancia de SiteSettings (crea con valores por defecto si no existe).
+    Cacheada por proceso e invalidada por versión al guardar (config.signals): sin queries una vez
+    caliente. Es una copia, así que modificarla y guardarla es seguro.
+    """
+    return copy.copy(_site_settings.get())
+
+
+async def aget_settings():
+    """Versión async de get_settings() para las vistas ASGI."""
+    return copy.copy(await _site_settings.aget())
+
+
 class PricesSettingsView(APIView):
     """
     GET: devuelve precios y datos de pago (público para Home y modal de pedido).
@@ -86,6 +120,24 @@ class HomeBackgroundSettingsView(APIView):
         return Response(serializer.data)
 
 
+class PricesSettingsAsyncView(AsyncReadView):
+    """GET async de PricesSettingsView; PATCH se delega a la vista DRF."""
+    write_view = PricesSettingsView.as_view()
+
+    async def get(self, request):
+        obj = await aget_settings()
+        return json_response(await run_cpu(lambda: SiteSettingsSerializer(obj).data))
+
+
+class HomeBackgroundSettingsAsyncView(AsyncReadView):
+    """GET async de HomeBackgroundSettingsView; PATCH se delega a la vista DRF."""
+    write_view = HomeBackgroundSettingsView.as_view()
+
+    async def get(self, request):
+        obj = await aget_settings()
+        return json_response(await run_cpu(lambda: HomeBackgroundSerializer(obj).data))
+
+
 class BackgroundMediaListCreateView(APIView):
     """GET: lista de media (opcional ?type=video|audio). POST: crear (multipart o JSON)."""
     permission_classes = [IsAuthenticated]
@@ -134,27 +186,249 @@ class BackgroundMediaDetailView(APIView):
         return Response(serializer.data)
 
 
+def _check_upload_permission(view, request, purpose):
+    """Background media is admin-only; crop images come from the public order page."""
+    if purpose == ChunkedUpload.PURPOSE_BACKGROUND_MEDIA and not (request.user and request.user.is_authenticated):
+        view.permission_denied(request)
+
+
+def _get_upload(view, request, pk):
+    upload = get_object_or_404(ChunkedUpload, pk=pk)
+    _check_upload_permission(view, request, upload.purpose)
+    return upload
+
+
+def _closed_order_response(upload):
+    """409 if the image_crop upload belongs to an order that no longer takes images (same check as submit_images)."""
+    if upload.purpose == ChunkedUpload.PURPOSE_IMAGE_CROP and not upload.order.accepts_images():
+        return Response({'error': 'This order no longer accepts images.'}, status=status.HTTP_409_CONFLICT)
+    return None
+
+
+class ChunkedUploadCreateView(APIView):
+    """POST: abrir una subida por partes (ver config.uploads)."""
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = ChunkedUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        _check_upload_permission(self, request, serializer.validated_data['purpose'])
+        order = serializer.validated_data['order']
+        if order is None:
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        with transaction.atomic():
+            # Fila del pedido bloqueada: dos POST simultáneos no pasan juntos el límite.
+            Order.objects.select_for_update().filter(pk=order.pk).exists()
+            open_count = ChunkedUpload.objects.filter(order=order, status=ChunkedUpload.STATUS_OPEN).count()
+            if open_count >= settings.CHUNKED_UPLOAD_MAX_OPEN_PER_ORDER:
+                return Response(
+                    {'error': f'Too many open uploads for this order (max {settings.CHUNKED_UPLOAD_MAX_OPEN_PER_ORDER}).'},
+                    status=status.HTTP_429_TOO_MANY_REQUESTS
+                )
+            serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ChunkedUploadDetailView(APIView):
+    """GET: estado (partes recibidas, para reanudar). DELETE: cancelar y borrar las partes."""
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk):
+        return Response(ChunkedUploadSerializer(_get_upload(self, request, pk)).data)
+
+    def delete(self, request, pk):
+        upload = _get_upload(self, request, pk)
+        discard(upload)
+        upload.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ChunkedUploadChunkView(APIView):
+    """PUT: cuerpo crudo de la parte <index>, con su SHA-256 en X-Chunk-Checksum."""
+    permission_classes = [AllowAny]
+
+    def put(self, request, pk, index):
+        upload = _get_upload(self, request, pk)
+        closed = _closed_order_response(upload)
+        if closed:
+            return closed
+        try:
+            # request.stream lee el cuerpo por bloques; no pasa por los parsers.
+            write_chunk(upload, index, request.stream or io.BytesIO(), request.headers.get(CHECKSUM_HEADER))
+        except UploadError as e:
+            return Response({'error': str(e)}, status=e.status)
+        return Response({'index': index, 'received': True})
+
+
+class ChunkedUploadCompleteView(APIView):
+    """
+    POST: ensamblar las partes. background_media crea el BackgroundMedia (body: type, name);
+    image_crop deja el archivo listo para submit_images (upload_<i>).
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request, pk):
+        upload = _get_upload(self, request, pk)
+        if upload.status == ChunkedUpload.STATUS_COMPLETE:
+            return Response({'error': 'Upload already completed.'}, status=status.HTTP_409_CONFLICT)
+        closed = _closed_order_response(upload)
+        if closed:
+            return closed
+        try:
+            assemble(upload)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=e.status)
+
+        if upload.purpose == ChunkedUpload.PURPOSE_IMAGE_CROP:
+            upload.status = ChunkedUpload.STATUS_COMPLETE
+            upload.completed_at = timezone.now()
+            upload.save(update_fields=['status', 'completed_at'])
+            return Response(ChunkedUploadSerializer(upload).data)
+
+        data = {k: v for k, v in request.data.items() if k in ('type', 'name')}
+        media = None
+        with link_assembled(upload) as assembled:
+            data['file'] = assembled
+            serializer = BackgroundMediaSerializer(data=data)
+            if not serializer.is_valid():
+                # The assembled file stays, so the client can retry complete with valid fields.
+                os.remove(assembled.temporary_file_path())
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                with transaction.atomic():
+                    # FileSystemStorage renames the hard link into MEDIA_ROOT (no copy).
+                    media = serializer.save()
+                    upload.status = ChunkedUpload.STATUS_COMPLETE
+                    upload.completed_at = timezone.now()
+                    upload.save(update_fields=['status', 'completed_at'])
+            except Exception:
+                # Rolled back: drop the stored copy; the assembled file is untouched for a retry.
+                if media is not None:
+                    media.file.delete(save=False)
+                raise
+        # The assembled file (and the chunks' directory) go once the row is committed.
+        transaction.on_commit(lambda: discard(upload))
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+# El catálogo cambia poco: el navegador lo reutiliza un minuto y después revalida con ETag (304).
+VARIANTS_CATALOG_CACHE_CONTROL = 'public, max-age=60, stale-while-revalidate=600'
+
+
+def _variants_with_images():
+    """Variantes ordenadas con sus imágenes precargadas (listado admin, sin N+1)."""
+    return BoxVariant.objects.order_by('order', 'code').prefetch_related(
+        Prefetch('images', queryset=BoxVariantImage.objects.order_by('order', 'id'))
+    )
+
+
 def _build_variants_public():
-    """Formato para el front: no_light y with_light por visibilidad por tipo."""
-    all_variants = BoxVariant.objects.all().order_by('order', 'code')
+    """
+    Formato para el front: no_light y with_light por visibilidad por tipo. images: URLs originales;
+    image_sources: mismas imágenes con srcset JPEG/WebP y placeholder (config.renditions).
+    Una sola query (LEFT JOIN variantes-imágenes) ordenada por variante y orden de imagen.
+    """
+    storage = BoxVariantImage._meta.get_field('file').storage
+    rows = BoxVariant.objects.order_by('order', 'code', 'images__order', 'images__id').values_list(
+        'id', 'code', 'name', 'visible_no_light', 'visible_with_light',
+        'images__box_type', 'images__file', 'images__renditions', 'images__placeholder',
+    )
+    variants = {}
+    for (variant_id, code, name, visible_no_light, visible_with_light,
+         box_type, file_name, renditions, placeholder) in rows:
+        v = variants.get(variant_id)
+        if v is None:
+            v = variants[variant_id] = {
+                'code': code,
+                'name': name,
+                'visible_no_light': visible_no_light,
+                'visible_with_light': visible_with_light,
+                'images': {BoxVariantImage.BOX_TYPE_NO_LIGHT: [], BoxVariantImage.BOX_TYPE_WITH_LIGHT: []},
+                'sources': {BoxVariantImage.BOX_TYPE_NO_LIGHT: [], BoxVariantImage.BOX_TYPE_WITH_LIGHT: []},
+            }
+        if file_name and box_type in v['images']:
+            url = storage.url(file_name)
+            v['images'][box_type].append(url)
+            # Renditions de otro archivo (reemplazado, aún sin reconstruir) no se publican.
+            if (renditions or {}).get('source') != file_name:
+                renditions, placeholder = None, ''
+            v['sources'][box_type].append({
+                'url': url,
+                'srcset': srcset(renditions, 'jpeg', storage),
+                'srcset_webp': srcset(renditions, 'webp', storage),
+                'placeholder': placeholder or '',
+            })
     no_light = []
     with_light = []
-    for v in all_variants:
-        if v.visible_no_light:
-            imgs_no = [img.url for img in v.images.filter(box_type=BoxVariantImage.BOX_TYPE_NO_LIGHT).order_by('order') if img.url]
-            no_light.append({'id': v.code, 'name': v.name, 'images': imgs_no})
-        if v.visible_with_light:
-            imgs_light = [img.url for img in v.images.filter(box_type=BoxVariantImage.BOX_TYPE_WITH_LIGHT).order_by('order') if img.url]
-            with_light.append({'id': f'{v.code}_light', 'name': v.name, 'images': imgs_light})
+    for v in variants.values():
+        if v['visible_no_light']:
+            no_light.append({
+                'id': v['code'], 'name': v['name'],
+                'images': v['images'][BoxVariantImage.BOX_TYPE_NO_LIGHT],
+                'image_sources': v['sources'][BoxVariantImage.BOX_TYPE_NO_LIGHT],
+            })
+        if v['visible_with_light']:
+            with_light.append({
+                'id': f"{v['code']}_light", 'name': v['name'],
+                'images': v['images'][BoxVariantImage.BOX_TYPE_WITH_LIGHT],
+                'image_sources': v['sources'][BoxVariantImage.BOX_TYPE_WITH_LIGHT],
+            })
     return {'no_light': no_light, 'with_light': with_light}
 
 
-class VariantsPublicView(APIView):
-    """GET: variantes visibles con imágenes para la página de pedido (público)."""
-    permission_classes = [AllowAny]
+def _build_variants_document():
+    payload = _build_variants_public()
+    body = render_json(payload)
+    return {'payload': payload, 'body': body, 'etag': f'"{hashlib.sha1(body).hexdigest()}"'}
 
-    def get(self, request):
-        return Response(_build_variants_public())
+
+# Catálogo público materializado (JSON ya renderizado + ETag), invalidado al cambiar variantes o imágenes.
+_variants_document = VersionedCache(_build_variants_document, VARIANTS_VERSION)
+
+
+class VariantsPublicAsyncView(AsyncReadView):
+    """GET: variantes visibles con imágenes para la página de pedido (público, async, con ETag)."""
+
+    async def get(self, request):
+        doc = await _variants_document.aget()
+        return cached_json_response(request, doc['body'], doc['etag'], VARIANTS_CATALOG_CACHE_CONTROL)
+
+
+# Bootstrap: siempre revalida (precios frescos), pero en el caso común la respuesta es un 304 vacío.
+BOOTSTRAP_CACHE_CONTROL = 'public, no-cache'
+
+
+def _build_bootstrap_document():
+    """
+    Todo lo que la página de pedido necesita al cargar: precios y datos de transferencia/contacto,
+    video/música de fondo y catálogo visible. ETag compuesto de los hashes de cada parte.
+    """
+    site = get_settings()
+    variants = _variants_document.get()
+    settings_payload = {
+        'prices': SiteSettingsSerializer(site).data,
+        # URLs locales con ?v=<hash>: el navegador guarda video/audio como inmutables (memory_box.media).
+        'home_background': {
+            key: versioned_url(value) for key, value in HomeBackgroundSerializer(site).data.items()
+        },
+    }
+    settings_hash = hashlib.sha1(render_json(settings_payload)).hexdigest()
+    payload = {**settings_payload, 'variants': variants['payload']}
+    etag = hashlib.sha1(f'{settings_hash}:{variants["etag"]}'.encode()).hexdigest()
+    return {'body': render_json(payload), 'etag': f'"{etag}"'}
+
+
+_bootstrap_document = VersionedCache(_build_bootstrap_document, SITE_SETTINGS_VERSION, VARIANTS_VERSION)
+
+
+class BootstrapAsyncView(AsyncReadView):
+    """GET: documento único para la página de pedido (precios, fondo, variantes). Público, con ETag."""
+
+    async def get(self, request):
+        doc = await _bootstrap_document.aget()
+        return cached_json_response(request, doc['body'], doc['etag'], BOOTSTRAP_CACHE_CONTROL)
 
 
 class VariantsListView(APIView):
@@ -162,8 +436,7 @@ class VariantsListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        qs = BoxVariant.objects.all().order_by('order', 'code')
-        return Response(BoxVariantSerializer(qs, many=True).data)
+        return Response(BoxVariantSerializer(_variants_with_images(), many=True).data)
 
     def post(self, request):
         code = (request.data.get('code') or '').strip().lower().replace(' ', '_')
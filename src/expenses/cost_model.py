@@ -0,0 +1,179 @@
+"""
+Compiled cost model used for order cost snapshots.
+
+Parses CostSettings (cost_con_luz_componentes, variant_grams, grams_caja_sin_luz,
+cost_troqueles_por_cajita) and reads the latest PLA/packaging prices from the LatestPurchasePrice
+index once, keeping the resulting unit costs per (box_type, variant). The model is cached per process and rebuilt when the
+'cost_model' data version is bumped (expenses.signals), so finalizing an order costs dict lookups.
+"""
+import math
+
+from memory_box.versioning import VersionedCache
+from orders.models import BoxType, Variant
+from .models import CostSettings, LatestPurchasePrice, PurchaseCategory, normalize_variant
+from .price_history import get_price_history
+
+COST_MODEL_VERSION = 'cost_model'
+
+# Purchase categories the model reads; changes to other categories don't invalidate it.
+COST_CATEGORIES = (
+    PurchaseCategory.PLA_ROLL,
+    PurchaseCategory.CAJA_CARTON,
+    PurchaseCategory.BOLSA_ECOMMERCE,
+)
+
+# Mapeo variant del pedido -> nombre variante para PLA (Grafito, Madera, etc.)
+ORDER_VARIANT_TO_PLA_VARIANTE = {
+    'graphite': 'Grafito',
+    'wood': 'Madera',
+    'black': 'Negro',
+    'marble': 'Mármol',
+    'graphite_light': 'Grafito',
+    'wood_light': 'Madera',
+    'black_light': 'Negro',
+    'marble_light': 'Mármol',
+}
+
+DEFAULT_GRAMS_CAJA_SIN_LUZ = 63
+
+
+def pla_variant_name(order_variant):
+    """Nombre de variante PLA para el variant de un pedido (sin mapeo: el variant tal cual)."""
+    return ORDER_VARIANT_TO_PLA_VARIANTE.get(
+        (order_variant or '').strip().lower(),
+        (order_variant or '').strip()
+    )
+
+
+class CostModel:
+    """
+    Unit costs per (box_type, variant):
+    - Sin luz: cost_pla = gramos de la caja × costo por gramo del último rollo PLA de la variante.
+    - Con luz: cost_caja = suma de componentes de referencia (sin PLA).
+    - Empaque: 1 caja de cartón + 1 bolsa al costo unitario de la última compra de cada una.
+    - Troqueles: costo fijo por cajita.
+    Todo redondeado hacia arriba, sin decimales (igual que en el front).
+    """
+
+    def __init__(self, cost_data, pla_cost_per_gram, packaging_costs):
+        self.cost_data = cost_data
+        # {variant_key PLA: costo por gramo} del último rollo de cada variante
+        self.pla_cost_per_gram = pla_cost_per_gram
+        self.packaging_costs = packaging_costs
+        componentes = cost_data.get('cost_con_luz_componentes') or []
+        self.cost_con_luz = sum(
+            float(c.get('valor') or c.get('value') or 0)
+            for c in componentes
+        )
+        self.cost_empaque = packaging_costs['caja_carton'] + packaging_costs['bolsa_ecommerce']
+        self.cost_troqueles = float(cost_data.get('cost_troqueles_por_cajita') or 0)
+        self._snapshots = {}
+
+    @classmethod
+    def build(cls):
+        cost_data = CostSettings.objects.filter(pk=1).values_list('data', flat=True).first() or {}
+        pla_cost_per_gram = {}
+        packaging_costs = {PurchaseCategory.CAJA_CARTON: 0.0, PurchaseCategory.BOLSA_ECOMMERCE: 0.0}
+        # Latest-price index: one row per (category, variant), no scan over purchases.
+        for entry in LatestPurchasePrice.objects.filter(category__in=COST_CATEGORIES):
+            if entry.category == PurchaseCategory.PLA_ROLL:
+                pla_cost_per_gram[entry.variant_key] = entry.pla_cost_per_gram
+            else:
+                packaging_costs[entry.category] = float(entry.unit_cost)
+        return cls(cost_data, pla_cost_per_gram, packaging_costs)
+
+    @classmethod
+    def as_of(cls, day, history=None):
+        """
+        Model with the purchase prices in effect on ``day`` (expenses.price_history), for
+        recomputing or auditing past orders. CostSettings (grams, components) has no history:
+        the current values are used.
+        """
+        history = history or get_price_history()
+        cost_data = CostSettings.objects.filter(pk=1).values_list('data', flat=True).first() or {}
+        pla_cost_per_gram = {}
+        packaging_costs = {PurchaseCategory.CAJA_CARTON: 0.0, PurchaseCategory.BOLSA_ECOMMERCE: 0.0}
+        for (category, variant_key), (unit_cost, cost_per_gram) in history.prices_as_of(day, COST_CATEGORIES).items():
+            if category == PurchaseCategory.PLA_ROLL:
+                pla_cost_per_gram[variant_key] = cost_per_gram
+            else:
+                packaging_costs[category] = float(unit_cost)
+        return cls(cost_data, pla_cost_per_gram, packaging_costs)
+
+    def grams_for(self, variante_name):
+        """Gramos de la caja sin luz: grams_caja_sin_luz, sino variant_grams[variante], sino 63."""
+        grams = self.cost_data.get('grams_caja_sin_luz')
+        if grams is None or grams == '':
+            grams = (self.cost_data.get('variant_grams') or {}).get(variante_name)
+        if grams is not None and grams != '':
+            return float(grams)
+        return DEFAULT_GRAMS_CAJA_SIN_LUZ
+
+    def pla_usage(self, box_type, variant):
+        """(variant_key PLA, gramos) que consume una caja, igual que cost_pla; None con luz o sin variante."""
+        if box_type == BoxType.WITH_LIGHT:
+            return None
+        variante_name = pla_variant_name(variant)
+        if not variante_name:
+            return None
+        grams = self.grams_for(variante_name)
+        return (normalize_variant(variante_name), grams) if grams > 0 else None
+
+    def _compute(self, with_light, variante_name):
+        cost_caja = 0
+        cost_pla = 0
+        if with_light:
+            cost_caja = self.cost_con_luz
+        elif variante_name:
+            cost_per_gram = self.pla_cost_per_gram.get(normalize_variant(variante_name))
+            if cost_per_gram is not None:
+                grams = self.grams_for(variante_name)
+                if grams > 0:
+                    # Para sin luz el costo de la caja base es 100% PLA; guardamos en cost_pla para desglose.
+                    cost_pla = float(cost_per_gram) * grams
+        cost_caja_int = int(math.ceil(cost_caja))
+        cost_pla_int = int(math.ceil(cost_pla))
+        cost_empaque_int = int(math.ceil(self.cost_empaque))
+        cost_troqueles_int = int(math.ceil(self.cost_troqueles))
+        return {
+            'cost_caja': cost_caja_int,
+            'cost_pla': cost_pla_int,
+            'cost_empaque': cost_empaque_int,
+            'cost_troqueles': cost_troqueles_int,
+            'total': cost_caja_int + cost_pla_int + cost_empaque_int + cost_troqueles_int,
+        }
+
+    def snapshot(self, box_type, variant):
+        """Cost snapshot for an order with this box_type/variant (a fresh dict, safe to store)."""
+        with_light = box_type == BoxType.WITH_LIGHT
+        # Con luz el costo no depende de la variante.
+        key = (True, None) if with_light else (False, pla_variant_name(variant))
+        snap = self._snapshots.get(key)
+        if snap is None:
+            snap = self._compute(*key)
+            self._snapshots[key] = snap
+        return dict(snap)
+
+    def unit_cost_table(self):
+        """One row per catalog variant (graphite..marble sin luz, *_light con luz)."""
+        rows = []
+        for variant in Variant.values:
+            box_type = BoxType.WITH_LIGHT if variant.endswith('_light') else BoxType.NO_LIGHT
+            variante_name = pla_variant_name(variant)
+            row = {
+                'box_type': box_type,
+                'variant': variant,
+                'pla_variant': variante_name,
+                'grams': None if box_type == BoxType.WITH_LIGHT else self.grams_for(variante_name),
+            }
+            row.update(self.snapshot(box_type, variant))
+            rows.append(row)
+        return rows
+
+
+_cost_model = VersionedCache(CostModel.build, COST_MODEL_VERSION)
+
+
+def get_cost_model():
+    """Current compiled CostModel (rebuilt on CostSettings or PLA/packaging Purchase changes)."""
+    return _cost_model.get()
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:06
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_latest_price_index(apps, schema_editor):
+    """Fill Purchase.variant_key and build one LatestPurchasePrice row per (category, variant_key)."""
+    Purchase = apps.get_model('expenses', 'Purchase')
+    LatestPurchasePrice = apps.get_model('expenses', 'LatestPurchasePrice')
+    pla = Purchase.objects.filter(category='pla_roll')
+    for purchase in pla.only('id', 'variant').iterator():
+        purchase.variant_key = (purchase.variant or '').strip().lower()
+        purchase.save(update_fields=['variant_key'])
+    seen = set()
+    entries = []
+    for purchase in Purchase.objects.order_by('-date', '-id').iterator():
+        key = (purchase.category, purchase.variant_key)
+        if key in seen:
+            continue
+        seen.add(key)
+        if purchase.quantity and purchase.quantity > 0:
+            unit_cost = purchase.unit_cost if purchase.unit_cost is not None else (purchase.total_cost or Decimal('0')) / purchase.quantity
+        else:
+            unit_cost = Decimal('0')
+        pla_cost_per_gram = None
+        if purchase.category == 'pla_roll' and purchase.quantity and purchase.grams_per_roll and purchase.total_cost is not None:
+            pla_cost_per_gram = (purchase.total_cost / purchase.quantity) / purchase.grams_per_roll
+        entries.append(LatestPurchasePrice(
+            category=purchase.category,
+            variant_key=purchase.variant_key,
+            purchase_id=purchase.id,
+            date=purchase.date,
+            unit_cost=unit_cost,
+            pla_cost_per_gram=pla_cost_per_gram,
+        ))
+    LatestPurchasePrice.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0002_alter_purchase_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestPurchasePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('burbujas', 'Bubble roll'), ('caja_carton', 'Cardboard box (shipping)'), ('bolsa_ecommerce', 'Ecommerce bag'), ('publicidad_instagram', 'Instagram ads'), ('imagenes', 'Images'), ('pla_roll', 'PLA rollo'), ('otro', 'Other')], max_length=40)),
+                ('variant_key', models.CharField(blank=True, max_length=80)),
+                ('date', models.DateField()),
+                ('unit_cost', models.DecimalField(decimal_places=10, max_digits=20)),
+                ('pla_cost_per_gram', models.DecimalField(blank=True, decimal_places=10, max_digits=20, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Latest purchase price',
+                'verbose_name_plural': 'Latest purchase prices',
+            },
+        ),
+        migrations.AddField(
+            model_name='purchase',
+            name='variant_key',
+            field=models.CharField(blank=True, editable=False, max_length=80),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['category', 'variant_key', '-date', '-id'], name='purchase_latest_idx'),
+        ),
+        migrations.AddField(
+            model_name='latestpurchaseprice',
+            name='purchase',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='expenses.purchase'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='latestpurchaseprice',
+            unique_together={('category', 'variant_key')},
+        ),
+        migrations.RunPython(build_latest_price_index, migrations.RunPython.noop),
+    ]
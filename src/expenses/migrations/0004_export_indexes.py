@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0003_latest_purchase_price_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['date', 'id'], name='purchase_date_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_pnl_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='purchase',
+            name='purchase_category_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['category', 'date', 'id'], name='purchase_category_date_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from decimal import Decimal
 from django.db import models
+from django.db.models import Q
 
 
 class CostSettings(models.Model):
@@ -27,6 +28,11 @@ class PurchaseCategory(models.TextChoices):
     OTRO = 'otro', 'Other'
 
 
+def normalize_variant(variant):
+    """Clave de variante sin mayúsculas ni espacios de borde (reemplaza los filtros variant__iexact)."""
+    return (variant or '').strip().lower()
+
+
 class Purchase(models.Model):
     """Expense record (variable quantities and costs by date). For PLA rolls: cost per gram = (total_cost/quantity)/grams_per_roll."""
     category = models.CharField(max_length=40, choices=PurchaseCategory.choices)
@@ -47,11 +53,21 @@ class Purchase(models.Model):
         null=True, blank=True,
         help_text='PLA only: grams per roll (e.g. 1000). Cost per gram = (total_cost/quantity)/grams_per_roll'
     )
+    # Normalized variant (PLA only, empty otherwise), set on save; indexed for latest-price lookups.
+    variant_key = models.CharField(max_length=80, blank=True, editable=False)
 
     class Meta:
         ordering = ['-date', '-id']
         verbose_name = 'Purchase / expense'
         verbose_name_plural = 'Purchases / expenses'
+        indexes = [
+            models.Index(fields=['category', 'variant_key', '-date', '-id'], name='purchase_latest_idx'),
+            models.Index(fields=['date', 'id'], name='purchase_date_idx'),
+            # Estado de resultados y listado filtrado por categoría: rango de fechas, con id para el orden.
+            models.Index(fields=['category', 'date', 'id'], name='purchase_category_date_idx'),
+            # Gastos repartidos en ``days`` días (publicidad): pocos, leídos aparte.
+            models.Index(fields=['date', 'days'], condition=Q(days__gt=1), name='purchase_amortized_idx'),
+        ]
 
     def __str__(self):
         if self.category == PurchaseCategory.PLA_ROLL and self.variant:
@@ -66,15 +82,76 @@ class Purchase(models.Model):
             return None
         return (self.total_cost / self.quantity) / self.grams_per_roll
 
+    def unit_cost_value(self):
+        """unit_cost del registro si está definido, sino total_cost / quantity (0 sin cantidad)."""
+        if not self.quantity or self.quantity <= 0:
+            return Decimal('0')
+        if self.unit_cost is not None:
+            return self.unit_cost
+        return (self.total_cost or Decimal('0')) / self.quantity
+
     def save(self, *args, **kwargs):
         is_new = self.pk is None
+        self.variant_key = normalize_variant(self.variant) if self.category == PurchaseCategory.PLA_ROLL else ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('variant' in update_fields or 'category' in update_fields):
+            kwargs['update_fields'] = {*update_fields, 'variant_key'}
         super().save(*args, **kwargs)
         if is_new and self.category in (PurchaseCategory.CAJA_CARTON, PurchaseCategory.BOLSA_ECOMMERCE):
             from orders.models import PackagingStock
+            from orders.stock import add_packaging
             item_type = (
                 PackagingStock.CAJA_CARTON if self.category == PurchaseCategory.CAJA_CARTON
                 else PackagingStock.BOLSA_ECOMMERCE
             )
-            stock, _ = PackagingStock.objects.get_or_create(item_type=item_type, defaults={'quantity': 0})
-            stock.quantity += self.quantity
-            stock.save(update_fields=['quantity'])
+            add_packaging(item_type, self.quantity, purchase=self)
+        if is_new and self.category == PurchaseCategory.PLA_ROLL and self.variant_key and self.grams_per_roll:
+            from orders.stock import add_filament
+            add_filament(self.variant_key, self.quantity * self.grams_per_roll, purchase=self)
+
+
+class LatestPurchasePrice(models.Model):
+    """
+    Latest-price index: the most recent Purchase (by date, id) per (category, variant_key),
+    maintained by expenses.signals on every Purchase save/delete. variant_key is empty for
+    non-PLA categories, so packaging lookups are keyed by category alone.
+    """
+    category = models.CharField(max_length=40, choices=PurchaseCategory.choices)
+    variant_key = models.CharField(max_length=80, blank=True)
+    purchase = models.ForeignKey(Purchase, on_delete=models.CASCADE, related_name='+')
+    date = models.DateField()
+    unit_cost = models.DecimalField(max_digits=20, decimal_places=10)
+    pla_cost_per_gram = models.DecimalField(max_digits=20, decimal_places=10, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Latest purchase price'
+        verbose_name_plural = 'Latest purchase prices'
+        unique_together = [['category', 'variant_key']]
+
+    def __str__(self):
+        key = f'{self.category}:{self.variant_key}' if self.variant_key else self.category
+        return f'{key} = {self.unit_cost} ({self.date})'
+
+    @classmethod
+    def refresh(cls, category, variant_key):
+        """Recompute the entry for one key from its latest purchase (one indexed query + one write)."""
+        latest = (
+            Purchase.objects.filter(category=category, variant_key=variant_key)
+            .order_by('-date', '-id')
+            .first()
+        )
+        if latest is None:
+            cls.objects.filter(category=category, variant_key=variant_key).delete()
+            return None
+        entry, _ = cls.objects.update_or_create(
+            category=category,
+            variant_key=variant_key,
+            defaults={
+                'purchase': latest,
+                'date': latest.date,
+                'unit_cost': latest.unit_cost_value(),
+                'pla_cost_per_gram': latest.pla_cost_per_gram(),
+            },
+        )
+        return entry
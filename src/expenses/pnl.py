@@ -0,0 +1,172 @@
+"""
+Estado de resultados mensual: ventas y costo por pedido (COGS) contra los gastos de Purchase.
+
+- Ingresos, COGS y cantidad de ventas salen del rollup SalesDaily (orders.sales), agrupado por mes.
+- Los gastos se agrupan por mes y categoría con un GROUP BY sobre el índice (category, date).
+  Las compras con ``days`` (p. ej. publicidad de Instagram por semana) se reparten en partes
+  iguales por día desde ``date``, así una campaña que cruza el fin de mes cae en los dos meses.
+- PLA, cajas de cartón y bolsas (COST_CATEGORIES) ya entran al costo de cada pedido vía el
+  modelo de costos: se informan como compras de inventario y no se restan otra vez.
+
+Margen bruto = ingresos - COGS; margen neto = margen bruto - gastos operativos.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import CharField, Max, Q, Sum
+from django.db.models.functions import Cast, Substr
+from django.utils import timezone
+
+from orders.models import SalesDaily
+from .cost_model import COST_CATEGORIES
+from .models import Purchase, PurchaseCategory
+
+PURCHASES_VERSION = 'purchases'
+MAX_MONTHS = 60
+ZERO = Decimal('0')
+
+
+def month_start(value):
+    return value.replace(day=1)
+
+
+def next_month(value):
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def month_key(value):
+    return f'{value.year}-{value.month:02d}'
+
+
+def _month_of(field):
+    """'YYYY-MM' de un DateField en SQL: texto ISO recortado, sin la función de truncado por fila de SQLite."""
+    return Substr(Cast(field, CharField()), 1, 7)
+
+
+def _amortized(first_day, end_day):
+    """
+    {(mes, categoría): monto} de las compras con days > 1 que se solapan con [first_day, end_day).
+    El rango de fechas de búsqueda se acota con el máximo de ``days`` cargado; ambas queries usan
+    el índice parcial de compras amortizadas (purchase_amortized_idx).
+    """
+    spread = Purchase.objects.filter(days__gt=1)
+    longest = spread.aggregate(longest=Max('days'))['longest']
+    allocations = {}
+    if not longest:
+        return allocations
+    candidates = (
+        spread.filter(date__gt=first_day - timedelta(days=longest), date__lt=end_day)
+        .values_list('category', 'date', 'days')
+        .annotate(total=Sum('total_cost'))
+        .order_by()
+    )
+    for category, start, days, total in candidates:
+        per_day = (total or ZERO) / days
+        day = max(start, first_day)
+        stop = min(start + timedelta(days=days), end_day)
+        while day < stop:
+            boundary = min(next_month(day), stop)
+            key = (month_key(day), category)
+            allocations[key] = allocations.get(key, ZERO) + per_day * (boundary - day).days
+            day = boundary
+    return allocations
+
+
+def _money(value):
+    return float(round(value or ZERO, 2))
+
+
+def build_pnl(first_month, last_month):
+    """
+    Filas por mes [first_month, last_month] (primeros de mes) y totales: GROUP BY de ventas y de
+    gastos no amortizados, más el MAX(days) y las compras amortizadas que tocan el rango.
+    """
+    end_day = next_month(last_month)
+    months = []
+    month = first_month
+    while month < end_day:
+        months.append(month_key(month))
+        month = next_month(month)
+
+    sales = (
+        SalesDaily.objects.filter(date__gte=first_month, date__lt=end_day)
+        .annotate(month=_month_of('date'))
+        .values('month')
+        .annotate(count=Sum('count'), revenue=Sum('revenue'), cost=Sum('cost'))
+        .order_by()
+    )
+    sales_by_month = {row['month']: row for row in sales}
+
+    expenses = {}
+    direct = (
+        Purchase.objects.filter(category__in=PurchaseCategory.values, date__gte=first_month, date__lt=end_day)
+        .filter(Q(days__isnull=True) | Q(days__lte=1))
+        .annotate(month=_month_of('date'))
+        .values('month', 'category')
+        .annotate(total=Sum('total_cost'))
+        .order_by()
+    )
+    for row in direct:
+        key = (row['month'], row['category'])
+        expenses[key] = expenses.get(key, ZERO) + (row['total'] or ZERO)
+    for key, amount in _amortized(first_month, end_day).items():
+        expenses[key] = expenses.get(key, ZERO) + amount
+
+    rows = []
+    totals = {'orders': 0, 'revenue': ZERO, 'cogs': ZERO, 'expenses': {}, 'inventory_purchases': {}}
+    for key in months:
+        sale = sales_by_month.get(key, {})
+        revenue = sale.get('revenue') or ZERO
+        cogs = sale.get('cost') or ZERO
+        operating = {}
+        inventory = {}
+        for category in PurchaseCategory.values:
+            amount = expenses.get((key, category))
+            if not amount:
+                continue
+            target = inventory if category in COST_CATEGORIES else operating
+            target[category] = amount
+            bucket = totals['inventory_purchases'] if category in COST_CATEGORIES else totals['expenses']
+            bucket[category] = bucket.get(category, ZERO) + amount
+        operating_total = sum(operating.values(), ZERO)
+        totals['orders'] += sale.get('count') or 0
+        totals['revenue'] += revenue
+        totals['cogs'] += cogs
+        rows.append(_row(key, sale.get('count') or 0, revenue, cogs, operating, operating_total, inventory))
+
+    operating_total = sum(totals['expenses'].values(), ZERO)
+    summary = _row(None, totals['orders'], totals['revenue'], totals['cogs'], totals['expenses'],
+                   operating_total, totals['inventory_purchases'])
+    summary.pop('month')
+    return {
+        'from': months[0],
+        'to': months[-1],
+        'months': rows,
+        'totals': summary,
+    }
+
+
+def _row(month, orders, revenue, cogs, operating, operating_total, inventory):
+    gross = revenue - cogs
+    net = gross - operating_total
+    return {
+        'month': month,
+        'orders': orders,
+        'revenue': _money(revenue),
+        'cogs': _money(cogs),
+        'gross_margin': _money(gross),
+        'expenses': {category: _money(amount) for category, amount in operating.items()},
+        'expenses_total': _money(operating_total),
+        'inventory_purchases': {category: _money(amount) for category, amount in inventory.items()},
+        'net_margin': _money(net),
+        'net_margin_pct': round(float(net / revenue * 100), 1) if revenue else None,
+    }
+
+
+def default_range(today=None):
+    """Últimos 12 meses, incluido el actual."""
+    last = month_start(today or timezone.localdate())
+    first = last
+    for _ in range(11):
+        first = month_start(first - timedelta(days=1))
+    return first, last
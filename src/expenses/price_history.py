@@ -0,0 +1,156 @@
+"""
+Point-in-time purchase prices: the unit cost in effect on a given date per (category, variant_key).
+
+Each purchase opens an interval [date, date of the next purchase of the same key) during which its
+price applies (on the same date the highest id wins, like LatestPurchasePrice). Per key the start
+dates are kept sorted, so "price as of D" is a bisect: O(log n) per lookup, and a batch of dates
+for one key costs one version check plus a bisect per date.
+
+The index is process-local and maintained incrementally: expenses.signals bumps the
+'purchase_prices' version and the version of each touched key on every Purchase save/delete, and
+the next lookup re-reads only the keys whose version changed (one query each on
+purchase_latest_idx) plus the list of keys.
+"""
+import threading
+from bisect import bisect_right
+
+from memory_box.versioning import bump_version_on_commit, get_version
+from .models import Purchase, PurchaseCategory
+
+PRICE_HISTORY_VERSION = 'purchase_prices'
+
+_FIELDS = ('id', 'category', 'variant_key', 'date', 'quantity', 'unit_cost', 'total_cost', 'grams_per_roll')
+
+
+def key_version(category, variant_key):
+    return f'{PRICE_HISTORY_VERSION}:{category}:{variant_key}'
+
+
+def purchase_prices_changed(*keys):
+    """Invalidate the given (category, variant_key) series in every process, once the transaction commits."""
+    bump_version_on_commit(*(key_version(*key) for key in keys), PRICE_HISTORY_VERSION)
+
+
+class PriceSeries:
+    """Sorted start dates of one key with the unit cost (and PLA cost per gram) from each date on."""
+
+    __slots__ = ('dates', 'unit_costs', 'pla_costs_per_gram')
+
+    def __init__(self, purchases=()):
+        self.dates = []
+        self.unit_costs = []
+        self.pla_costs_per_gram = []
+        for purchase in purchases:
+            self.add(purchase)
+
+    def add(self, purchase):
+        """Append a purchase; they must come ordered by (date, id)."""
+        if self.dates and self.dates[-1] == purchase.date:
+            self.unit_costs[-1] = purchase.unit_cost_value()
+            self.pla_costs_per_gram[-1] = purchase.pla_cost_per_gram()
+            return
+        self.dates.append(purchase.date)
+        self.unit_costs.append(purchase.unit_cost_value())
+        self.pla_costs_per_gram.append(purchase.pla_cost_per_gram())
+
+    def index(self, day):
+        """Position of the purchase in effect on ``day``, or -1 before the first one."""
+        return bisect_right(self.dates, day) - 1
+
+    def __len__(self):
+        return len(self.dates)
+
+
+class PriceHistory:
+    """
+    ``unit_cost(category, variant_key, day)`` / ``pla_cost_per_gram(variant_key, day)``: price of the
+    latest purchase with date <= day (None before the first one). ``unit_costs`` and
+    ``pla_costs_per_gram_at`` answer many dates of one key at once.
+    """
+
+    def __init__(self):
+        self._series = {}
+        self._key_versions = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _load_key(self, key):
+        category, variant_key = key
+        purchases = (
+            Purchase.objects.filter(category=category, variant_key=variant_key)
+            .order_by('date', 'id')
+            .only(*_FIELDS)
+        )
+        return PriceSeries(purchases.iterator())
+
+    def sync(self):
+        """Bring the index up to date: re-read the key list and only the keys that changed."""
+        version = get_version(PRICE_HISTORY_VERSION)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            keys = Purchase.objects.values_list('category', 'variant_key').distinct().order_by()
+            series, key_versions = {}, {}
+            for key in keys:
+                # Read before loading: a bump during the load leaves the key stale for the next sync.
+                key_versions[key] = get_version(key_version(*key))
+                if key in self._series and self._key_versions.get(key) == key_versions[key]:
+                    series[key] = self._series[key]
+                else:
+                    series[key] = self._load_key(key)
+            # Swapped whole, so concurrent readers never see a half-updated dict.
+            self._series, self._key_versions = series, key_versions
+            self._version = version
+
+    def series(self, category, variant_key=''):
+        self.sync()
+        return self._series.get((category, variant_key))
+
+    def keys(self, category=None):
+        self.sync()
+        return [key for key in self._series if category is None or key[0] == category]
+
+    def unit_cost(self, category, variant_key, day):
+        return self.unit_costs(category, variant_key, [day])[0]
+
+    def unit_costs(self, category, variant_key, days):
+        """Unit cost in effect on each of ``days`` (same order), None before the first purchase."""
+        return self._at(self.series(category, variant_key), 'unit_costs', days)
+
+    def pla_cost_per_gram(self, variant_key, day):
+        return self.pla_costs_per_gram_at(variant_key, [day])[0]
+
+    def pla_costs_per_gram_at(self, variant_key, days):
+        return self._at(self.series(PurchaseCategory.PLA_ROLL, variant_key), 'pla_costs_per_gram', days)
+
+    def _at(self, series, attr, days):
+        if series is None:
+            return [None] * len(days)
+        values = getattr(series, attr)
+        result = []
+        for day in days:
+            i = series.index(day)
+            result.append(values[i] if i >= 0 else None)
+        return result
+
+    def prices_as_of(self, day, categories):
+        """{(category, variant_key): (unit_cost, pla_cost_per_gram)} in effect on ``day`` for ``categories``."""
+        self.sync()
+        prices = {}
+        for key, series in self._series.items():
+            if key[0] not in categories:
+                continue
+            i = series.index(day)
+            if i >= 0:
+                prices[key] = (series.unit_costs[i], series.pla_costs_per_gram[i])
+        return prices
+
+
+_history = PriceHistory()
+
+
+def get_price_history():
+    """Process-wide PriceHistory, synced lazily on each lookup."""
+    return _history
@@ -0,0 +1,52 @@
+"""
+Purchase/CostSettings side effects: keep the latest-price and point-in-time price indexes current
+and bump data versions so process-local caches rebuild (see memory_box.versioning).
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from memory_box.versioning import bump_version_on_commit
+from .cost_model import COST_MODEL_VERSION, COST_CATEGORIES
+from .pnl import PURCHASES_VERSION
+from .price_history import purchase_prices_changed
+from .models import CostSettings, Purchase, LatestPurchasePrice
+
+
+@receiver([post_save, post_delete], sender=CostSettings)
+def cost_settings_changed(sender, **kwargs):
+    bump_version_on_commit(COST_MODEL_VERSION)
+
+
+@receiver(pre_save, sender=Purchase)
+def purchase_remember_key(sender, instance, **kwargs):
+    # An edit can move a purchase to another (category, variant_key): that old key needs a refresh too.
+    instance._previous_price_key = None
+    if instance.pk is not None:
+        instance._previous_price_key = (
+            Purchase.objects.filter(pk=instance.pk).values_list('category', 'variant_key').first()
+        )
+
+
+@receiver(post_save, sender=Purchase)
+def purchase_saved(sender, instance, created, **kwargs):
+    key = (instance.category, instance.variant_key)
+    LatestPurchasePrice.refresh(*key)
+    previous = getattr(instance, '_previous_price_key', None)
+    if previous and tuple(previous) != key:
+        LatestPurchasePrice.refresh(*previous)
+        purchase_prices_changed(key, tuple(previous))
+    else:
+        purchase_prices_changed(key)
+    bump_version_on_commit(PURCHASES_VERSION)
+    # An edit may move a purchase out of a cost category, so only new rows are filtered.
+    if not created or instance.category in COST_CATEGORIES:
+        bump_version_on_commit(COST_MODEL_VERSION)
+
+
+@receiver(post_delete, sender=Purchase)
+def purchase_deleted(sender, instance, **kwargs):
+    LatestPurchasePrice.refresh(instance.category, instance.variant_key)
+    purchase_prices_changed((instance.category, instance.variant_key))
+    bump_version_on_commit(PURCHASES_VERSION)
+    if instance.category in COST_CATEGORIES:
+        bump_version_on_commit(COST_MODEL_VERSION)
@@ -1,3 +1,259 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache, caches
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from expenses.cost_model import CostModel, _cost_model, get_cost_model
+from expenses.models import CostSettings, LatestPurchasePrice, Purchase, PurchaseCategory
+from expenses.pnl import build_pnl
+from expenses.price_history import get_price_history
+from orders.models import Order, OrderStatus
+from users.models import AdminUser
+
+
+class PurchaseListQueryTests(TestCase):
+    """GET /api/purchases/: count, página y totales en 3 queries, con cualquier filtro, página o tamaño."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AdminUser.objects.create_user('admin', 'admin@example.com', 'x')
+        categories = [PurchaseCategory.PLA_ROLL, PurchaseCategory.CAJA_CARTON, PurchaseCategory.OTRO]
+        purchases = []
+        for i in range(120):
+            category = categories[i % len(categories)]
+            variant = ('Madera', 'Negro')[i % 2] if category == PurchaseCategory.PLA_ROLL else ''
+            purchases.append(Purchase(
+                category=category, variant=variant, variant_key=variant.lower(),
+                date=date(2025, 1, 1) + timedelta(days=i * 3), quantity=1, total_cost=Decimal(100 + i),
+            ))
+        Purchase.objects.bulk_create(purchases)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_query_count_is_constant(self):
+        cases = [
+            '',
+            '?page=2',
+            '?page_size=7&page=3',
+            '?page_size=500',
+            '?category=pla_roll',
+            '?category=pla_roll,otro&from=2025-03-01&to=2025-09-30',
+            '?variant=madera&page_size=5&page=2',
+            '?from=2025-06-01',
+            '?to=2025-02-01',
+        ]
+        for query in cases:
+            with self.subTest(query=query), self.assertNumQueries(3):
+                response = self.client.get(f'/api/purchases/{query}')
+                self.assertEqual(response.status_code, 200)
+
+    def test_totals_cover_the_filtered_set(self):
+        response = self.client.get('/api/purchases/?category=pla_roll&page_size=5')
+        data = response.json()
+        pla = Purchase.objects.filter(category=PurchaseCategory.PLA_ROLL)
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(data['count'], pla.count())
+        self.assertEqual(data['totals']['count'], pla.count())
+        self.assertEqual(data['totals']['total_cost'], float(sum(p.total_cost for p in pla)))
+        self.assertEqual(list(data['totals']['by_category']), [PurchaseCategory.PLA_ROLL])
+
+
+class CostModelTests(TestCase):
+    """Modelo de costos compilado: cacheado por proceso, reconstruido al cambiar CostSettings o compras."""
+
+    def setUp(self):
+        cache.clear()
+        _cost_model.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            CostSettings.objects.create(id=1, data={'grams_caja_sin_luz': 50, 'cost_troqueles_por_cajita': 30})
+            self._buy(PurchaseCategory.PLA_ROLL, 20000, variant='Madera', grams_per_roll=1000)
+            self._buy(PurchaseCategory.CAJA_CARTON, 1000, quantity=10)
+            self._buy(PurchaseCategory.BOLSA_ECOMMERCE, 500, quantity=10)
+
+    def _buy(self, category, total_cost, quantity=1, **fields):
+        return Purchase.objects.create(
+            category=category, date=date(2025, 1, 1), quantity=quantity, total_cost=Decimal(total_cost), **fields
+        )
+
+    def test_snapshot_from_settings_and_latest_purchases(self):
+        self.assertEqual(get_cost_model().snapshot('no_light', 'wood'), {
+            'cost_caja': 0, 'cost_pla': 1000, 'cost_empaque': 150, 'cost_troqueles': 30, 'total': 1180,
+        })
+        # Sin compras de PLA de la variante no hay costo de PLA.
+        self.assertEqual(get_cost_model().snapshot('no_light', 'black')['cost_pla'], 0)
+
+    def test_cached_until_a_purchase_changes_it(self):
+        get_cost_model()
+        with self.assertNumQueries(0):
+            get_cost_model()
+        with self.captureOnCommitCallbacks(execute=True):
+            self._buy(PurchaseCategory.PLA_ROLL, 30000, variant='madera ', grams_per_roll=1000)
+        self.assertEqual(get_cost_model().snapshot('no_light', 'wood')['cost_pla'], 1500)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CostSettings.objects.update_or_create(id=1, defaults={'data': {'grams_caja_sin_luz': 10}})
+        self.assertEqual(get_cost_model().snapshot('no_light', 'wood')['cost_pla'], 300)
+
+    def test_unit_cost_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(AdminUser.objects.create_user('admin', 'admin@example.com', 'x'))
+        data = client.get('/api/settings/costs/unit-costs/').json()
+        wood = next(row for row in data['rows'] if row['variant'] == 'wood')
+        self.assertEqual((wood['grams'], wood['total']), (50, 1180))
+        self.assertEqual(data['pla_cost_per_gram'], {'madera': 20.0})
+        self.assertEqual(data['packaging_unit_costs'], {'caja_carton': 100.0, 'bolsa_ecommerce': 50.0})
+
+
+class LatestPurchasePriceTests(TestCase):
+    """Índice de último precio: una fila por (categoría, variante), al día con altas, ediciones y bajas."""
+
+    def _pla(self, day, total_cost, variant='Madera'):
+        return Purchase.objects.create(
+            category=PurchaseCategory.PLA_ROLL, date=day, quantity=2, total_cost=Decimal(total_cost),
+            variant=variant, grams_per_roll=1000,
+        )
+
+    def _entries(self):
+        return {
+            (e.category, e.variant_key): (e.purchase_id, e.unit_cost, e.pla_cost_per_gram)
+            for e in LatestPurchasePrice.objects.all()
+        }
+
+    def test_latest_purchase_by_date(self):
+        newer = self._pla(date(2025, 3, 1), 40000, variant=' MADERA')
+        self._pla(date(2025, 1, 1), 20000)
+        self.assertEqual(self._entries(), {('pla_roll', 'madera'): (newer.pk, 20000, 20)})
+
+    def test_edit_and_delete_refresh_both_keys(self):
+        old = self._pla(date(2025, 1, 1), 20000)
+        newer = self._pla(date(2025, 3, 1), 40000)
+        newer.variant = 'Negro'
+        newer.save()
+        self.assertEqual(self._entries(), {
+            ('pla_roll', 'madera'): (old.pk, 10000, 10),
+            ('pla_roll', 'negro'): (newer.pk, 20000, 20),
+        })
+        old.delete()
+        self.assertEqual(list(self._entries()), [('pla_roll', 'negro')])
+
+
+class ProfitAndLossTests(TestCase):
+    """Estado de resultados sobre un fixture chico: totales a mano, gastos repartidos por días."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AdminUser.objects.create_user('admin', 'admin@example.com', 'x')
+        for month, day, price, cost in ((1, 5, 20000, 5000), (1, 20, 20000, 6000), (2, 14, 31500, 9000)):
+            Order.objects.create(
+                client_name='c', box_type='no_light', variant='wood', status=OrderStatus.DELIVERED,
+                finalized_at=timezone.make_aware(datetime(2025, month, day, 12)),
+                sale_price=price, production_cost=cost,
+            )
+        purchases = [
+            (PurchaseCategory.OTRO, date(2025, 1, 10), 1000, None),
+            (PurchaseCategory.PLA_ROLL, date(2025, 1, 20), 8000, None),
+            # 10 días desde el 25/1: 7 en enero, 3 en febrero.
+            (PurchaseCategory.PUBLICIDAD_INSTAGRAM, date(2025, 1, 25), 1000, 10),
+        ]
+        for category, day, total, days in purchases:
+            Purchase.objects.create(category=category, date=day, total_cost=Decimal(total), days=days)
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+
+    def test_monthly_rows_and_totals(self):
+        with self.assertNumQueries(4):
+            data = build_pnl(date(2025, 1, 1), date(2025, 3, 1))
+        jan, feb, mar = data['months']
+        self.assertEqual((data['from'], data['to']), ('2025-01', '2025-03'))
+        self.assertEqual(
+            (jan['orders'], jan['revenue'], jan['cogs'], jan['gross_margin'], jan['expenses_total'], jan['net_margin']),
+            (2, 40000, 11000, 29000, 1700, 27300),
+        )
+        self.assertEqual(jan['expenses'], {'publicidad_instagram': 700, 'otro': 1000})
+        self.assertEqual(jan['inventory_purchases'], {'pla_roll': 8000})
+        self.assertEqual((feb['orders'], feb['net_margin'], feb['expenses']), (1, 22200, {'publicidad_instagram': 300}))
+        self.assertEqual((mar['orders'], mar['revenue'], mar['net_margin_pct']), (0, 0, None))
+
+        totals = data['totals']
+        self.assertEqual(
+            (totals['orders'], totals['revenue'], totals['cogs'], totals['expenses_total'], totals['net_margin']),
+            (3, 71500, 20000, 2000, 49500),
+        )
+        self.assertEqual(totals['inventory_purchases'], {'pla_roll': 8000})
+        self.assertEqual(totals['net_margin_pct'], round(49500 / 71500 * 100, 1))
+
+    def test_endpoint_cached_until_a_purchase(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = '/api/settings/costs/pnl/?from=2025-01&to=2025-03'
+        response = client.get(url)
+        self.assertEqual(response.json()['totals']['net_margin'], 49500)
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Purchase.objects.create(category=PurchaseCategory.OTRO, date=date(2025, 2, 1), total_cost=Decimal(500))
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['totals']['net_margin'], 49000)
+        self.assertEqual(client.get('/api/settings/costs/pnl/?from=2025-13').status_code, 400)
+
+
+class PriceHistoryTests(TestCase):
+    """Precios a una fecha: coinciden con 'última compra <= fecha' y CostModel.as_of con _compute."""
+
+    def setUp(self):
+        cache.clear()
+        CostSettings.objects.create(id=1, data={'grams_caja_sin_luz': 50})
+        pla = [(date(2025, 1, 1), 20000), (date(2025, 3, 1), 30000), (date(2025, 3, 1), 25000), (date(2025, 5, 10), 40000)]
+        for day, total in pla:
+            Purchase.objects.create(category=PurchaseCategory.PLA_ROLL, date=day, total_cost=Decimal(total),
+                                    variant='Madera', grams_per_roll=1000)
+        for day, total in ((date(2025, 1, 15), 1000), (date(2025, 4, 1), 1500)):
+            Purchase.objects.create(category=PurchaseCategory.CAJA_CARTON, date=day, quantity=10,
+                                    total_cost=Decimal(total))
+        self.days = [date(2024, 12, 31) + timedelta(days=i * 9) for i in range(25)]
+
+    def _latest(self, category, day):
+        """Fuerza bruta: la compra vigente el ``day`` (fecha <= day; el id más alto gana en el mismo día)."""
+        return Purchase.objects.filter(category=category, date__lte=day).order_by('-date', '-id').first()
+
+    def test_matches_brute_force(self):
+        history = get_price_history()
+        for category in (PurchaseCategory.PLA_ROLL, PurchaseCategory.CAJA_CARTON):
+            key = 'madera' if category == PurchaseCategory.PLA_ROLL else ''
+            expected = [(p.unit_cost_value() if p else None) for p in (self._latest(category, d) for d in self.days)]
+            with self.subTest(category=category):
+                self.assertEqual(history.unit_costs(category, key, self.days), expected)
+        self.assertEqual(history.pla_cost_per_gram('madera', date(2025, 3, 1)), 25)
+
+    def test_cost_model_as_of_matches_compute(self):
+        for day in self.days:
+            pla = self._latest(PurchaseCategory.PLA_ROLL, day)
+            caja = self._latest(PurchaseCategory.CAJA_CARTON, day)
+            manual = CostModel(
+                {'grams_caja_sin_luz': 50},
+                {'madera': pla.pla_cost_per_gram()} if pla else {},
+                {'caja_carton': float(caja.unit_cost_value()) if caja else 0.0, 'bolsa_ecommerce': 0.0},
+            )
+            with self.subTest(day=day):
+                self.assertEqual(CostModel.as_of(day).snapshot('no_light', 'wood'), manual._compute(False, 'Madera'))
 
-# Create your tests here.
+    def test_incremental_sync(self):
+        history = get_price_history()
+        history.sync()
+        with self.assertNumQueries(0):
+            history.unit_cost(PurchaseCategory.CAJA_CARTON, '', date(2025, 4, 2))
+        purchase = Purchase.objects.get(category=PurchaseCategory.CAJA_CARTON, date=date(2025, 4, 1))
+        purchase.date = date(2025, 6, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase.save()
+        # La lista de claves y sólo la serie que cambió.
+        with self.assertNumQueries(2):
+            self.assertEqual(history.unit_cost(PurchaseCategory.CAJA_CARTON, '', date(2025, 4, 2)), 100)
+        self.assertEqual(history.unit_cost(PurchaseCategory.CAJA_CARTON, '', date(2025, 6, 1)), 150)
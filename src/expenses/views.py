@@ -1,9 +1,15 @@
+from datetime import datetime
+
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
+from memory_box.response_cache import ResponseCache
+from orders.sales import SALES_VERSION
+from .cost_model import get_cost_model
 from .models import CostSettings
+from .pnl import MAX_MONTHS, PURCHASES_VERSION, build_pnl, default_range
 
 
 def get_cost_settings():
@@ -30,3 +36,62 @@ class CostSettingsView(APIView):
         obj.data = request.data
         obj.save(update_fields=['data'])
         return Response(obj.data)
+
+
+class CostUnitTableView(APIView):
+    """GET: tabla de costos unitarios vigente por (box_type, variant) del modelo de costos compilado."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        model = get_cost_model()
+        try:
+            rows = model.unit_cost_table()
+        except (TypeError, ValueError) as e:
+            return Response({'detail': f'Invalid cost settings: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'rows': rows,
+            'pla_cost_per_gram': {
+                variant: float(cost) if cost is not None else None
+                for variant, cost in model.pla_cost_per_gram.items()
+            },
+            'packaging_unit_costs': model.packaging_costs,
+        })
+
+
+_pnl_cache = ResponseCache('pnl', SALES_VERSION, PURCHASES_VERSION)
+
+
+def _parse_month(value):
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except (TypeError, ValueError):
+        return None
+
+
+class ProfitAndLossView(APIView):
+    """
+    GET: estado de resultados por mes (expenses.pnl). Query params: from, to (YYYY-MM, inclusive;
+    por defecto los últimos 12 meses). Cacheado por versiones 'sales'/'purchases', con ETag/304.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        first, last = default_range()
+        for param in ('from', 'to'):
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            month = _parse_month(value)
+            if month is None:
+                return Response({'detail': f'{param} must be a month (YYYY-MM).'}, status=status.HTTP_400_BAD_REQUEST)
+            if param == 'from':
+                first = month
+            else:
+                last = month
+        span = (last.year - first.year) * 12 + last.month - first.month + 1
+        if span < 1 or span > MAX_MONTHS:
+            return Response(
+                {'detail': f'from..to must cover between 1 and {MAX_MONTHS} months.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return _pnl_cache.respond(request, (first, last), lambda: build_pnl(first, last))
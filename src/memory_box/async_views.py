@@ -0,0 +1,139 @@
+"""
+Async-native read endpoints for the ASGI deployment (uvicorn memory_box.asgi:application).
+
+DRF views are sync, so under ASGI Django runs each of them through sync_to_async on the single
+thread-sensitive executor. AsyncReadView answers GET/HEAD in the event loop (async ORM, CPU work
+on the default executor) and hands every other method to the existing DRF view on a worker thread,
+so writes keep their DRF validation, permissions and signals untouched.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+_renderer = JSONRenderer()
+
+
+def render_json(data):
+    """Same bytes DRF's JSONRenderer would produce for a Response(data)."""
+    return _renderer.render(data)
+
+
+def json_response(data, status=200, headers=None):
+    return HttpResponse(
+        render_json(data),
+        status=status,
+        content_type='application/json',
+        headers=headers,
+    )
+
+
+def etag_matches(request, etag):
+    """True if the request's If-None-Match covers ``etag`` (weak comparison, as for GET)."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return etag.removeprefix('W/') in candidates
+
+
+def cached_json_response(request, body, etag, cache_control):
+    """Pre-rendered JSON document with validators: 304 when the client already has ``etag``."""
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+    if etag_matches(request, etag):
+        return HttpResponse(status=304, headers=headers)
+    return HttpResponse(body, content_type='application/json', headers=headers)
+
+
+def run_cpu(func, *args, **kwargs):
+    """Run CPU-bound work (serializers, payload building) off the event loop, outside the DB thread."""
+    return sync_to_async(func, thread_sensitive=False)(*args, **kwargs)
+
+
+_DONE = object()
+
+
+async def aiterate(iterator):
+    """
+    Async iterator over a sync one (e.g. a queryset .iterator()), one item per thread hop.
+    StreamingHttpResponse under ASGI would otherwise buffer a sync iterator whole with list().
+    Items are pulled on the shared sync thread, so a server-side cursor stays on one connection.
+    """
+    iterator = iter(iterator)
+    pull = sync_to_async(lambda: next(iterator, _DONE))
+    try:
+        while (item := await pull()) is not _DONE:
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+async def aauthenticate(request):
+    """
+    Async equivalent of JWTAuthentication: token validation is pure CPU, only the user lookup
+    touches the database. Returns the user or raises a DRF AuthenticationFailed/NotAuthenticated.
+    """
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        raise exceptions.NotAuthenticated()
+    validated = auth.get_validated_token(raw_token)
+    try:
+        user_id = validated[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise exceptions.AuthenticationFailed('Token contained no recognizable user identification')
+    try:
+        user = await auth.user_model.objects.aget(**{jwt_settings.USER_ID_FIELD: user_id})
+    except auth.user_model.DoesNotExist:
+        raise exceptions.AuthenticationFailed('User not found', code='user_not_found')
+    if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise exceptions.AuthenticationFailed('User is inactive', code='user_inactive')
+    return user
+
+
+class AsyncReadView(View):
+    """
+    GET/HEAD served by the async ``get`` handler; other methods are delegated to ``write_view``
+    (a DRF ``as_view()`` callable) on a thread. Set ``require_auth`` for admin-only reads.
+    """
+    write_view = None
+    require_auth = False
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # DRF views are csrf-exempt (JWT auth); the wrapper must be too or writes never reach them.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            # Read from the class: a plain function attribute would otherwise bind to self.
+            write_view = type(self).write_view
+            if write_view is None:
+                return json_response(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=405,
+                    headers={'Allow': 'GET, HEAD'},
+                )
+            return await sync_to_async(write_view)(request, *args, **kwargs)
+        if self.require_auth:
+            try:
+                request.user = await aauthenticate(request)
+            except exceptions.APIException as exc:
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                headers = None
+                if exc.status_code == 401:
+                    headers = {'WWW-Authenticate': JWTAuthentication().authenticate_header(request)}
+                return json_response(data, status=exc.status_code, headers=headers)
+        return await self.get(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        raise NotImplementedError
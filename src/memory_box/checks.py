@@ -0,0 +1,23 @@
+"""
+System checks (registered from config.apps): the data versions (memory_box.versioning) only
+reach every uvicorn worker when the default cache is shared between processes.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register(Tags.caches)
+def check_shared_version_cache(app_configs, **kwargs):
+    # Un solo worker con locmem es válido (el Dockerfile corre uno): sólo falla con varios.
+    if settings.DEBUG or settings.WEB_CONCURRENCY <= 1:
+        return []
+    if settings.CACHES['default']['BACKEND'] != LOCMEM_BACKEND:
+        return []
+    return [Error(
+        f'WEB_CONCURRENCY={settings.WEB_CONCURRENCY} with a local-memory default cache: a version '
+        'bump in one worker never reaches the others, which keep serving stale data.',
+        hint='Set CACHE_BACKEND=file (with CACHE_LOCATION) or CACHE_BACKEND=db.',
+        id='memory_box.E001',
+    )]
@@ -0,0 +1,242 @@
+"""
+Serving of STATIC_URL/MEDIA_URL files (background video/audio, catalog images, crops).
+
+Replaces django.views.static.serve (the static() helper) with:
+- single-range Range requests (206/416) and If-Range, so video/audio seek without downloading;
+- ETag (content hash) + Last-Modified validators, answered with 304;
+- Cache-Control: immutable for a year when the URL carries ?v=<content hash> (see versioned_url),
+  revalidation otherwise;
+- bodies streamed in STREAM_CHUNK_SIZE pieces: under ASGI (uvicorn, the deployment) from an async
+  iterator whose reads run in worker threads, since Django would buffer a sync iterator whole with
+  list(); under WSGI a FileResponse (wsgi.file_wrapper, sendfile where the server supports it);
+- optional offload to the front proxy: with MEDIA_OFFLOAD_HEADER='X-Accel-Redirect' (nginx) or
+  'X-Sendfile' (Apache/lighttpd), Django only sets headers and the proxy streams the file.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+HASH_CHUNK_SIZE = 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# {full path: (size, mtime_ns, hash)}: a file is hashed once per process until it changes.
+_hashes = {}
+_hashes_lock = threading.Lock()
+
+
+def content_hash(fullpath, stat=None):
+    """Short SHA-256 of the file contents, cached by (size, mtime)."""
+    stat = stat or os.stat(fullpath)
+    cached = _hashes.get(fullpath)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(fullpath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    value = digest.hexdigest()[:16]
+    with _hashes_lock:
+        _hashes[fullpath] = (stat.st_size, stat.st_mtime_ns, value)
+    return value
+
+
+def _roots():
+    return (
+        (settings.MEDIA_URL, settings.MEDIA_ROOT),
+        (settings.STATIC_URL, settings.STATIC_ROOT),
+    )
+
+
+def local_path(url):
+    """Filesystem path for a /media/ or /static/ URL (None for external URLs or missing files)."""
+    url = (url or '').split('?', 1)[0]
+    for prefix, root in _roots():
+        if prefix and url.startswith(prefix):
+            try:
+                path = safe_join(root, url[len(prefix):])
+            except Exception:
+                return None
+            return path if os.path.isfile(path) else None
+    return None
+
+
+def versioned_url(url):
+    """Append ?v=<content hash> to a local media/static URL so it can be cached as immutable."""
+    path = local_path(url)
+    if not path:
+        return url
+    return f'{url.split("?", 1)[0]}?v={content_hash(path)}'
+
+
+def _parse_range(header, size):
+    """(start, end) inclusive for a single satisfiable byte range; None to ignore; False if unsatisfiable."""
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None  # multiple ranges or other units: serve the whole file (allowed by RFC 9110)
+    first, last = match.groups()
+    if first == '' and last == '':
+        return None
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        tags = [t.strip().removeprefix('W/') for t in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+    return since is not None and int(mtime) <= since
+
+
+def _iter_range(fullpath, start, length):
+    with open(fullpath, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def _aiter_range(fullpath, start, length):
+    """_iter_range for ASGI: each read runs in a worker thread and is sent before the next one."""
+    iterator = _iter_range(fullpath, start, length)
+    pull = sync_to_async(lambda: next(iterator, None), thread_sensitive=False)
+    try:
+        while (chunk := await pull()) is not None:
+            yield chunk
+    finally:
+        iterator.close()
+
+
+def _body_response(request, fullpath, start, length, content_type, status=200):
+    if isinstance(request, ASGIRequest):
+        return StreamingHttpResponse(_aiter_range(fullpath, start, length), status=status, content_type=content_type)
+    if status == 200:
+        return FileResponse(open(fullpath, 'rb'), content_type=content_type)
+    return StreamingHttpResponse(_iter_range(fullpath, start, length), status=status, content_type=content_type)
+
+
+def _offload_response(fullpath, document_root, path):
+    header = getattr(settings, 'MEDIA_OFFLOAD_HEADER', '')
+    response = HttpResponse()
+    if header.lower() == 'x-accel-redirect':
+        # nginx maps this internal location onto document_root and handles Range itself.
+        prefix = getattr(settings, 'MEDIA_OFFLOAD_PREFIX', '/protected/')
+        root_name = os.path.basename(os.path.normpath(str(document_root)))
+        response[header] = f'{prefix.rstrip("/")}/{root_name}/{quote(path)}'
+    else:
+        response[header] = fullpath
+    # Let the proxy set the real Content-Type from the file.
+    del response['Content-Type']
+    return response
+
+
+def respond(request, fullpath, *, size, mtime, etag, content_type, cache_control,
+            encoding=None, ranges=True, offload=None, vary_encoding=False):
+    """
+    Response for one file whose metadata is already known: 304, 206/416 for Range (if ``ranges``),
+    proxy offload when ``offload`` is (document_root, path), else the file streamed by chunks.
+    """
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(mtime),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes' if ranges else 'none',
+    }
+    if vary_encoding:
+        headers['Vary'] = 'Accept-Encoding'
+    if _not_modified(request, etag, mtime):
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    if offload and getattr(settings, 'MEDIA_OFFLOAD_HEADER', ''):
+        response = _offload_response(fullpath, *offload)
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if (ranges and range_header and request.method == 'GET'
+            and (not if_range or if_range.strip() == etag)):
+        byte_range = _parse_range(range_header, size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            response = _body_response(request, fullpath, start, length, content_type, status=206)
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            for key, value in headers.items():
+                response[key] = value
+            return response
+
+    response = _body_response(request, fullpath, 0, size, content_type)
+    response['Content-Length'] = str(size)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for key, value in headers.items():
+        response[key] = value
+    return response
+
+
+def serve(request, path, document_root=None):
+    """View for url patterns: path=<relative file path>, document_root=<MEDIA_ROOT or STATIC_ROOT>."""
+    if any(part.startswith('.') for part in path.split('/')):
+        # Hidden entries (e.g. in-progress chunked uploads under MEDIA_ROOT/.chunked) are private.
+        raise Http404('File not found')
+    try:
+        fullpath = safe_join(document_root, path)
+    except Exception:
+        raise Http404('Invalid path')
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404('File not found')
+    if not os.path.isfile(fullpath):
+        raise Http404('File not found')
+
+    etag = f'"{content_hash(fullpath, stat)}"'
+    versioned = request.GET.get('v') == etag.strip('"')
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    return respond(
+        request, fullpath,
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        etag=etag,
+        content_type=content_type or 'application/octet-stream',
+        encoding=encoding,
+        cache_control=IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL,
+        offload=(document_root, path),
+    )
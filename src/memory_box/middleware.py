@@ -0,0 +1,172 @@
+"""
+StaticMediaMiddleware: answers STATIC_URL and MEDIA_URL requests before the rest of the stack
+(no URL resolution, sessions, auth or CSRF for asset hits).
+
+STATIC_ROOT is indexed once at startup: relative path -> size, mtime, ETag (content hash), content
+type and the precompressed siblings written by collectstatic (memory_box.storage: .br, .gz).
+Requests are answered from the index and only open the chosen file, picking brotli or gzip from
+Accept-Encoding. Content-hashed names (base.3f2a9c1d0b7e.css) are cached for a year as immutable.
+Bodies go out through memory_box.media.respond, so under uvicorn they are streamed in chunks from
+an async iterator, not buffered.
+
+Media files change at runtime (uploads), so MEDIA_URL goes through memory_box.media.serve, which
+keeps its content hashes per (size, mtime). Files that are not found fall through to the URL
+patterns, so files added to STATIC_ROOT after startup are still served.
+"""
+import mimetypes
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import Http404
+
+from . import media
+
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+# (Content-Encoding, sibling suffix), in order of preference.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class StaticEntry:
+    __slots__ = ('path', 'size', 'mtime', 'etag', 'content_type', 'cache_control', 'variants')
+
+    def __init__(self, path, stat, content_type, immutable):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.etag = f'"{media.content_hash(path, stat)}"'
+        self.content_type = content_type
+        self.cache_control = media.IMMUTABLE_CACHE_CONTROL if immutable else media.REVALIDATE_CACHE_CONTROL
+        # {encoding: (path, size)}
+        self.variants = {}
+
+
+def build_static_index(root):
+    """{relative URL path: StaticEntry} for every file under ``root`` (empty if it doesn't exist)."""
+    index = {}
+    if not root or not os.path.isdir(root):
+        return index
+    root = os.fspath(root)
+    siblings = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for name in filenames:
+            if name.startswith('.'):
+                continue
+            fullpath = os.path.join(dirpath, name)
+            rel = os.path.relpath(fullpath, root).replace(os.sep, '/')
+            if any(name.endswith(suffix) for _, suffix in ENCODINGS):
+                siblings.append((rel, fullpath))
+                continue
+            content_type, encoding = mimetypes.guess_type(name)
+            if encoding:
+                # Genuinely compressed files (.tar.gz) are served as they are, through the URL pattern.
+                continue
+            index[rel] = StaticEntry(
+                fullpath,
+                os.stat(fullpath),
+                content_type or 'application/octet-stream',
+                immutable=bool(HASHED_NAME_RE.search(name)),
+            )
+    for rel, fullpath in siblings:
+        for encoding, suffix in ENCODINGS:
+            entry = index.get(rel[:-len(suffix)]) if rel.endswith(suffix) else None
+            if entry is not None:
+                entry.variants[encoding] = (fullpath, os.stat(fullpath).st_size)
+    return index
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for item in (header or '').split(','):
+        token, _, params = item.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+def serve_static_entry(request, entry):
+    variant = None
+    if entry.variants and not request.headers.get('Range'):
+        accepted = _accepted_encodings(request.headers.get('Accept-Encoding'))
+        for encoding, _suffix in ENCODINGS:
+            if encoding in entry.variants and encoding in accepted:
+                variant = encoding
+                break
+    if variant is None:
+        return media.respond(
+            request, entry.path,
+            size=entry.size, mtime=entry.mtime, etag=entry.etag,
+            content_type=entry.content_type, cache_control=entry.cache_control,
+            vary_encoding=bool(entry.variants),
+        )
+    path, size = entry.variants[variant]
+    return media.respond(
+        request, path,
+        size=size, mtime=entry.mtime,
+        # A distinct validator per representation.
+        etag=f'{entry.etag[:-1]}-{variant}"',
+        content_type=entry.content_type, cache_control=entry.cache_control,
+        encoding=variant, ranges=False, vary_encoding=True,
+    )
+
+
+class StaticMediaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        self.static_prefix = settings.STATIC_URL
+        self.media_prefix = settings.MEDIA_URL
+        self.static_index = build_static_index(settings.STATIC_ROOT)
+
+    def _static_entry(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.static_prefix):
+            return None
+        return self.static_index.get(request.path_info[len(self.static_prefix):])
+
+    def _media_path(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.media_prefix):
+            return None
+        return request.path_info[len(self.media_prefix):]
+
+    def _serve_media(self, request, path):
+        try:
+            return media.serve(request, path, settings.MEDIA_ROOT)
+        except Http404:
+            return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        entry = self._static_entry(request)
+        if entry is not None:
+            return serve_static_entry(request, entry)
+        path = self._media_path(request)
+        if path is not None:
+            response = self._serve_media(request, path)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        entry = self._static_entry(request)
+        if entry is not None:
+            return serve_static_entry(request, entry)
+        path = self._media_path(request)
+        if path is not None:
+            # The first hit on a media file hashes it (videos can be large): off the event loop.
+            response = await sync_to_async(self._serve_media, thread_sensitive=False)(request, path)
+            if response is not None:
+                return response
+        return await self.get_response(request)
@@ -0,0 +1,82 @@
+"""
+Rendered JSON responses cached by data version (memory_box.versioning) and request parameters.
+
+The cache key (and the ETag) is derived from the endpoint name, the normalized parameters and the
+current versions of the namespaces the response is built from, so a bump makes every stored copy
+unreachable instead of deleting it. A matching If-None-Match is answered with 304 from the versions
+alone, without reading the body. Bodies live in the 'responses' cache alias (settings.CACHES),
+which can be local memory, file or database; hit/miss counters are kept there too, so with a
+shared backend they cover every worker.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .async_views import etag_matches, render_json
+from .versioning import get_version
+
+CACHE_ALIAS = 'responses'
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+COUNTERS = ('hits', 'misses', 'not_modified')
+
+
+class ResponseCache:
+    """
+    ``respond(request, params, builder)``: JSON response for ``params`` (a hashable/reprable
+    tuple), built by ``builder()`` only when no copy exists for the current ``namespaces`` versions.
+    """
+
+    def __init__(self, name, *namespaces, timeout=None, cache_control=PRIVATE_CACHE_CONTROL):
+        self.name = name
+        self.namespaces = namespaces
+        self.timeout = timeout
+        self.cache_control = cache_control
+
+    @property
+    def cache(self):
+        return caches[CACHE_ALIAS]
+
+    def key(self, params):
+        versions = ':'.join(str(get_version(ns)) for ns in self.namespaces)
+        digest = hashlib.sha1(repr((versions, params)).encode()).hexdigest()
+        return f'response:{self.name}:{digest}'
+
+    def _count(self, counter):
+        key = f'response-stats:{self.name}:{counter}'
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, 0, timeout=None)
+            self.cache.incr(key)
+
+    def stats(self):
+        values = self.cache.get_many([f'response-stats:{self.name}:{c}' for c in COUNTERS])
+        counts = {c: values.get(f'response-stats:{self.name}:{c}', 0) for c in COUNTERS}
+        served = counts['hits'] + counts['not_modified']
+        total = served + counts['misses']
+        counts['hit_ratio'] = round(served / total, 3) if total else None
+        return counts
+
+    def reset_stats(self):
+        self.cache.delete_many([f'response-stats:{self.name}:{c}' for c in COUNTERS])
+
+    def respond(self, request, params, builder):
+        key = self.key(params)
+        etag = f'"{key.rsplit(":", 1)[1][:20]}"'
+        headers = {'ETag': etag, 'Cache-Control': self.cache_control}
+        if etag_matches(request, etag):
+            self._count('not_modified')
+            return HttpResponse(status=304, headers={**headers, 'X-Cache': 'HIT'})
+        body = self.cache.get(key)
+        if body is None:
+            self._count('misses')
+            body = render_json(builder())
+            timeout = self.timeout if self.timeout is not None else settings.RESPONSE_CACHE_TIMEOUT
+            self.cache.set(key, body, timeout=timeout)
+            headers['X-Cache'] = 'MISS'
+        else:
+            self._count('hits')
+            headers['X-Cache'] = 'HIT'
+        return HttpResponse(body, content_type='application/json', headers=headers)
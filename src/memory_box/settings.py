@@ -60,6 +60,7 @@ REST_FRAMEWORK = {
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'memory_box.middleware.StaticMediaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -99,6 +100,44 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Default cache: holds the data versions behind the process-local caches (memory_box.versioning).
+# Local memory is enough for a single uvicorn worker; with several workers use a shared backend
+# (CACHE_BACKEND=file or db) so a version bump in one process reaches the others. WEB_CONCURRENCY
+# is uvicorn's worker count: with DEBUG=False and more than one, locmem fails the system checks
+# (manage.py migrate at container start; memory_box.checks). The warm
+# process-local caches then cost no queries only with locmem/file: with db every version check
+# (get_version) is itself one SELECT on the cache table.
+# 'responses' holds rendered responses (memory_box.response_cache); RESPONSE_CACHE_BACKEND
+# defaults to CACHE_BACKEND. The db backend needs `python manage.py createcachetable`.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', CACHE_BACKEND)
+
+
+def _cache(backend, name):
+    if backend == 'file':
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(os.getenv('CACHE_LOCATION', '/tmp/memory-box-cache'), name),
+        }
+    if backend == 'db':
+        return {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': f'cache_{name}',
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': f'memory-box-{name}',
+    }
+
+
+CACHES = {
+    'default': _cache(CACHE_BACKEND, 'default'),
+    'responses': _cache(RESPONSE_CACHE_BACKEND, 'responses'),
+}
+# Seconds a cached response is kept; keys change with the data versions, so this only bounds size.
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '3600'))
+
 # PostgreSQL if DB_HOST is set (Docker); otherwise SQLite for local development
 if os.getenv('DB_HOST'):
     DATABASES = {
@@ -116,6 +155,12 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Base de tests en archivo, no en memoria compartida: con hilos (orders.tests) las
+            # escrituras esperan el lock en vez de fallar con "database table is locked".
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+            # BEGIN IMMEDIATE: una transacción que lee y después escribe (SELECT ... FOR UPDATE en
+            # orders.stock) toma el lock de escritura al empezar, en vez de chocar al escribir.
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
         }
     }
 
@@ -133,9 +178,46 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Fuera de DEBUG collectstatic escribe nombres con hash de contenido (base.3f2a9c1d0b7e.css) y sus
+# versiones .gz/.br, que StaticMediaMiddleware sirve con caché inmutable (memory_box.storage).
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'memory_box.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Hand file transfers to the front proxy: 'X-Accel-Redirect' (nginx, internal location at
+# MEDIA_OFFLOAD_PREFIX/<static|media>/) or 'X-Sendfile'. Empty: Django streams the file itself
+# in chunks (under uvicorn each chunk is a thread hop, so large videos are best offloaded when a
+# proxy is in front).
+MEDIA_OFFLOAD_HEADER = os.getenv('MEDIA_OFFLOAD_HEADER', '')
+MEDIA_OFFLOAD_PREFIX = os.getenv('MEDIA_OFFLOAD_PREFIX', '/protected/')
+
+# Threads that build responsive renditions of catalog images after upload (config.renditions).
+RENDITION_WORKERS = int(os.getenv('RENDITION_WORKERS', '2'))
+
+# Resumable chunked uploads (config.uploads). Chunks live under MEDIA_ROOT so completing an upload
+# is a rename into place; the hidden directory is never served by memory_box.media.
+CHUNKED_UPLOAD_ROOT = Path(os.getenv('CHUNKED_UPLOAD_ROOT', str(MEDIA_ROOT / '.chunked')))
+CHUNKED_UPLOAD_CHUNK_SIZE = int(os.getenv('CHUNKED_UPLOAD_CHUNK_SIZE', str(5 * 1024 * 1024)))
+CHUNKED_UPLOAD_MAX_SIZE = {
+    'background_media': int(os.getenv('CHUNKED_UPLOAD_MAX_MEDIA_SIZE', str(2 * 1024 ** 3))),
+    'image_crop': int(os.getenv('CHUNKED_UPLOAD_MAX_IMAGE_SIZE', str(50 * 1024 ** 2))),
+}
+# Public image_crop sessions still open per order (10 slots plus retries).
+CHUNKED_UPLOAD_MAX_OPEN_PER_ORDER = int(os.getenv('CHUNKED_UPLOAD_MAX_OPEN_PER_ORDER', '20'))
+
+# Filamento PLA (orders.stock): aviso por WebSocket cuando una variante baja de estos gramos,
+# salvo que la fila tenga su propio low_threshold.
+PLA_LOW_STOCK_GRAMS = int(os.getenv('PLA_LOW_STOCK_GRAMS', '500'))
+
 # Base URL of frontend for QR codes (React suele correr en :3000)
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://192.168.88.100:3000')
 
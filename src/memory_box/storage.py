@@ -0,0 +1,86 @@
+"""
+Static files storage for production: ManifestStaticFilesStorage (content-hashed names such as
+base.3f2a9c1d0b7e.css) that also writes gzip and brotli siblings (.gz, .br) during collectstatic,
+so StaticMediaMiddleware can serve compressed bodies without compressing per request.
+"""
+import gzip
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # brotli is optional: without it only .gz files are written
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico',
+    '.ttf', '.otf', '.eot',
+}
+MIN_COMPRESS_SIZE = 512
+# Keep a compressed copy only if it saves at least 5%.
+MAX_COMPRESSED_RATIO = 0.95
+
+
+def _compressors():
+    yield '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', lambda data: brotli.compress(data, quality=11)
+
+
+def compress_file(path):
+    """Write path.gz / path.br next to ``path`` when worth it; remove stale ones otherwise."""
+    source_mtime = os.path.getmtime(path)
+    data = None
+    for suffix, compress in _compressors():
+        target = path + suffix
+        if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+            # Up to date from a previous collectstatic (the container runs it on every start).
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            compressed = None
+        else:
+            compressed = compress(data)
+            if len(compressed) > len(data) * MAX_COMPRESSED_RATIO:
+                compressed = None
+        if compressed is None:
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        tmp = f'{target}.tmp'
+        with open(tmp, 'wb') as out:
+            out.write(compressed)
+        os.replace(tmp, target)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        targets = []
+        for root, _dirs, files in os.walk(self.location):
+            for name in files:
+                if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                    targets.append(os.path.join(root, name))
+        # zlib and brotli release the GIL while compressing.
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 2) as pool:
+            for path, exc in zip(targets, pool.map(_safe_compress, targets)):
+                if exc is not None:
+                    logger.warning('compress: %s: %s', path, exc)
+
+
+def _safe_compress(path):
+    try:
+        compress_file(path)
+    except OSError as exc:
+        return exc
+    return None
@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import warnings
+
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, RequestFactory, TestCase, override_settings
+
+from memory_box.checks import check_shared_version_cache
+from memory_box.middleware import StaticMediaMiddleware
+
+
+class MediaServeTests(TestCase):
+    """memory_box.media: Range y cuerpo completo, por partes y sin buffer bajo ASGI."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.root, MEDIA_OFFLOAD_HEADER=''))
+        self.data = os.urandom(300 * 1024)
+        with open(os.path.join(self.root, 'video.mp4'), 'wb') as f:
+            f.write(self.data)
+
+    async def _aget(self, **headers):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            response = await AsyncClient().get('/media/video.mp4', headers=headers)
+            self.assertTrue(response.streaming)
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        # Un iterador sync se consumiría entero con list() y avisaría.
+        self.assertEqual([str(w.message) for w in caught if 'synchronous iterators' in str(w.message)], [])
+        return response, body
+
+    async def test_asgi_range_is_streamed(self):
+        response, body = await self._aget(Range='bytes=0-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response['Content-Range'], f'bytes 0-{len(self.data) - 1}/{len(self.data)}')
+
+        response, body = await self._aget(Range='bytes=100-199')
+        self.assertEqual(body, self.data[100:200])
+        self.assertEqual(response['Content-Length'], '100')
+
+    async def test_asgi_full_body_is_streamed(self):
+        response, body = await self._aget()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+
+    def test_wsgi_full_body_and_not_modified(self):
+        response = Client().get('/media/video.mp4')
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        response = Client().get('/media/video.mp4', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+
+class StaticMiddlewareTests(TestCase):
+    """StaticMediaMiddleware: índice de STATIC_ROOT al arrancar, variantes .br/.gz y 304."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.enterContext(override_settings(STATIC_ROOT=self.root, MEDIA_OFFLOAD_HEADER=''))
+        self.files = {'app.css': b'body { color: red }' * 50, 'app.css.br': b'brotli', 'app.css.gz': b'gzip'}
+        for name, data in self.files.items():
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(data)
+        # El índice se arma al instanciar el middleware, con el primer request de este cliente.
+        self.client = Client()
+
+    def _get(self, path='/static/app.css', **headers):
+        response = self.client.get(path, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_picks_compressed_variant_from_accept_encoding(self):
+        for accept, encoding, body in (
+            ('gzip, br', 'br', b'brotli'),
+            ('gzip', 'gzip', b'gzip'),
+            ('br;q=0, gzip', 'gzip', b'gzip'),
+            ('', None, self.files['app.css']),
+        ):
+            with self.subTest(accept=accept):
+                response, content = self._get(**{'Accept-Encoding': accept})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get('Content-Encoding'), encoding)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(content, body)
+
+    def test_range_serves_the_identity_file(self):
+        response, content = self._get(**{'Accept-Encoding': 'br', 'Range': 'bytes=0-3'})
+        self.assertEqual(response.status_code, 206)
+        self.assertIsNone(response.get('Content-Encoding'))
+        self.assertEqual(content, self.files['app.css'][:4])
+
+    def test_not_modified_per_representation(self):
+        response, _ = self._get(**{'Accept-Encoding': 'br'})
+        etag = response['ETag']
+        response, _ = self._get(**{'Accept-Encoding': 'br', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        # El ETag de la variante br no valida la representación sin comprimir.
+        response, _ = self._get(**{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_paths_fall_through(self):
+        fallthrough = HttpResponse('from urls')
+        middleware = StaticMediaMiddleware(lambda request: fallthrough)
+        factory = RequestFactory()
+        self.assertIsNot(middleware(factory.get('/static/app.css')), fallthrough)
+        # Fuera del índice (agregado después del arranque, o inexistente) y no GET: al resto del stack.
+        with open(os.path.join(self.root, 'late.js'), 'wb') as f:
+            f.write(b'late')
+        for request in (factory.get('/static/late.js'), factory.get('/static/missing.css'),
+                        factory.post('/static/app.css'), factory.get('/media/missing.mp4')):
+            with self.subTest(path=request.path, method=request.method):
+                self.assertIs(middleware(request), fallthrough)
+
+    async def test_asgi_static_is_streamed(self):
+        response = await AsyncClient().get('/static/app.css', headers={'Accept-Encoding': 'gzip'})
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'gzip')
+
+
+class SharedVersionCacheCheckTests(TestCase):
+    """Con DEBUG=False y varios workers, las versiones en locmem no se comparten: error al arrancar."""
+
+    def _ids(self):
+        return [message.id for message in check_shared_version_cache(None)]
+
+    def test_locmem(self):
+        with override_settings(DEBUG=True, WEB_CONCURRENCY=4):
+            self.assertEqual(self._ids(), [])
+        with override_settings(DEBUG=False, WEB_CONCURRENCY=1):
+            self.assertEqual(self._ids(), [])
+        with override_settings(DEBUG=False, WEB_CONCURRENCY=4):
+            self.assertEqual(self._ids(), ['memory_box.E001'])
+
+    def test_shared_backend(self):
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/x'}}
+        with override_settings(DEBUG=False, WEB_CONCURRENCY=4, CACHES=caches):
+            self.assertEqual(self._ids(), [])
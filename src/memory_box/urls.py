@@ -1,12 +1,14 @@
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
 from users.views import CustomTokenObtainPairViewSet
+from memory_box.media import serve as serve_file
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -29,5 +31,8 @@ urlpatterns = [
     path('api/', include(api_patterns)),
     path('docs/swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('docs/redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Static/media with Range, ETag/304 and optional proxy offload (memory_box.media). Usually answered
+    # earlier by StaticMediaMiddleware; these catch static files added after startup.
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), serve_file, {'document_root': settings.STATIC_ROOT}),
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_file, {'document_root': settings.MEDIA_ROOT}),
+]
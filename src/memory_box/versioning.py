@@ -0,0 +1,117 @@
+"""
+Data versions for process-local caches.
+
+Each namespace ('site_settings', 'variants', ...) has an integer version kept in the default
+cache backend. Writers bump it after commit, usually from post_save/post_delete signals; readers compare it
+with the version their local copy was built from and rebuild on mismatch. With the default
+local-memory backend this costs no queries; with a shared backend (file, database) a bump in one
+worker invalidates the copies held by every other worker. With the database backend each
+get_version() is one query on the cache table, so a warm lookup costs one query per namespace.
+"""
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'data-version:'
+
+
+def _key(namespace):
+    return f'{KEY_PREFIX}{namespace}'
+
+
+def get_version(namespace):
+    """Current version of a namespace (seeded on first use)."""
+    version = cache.get(_key(namespace))
+    if version is None:
+        # Seed from the clock so a key lost to eviction never reuses a version someone already cached.
+        cache.add(_key(namespace), time.time_ns(), timeout=None)
+        version = cache.get(_key(namespace))
+    return version
+
+
+async def aget_version(namespace):
+    version = await cache.aget(_key(namespace))
+    if version is None:
+        await cache.aadd(_key(namespace), time.time_ns(), timeout=None)
+        version = await cache.aget(_key(namespace))
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate every cached copy built from this namespace."""
+    try:
+        return cache.incr(_key(namespace))
+    except ValueError:
+        get_version(namespace)
+        return cache.incr(_key(namespace))
+
+
+def bump_version_on_commit(*namespaces):
+    """
+    bump_version() once the current transaction commits (immediately outside one). A bump inside
+    the transaction would let another request rebuild from the pre-commit rows and keep that copy
+    under the new version until the next write.
+    """
+    def bump():
+        for namespace in namespaces:
+            bump_version(namespace)
+    transaction.on_commit(bump)
+
+
+class VersionedCache:
+    """
+    Process-local value rebuilt by ``builder()`` whenever any of ``namespaces`` changes version.
+    ``get()`` costs one cache read per namespace once warm; the builder only runs on a miss.
+    With ``ttl`` (seconds) the value is also rebuilt once it is that old, for data that can
+    change without a version bump (e.g. edited directly in the database).
+    """
+
+    def __init__(self, builder, *namespaces, ttl=None):
+        self.builder = builder
+        self.namespaces = namespaces
+        self.ttl = ttl
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def versions(self):
+        return tuple(get_version(ns) for ns in self.namespaces)
+
+    async def aversions(self):
+        return tuple([await aget_version(ns) for ns in self.namespaces])
+
+    def _lookup(self, versions):
+        entry = self._entry
+        if entry is not None and entry[0] == versions:
+            if self.ttl is None or time.monotonic() - entry[2] < self.ttl:
+                return True, entry[1]
+        return False, None
+
+    def get(self):
+        versions = self.versions()
+        hit, value = self._lookup(versions)
+        if hit:
+            return value
+        with self._lock:
+            hit, value = self._lookup(versions)
+            if hit:
+                return value
+            # Versions were read before building: a bump during the build leaves this entry stale
+            # and the next get() rebuilds it.
+            value = self.builder()
+            self._entry = (versions, value, time.monotonic())
+        return value
+
+    async def aget(self):
+        versions = await self.aversions()
+        hit, value = self._lookup(versions)
+        if hit:
+            return value
+        value = await sync_to_async(self.builder)()
+        self._entry = (versions, value, time.monotonic())
+        return value
+
+    def clear(self):
+        self._entry = None
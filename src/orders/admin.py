@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Order, ImageCrop, PackagingStock
+from .models import Order, FilamentStock, ImageCrop, PackagingStock, StockMovement
+from .stock import set_filament, set_packaging
 
 
 class ImageCropInline(admin.TabularInline):
@@ -26,3 +27,41 @@ class ImageCropAdmin(admin.ModelAdmin):
 class PackagingStockAdmin(admin.ModelAdmin):
     list_display = ('item_type', 'quantity')
     list_editable = ('quantity',)
+
+    def save_model(self, request, obj, form, change):
+        if change and 'quantity' in form.changed_data:
+            # Through the stock service so the change lands in the movement ledger.
+            set_packaging(obj.item_type, obj.quantity, user=request.user)
+        else:
+            super().save_model(request, obj, form, change)
+
+
+@admin.register(FilamentStock)
+class FilamentStockAdmin(admin.ModelAdmin):
+    list_display = ('variant', 'grams', 'low_threshold')
+    list_editable = ('grams', 'low_threshold')
+
+    def save_model(self, request, obj, form, change):
+        if change and 'grams' in form.changed_data:
+            # Through the stock service so the change lands in the movement ledger.
+            set_filament(obj.variant, obj.grams, user=request.user)
+            if 'low_threshold' in form.changed_data:
+                FilamentStock.objects.filter(pk=obj.pk).update(low_threshold=obj.low_threshold)
+        else:
+            super().save_model(request, obj, form, change)
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'item', 'kind', 'delta', 'balance_after', 'order', 'purchase', 'user')
+    list_filter = ('item_kind', 'kind', 'item')
+    ordering = ('-created_at', '-id')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -1,7 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
     verbose_name = 'Orders (income)'
+
+    def ready(self):
+        from . import signals
+        post_migrate.connect(signals.provision_after_migrate, sender=self)
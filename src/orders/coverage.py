@@ -0,0 +1,114 @@
+"""
+Cobertura de stock: demanda abierta (pedidos en curso/finalizados) contra Stock y PackagingStock.
+
+Los pedidos se agregan en un único GROUP BY por variante base ('wood_light' -> 'wood') y
+box_type, que cuenta a la vez los pedidos abiertos y el ritmo reciente (pedidos no borrador
+creados en la ventana de ``days`` días). Las cajas de empaque se descuentan al finalizar, así que
+su demanda pendiente son sólo los pedidos en curso.
+
+El resultado se cachea por ventana y se invalida con las versiones 'orders' y 'stock'
+(orders.signals, orders.stock); el TTL hace correr la ventana aunque no haya cambios.
+"""
+from datetime import timedelta
+
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+from django.utils import timezone
+
+from memory_box.versioning import VersionedCache
+from .models import Order, OrderStatus, PackagingStock, Stock, Variant
+from .signals import ORDERS_VERSION
+from .stock import PACKAGING_PER_ORDER, STOCK_VERSION, stock_variant_code
+
+OPEN_STATUSES = (OrderStatus.IN_PROGRESS, OrderStatus.PROCESSING)
+COVERAGE_TTL = 300
+DEFAULT_WINDOW_DAYS = 30
+
+
+def _variant_base():
+    """Expresión SQL: variante base del pedido según el sufijo _light."""
+    return Case(
+        *[When(variant=v, then=Value(stock_variant_code(v))) for v in Variant.values],
+        default=F('variant'),
+        output_field=CharField(),
+    )
+
+
+def _cover(stock, daily_rate):
+    if not daily_rate:
+        return None
+    return round(stock / daily_rate, 1)
+
+
+def build_coverage(days=DEFAULT_WINDOW_DAYS):
+    since = timezone.now() - timedelta(days=days)
+    recent = Q(created_at__gte=since) & ~Q(status=OrderStatus.DRAFT)
+    demand = (
+        Order.objects
+        .filter(Q(status__in=OPEN_STATUSES) | recent)
+        .exclude(variant='')
+        .annotate(base=_variant_base())
+        .values('base', 'box_type')
+        .annotate(
+            in_progress=Count('id', filter=Q(status=OrderStatus.IN_PROGRESS)),
+            processing=Count('id', filter=Q(status=OrderStatus.PROCESSING)),
+            recent=Count('id', filter=recent),
+        )
+        .order_by()
+    )
+    rows = {}
+    for variant, box_type, quantity in Stock.objects.values_list('variant', 'box_type', 'quantity'):
+        rows[(variant, box_type)] = {'stock': quantity, 'in_progress': 0, 'processing': 0, 'recent': 0}
+    for entry in demand:
+        row = rows.setdefault((entry['base'], entry['box_type']), {'stock': None})
+        for field in ('in_progress', 'processing', 'recent'):
+            row[field] = entry[field]
+
+    variants = []
+    for (variant, box_type), row in sorted(rows.items()):
+        open_orders = row['in_progress'] + row['processing']
+        stock = row['stock'] or 0
+        daily_rate = row['recent'] / days
+        variants.append({
+            'variant': variant,
+            'box_type': box_type,
+            'stock': row['stock'],
+            'in_progress': row['in_progress'],
+            'processing': row['processing'],
+            'open_orders': open_orders,
+            'shortfall': max(0, open_orders - stock),
+            'daily_rate': round(daily_rate, 3),
+            'days_of_cover': _cover(max(0, stock - open_orders), daily_rate),
+        })
+
+    pending = sum(row['in_progress'] for row in rows.values())
+    orders_rate = sum(row['recent'] for row in rows.values()) / days
+    packaging_stock = dict(PackagingStock.objects.values_list('item_type', 'quantity'))
+    packaging = []
+    for item_type in PACKAGING_PER_ORDER:
+        stock = packaging_stock.get(item_type, 0)
+        packaging.append({
+            'item_type': item_type,
+            'stock': stock,
+            'pending_orders': pending,
+            'shortfall': max(0, pending - stock),
+            'daily_rate': round(orders_rate, 3),
+            'days_of_cover': _cover(max(0, stock - pending), orders_rate),
+        })
+    return {
+        'window_days': days,
+        'generated_at': timezone.now().isoformat(),
+        'variants': variants,
+        'packaging': packaging,
+    }
+
+
+_caches = {}
+
+
+def get_coverage(days=DEFAULT_WINDOW_DAYS):
+    cache = _caches.get(days)
+    if cache is None:
+        cache = _caches.setdefault(
+            days, VersionedCache(lambda: build_coverage(days), ORDERS_VERSION, STOCK_VERSION, ttl=COVERAGE_TTL)
+        )
+    return cache.get()
@@ -0,0 +1,128 @@
+"""
+Exportaciones completas (ventas, pedidos, compras) en CSV o JSONL, por streaming.
+
+Cada dataset es un values_list() ordenado por la columna indexada del filtro de fecha
+(ventas: finalized_at, pedidos: created_at o (status, created_at), compras: date) y se lee con
+iterator(chunk_size=...): cursor del lado del servidor en PostgreSQL, fetchmany en SQLite. Las filas
+se formatean por bloques, así la memoria no depende de cuántas haya.
+"""
+import csv
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from expenses.models import Purchase
+from .models import Order, SALE_STATUSES
+from .sales import day_bounds, production_cost_expr, sale_price_expr
+
+EXPORT_CHUNK_SIZE = 2000
+# Filas formateadas por bloque de salida.
+ROWS_PER_BLOCK = 500
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _range(qs, field, date_from, date_to):
+    if date_from:
+        qs = qs.filter(**{f'{field}__gte': day_bounds(date_from, date_from)[0]})
+    if date_to:
+        qs = qs.filter(**{f'{field}__lt': day_bounds(date_to, date_to)[1]})
+    return qs
+
+
+def sales_rows(date_from=None, date_to=None, statuses=None):
+    columns = ['id', 'finalized_at', 'status', 'box_type', 'variant', 'sale_price', 'production_cost', 'margin']
+    qs = Order.objects.filter(status__in=statuses or SALE_STATUSES, finalized_at__isnull=False)
+    qs = (
+        _range(qs, 'finalized_at', date_from, date_to)
+        .annotate(precio=sale_price_expr(), costo=production_cost_expr())
+        .annotate(margen=F('precio') - F('costo'))
+        .order_by('finalized_at', 'id')
+        .values_list('id', 'finalized_at', 'status', 'box_type', 'variant', 'precio', 'costo', 'margen')
+    )
+    return columns, qs
+
+
+def orders_rows(date_from=None, date_to=None, statuses=None):
+    columns = [
+        'id', 'created_at', 'updated_at', 'finalized_at', 'status', 'client_name', 'phone', 'box_type',
+        'led_type', 'variant', 'shipping_option', 'deposit', 'active', 'sale_price', 'production_cost',
+    ]
+    qs = Order.objects.all()
+    if statuses:
+        qs = qs.filter(status__in=statuses)
+    qs = _range(qs, 'created_at', date_from, date_to).order_by('created_at', 'id').values_list(*columns)
+    return columns, qs
+
+
+def purchases_rows(date_from=None, date_to=None, statuses=None):
+    columns = [
+        'id', 'date', 'category', 'variant', 'brand', 'quantity', 'unit_cost', 'total_cost',
+        'grams_per_roll', 'days', 'notes', 'created_at',
+    ]
+    qs = Purchase.objects.all()
+    if date_from:
+        qs = qs.filter(date__gte=date_from)
+    if date_to:
+        qs = qs.filter(date__lte=date_to)
+    return columns, qs.order_by('date', 'id').values_list(*columns)
+
+
+# dataset -> (función de filas, admite filtro status)
+DATASETS = {
+    'sales': (sales_rows, True),
+    'orders': (orders_rows, True),
+    'purchases': (purchases_rows, False),
+}
+
+
+class _Line:
+    """Destino de csv.writer que devuelve la línea escrita en vez de acumularla."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _blocks(lines):
+    """Agrupa líneas de texto en bloques de bytes de ROWS_PER_BLOCK filas."""
+    lines = iter(lines)
+    while True:
+        block = list(islice(lines, ROWS_PER_BLOCK))
+        if not block:
+            return
+        yield ''.join(block).encode()
+
+
+def render(fmt, columns, rows):
+    """Iterador de bloques de bytes (CSV con encabezado, o un objeto JSON por línea)."""
+    rows = rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if fmt == 'csv':
+        writer = csv.writer(_Line())
+        lines = (writer.writerow([_cell(v) for v in row]) for row in rows)
+        yield writer.writerow(columns).encode()
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        lines = (encoder.encode(dict(zip(columns, row))) + '\n' for row in rows)
+    yield from _blocks(lines)
+
+
+def filename(dataset, fmt, date_from=None, date_to=None):
+    parts = [dataset]
+    if date_from:
+        parts.append(f'from-{date_from}')
+    if date_to:
+        parts.append(f'to-{date_to}')
+    return f'{"_".join(parts)}.{fmt}'
+
@@ -0,0 +1,227 @@
+"""
+Completa cost_snapshot / price_snapshot (y sale_price / production_cost) de las ventas que no los
+tienen: pedidos anteriores a los snapshots o finalizados cuando el cálculo falló.
+
+- Los pedidos se leen por id ascendente, en bloques de --chunk-size (en PostgreSQL desde el
+  índice parcial order_missing_snapshot_idx; en SQLite por la clave primaria).
+- El costo se calcula con los precios de compra vigentes a la fecha de finalización de cada pedido
+  (CostModel.as_of; un modelo por día). El precio de venta no tiene historia: price_snapshot se
+  arma desde sale_price (el que ya aportó al rollup) y solo sin él desde el actual de SiteSettings.
+- Con --workers > 1 los bloques se calculan en un pool de procesos; las escrituras (bulk_update
+  y ajuste del rollup SalesDaily, que bulk_update no dispara) se hacen en el proceso principal,
+  un bloque por transacción.
+- --checkpoint guarda el último id escrito, sin pasar nunca de un pedido que falló; al volver a
+  correr se sigue desde ahí (los fallidos se reintentan).
+"""
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from expenses.cost_model import CostModel
+from orders.models import Order, SALE_STATUSES
+from orders.sales import apply_deltas, current_prices, sale_contribution
+
+FIELDS = ('cost_snapshot', 'price_snapshot', 'production_cost', 'sale_price')
+READ_FIELDS = ('id', 'status', 'box_type', 'variant', 'finalized_at', 'updated_at') + FIELDS
+CENT = Decimal('0.01')
+
+# Modelos de costo por día, por proceso.
+_models = {}
+
+
+def missing_snapshots():
+    return (
+        Order.objects.filter(status__in=SALE_STATUSES)
+        .filter(Q(cost_snapshot__isnull=True) | Q(price_snapshot__isnull=True))
+    )
+
+
+def _amount(snapshot, key):
+    value = (snapshot or {}).get(key)
+    if value is None:
+        return None
+    return Decimal(str(value)).quantize(CENT)
+
+
+def _cost_model(day):
+    model = _models.get(day)
+    if model is None:
+        model = _models[day] = CostModel.as_of(day)
+    return model
+
+
+def compute_chunk(rows, prices):
+    """
+    rows: dicts con READ_FIELDS. Devuelve [(id, {campo: valor})] con los campos que faltaban,
+    y [(id, error)] de los que no se pudieron calcular.
+    """
+    results, errors = [], []
+    for row in rows:
+        changes = {}
+        try:
+            if row['cost_snapshot'] is None:
+                day = timezone.localtime(row['finalized_at'] or row['updated_at']).date()
+                changes['cost_snapshot'] = _cost_model(day).snapshot(row['box_type'], row['variant'])
+                changes['production_cost'] = _amount(changes['cost_snapshot'], 'total')
+            if row['price_snapshot'] is None:
+                precio = row['sale_price']
+                if precio is None:
+                    precio = prices.get(row['box_type'], prices[None])
+                changes['price_snapshot'] = {'precio_venta': float(precio)}
+                changes['sale_price'] = _amount(changes['price_snapshot'], 'precio_venta')
+        except Exception as e:
+            errors.append((row['id'], str(e)))
+            continue
+        results.append((row['id'], changes))
+    return results, errors
+
+
+def _compute_in_worker(rows, prices):
+    # La conexión es del hijo: el padre cerró las suyas antes de cada submit().
+    try:
+        return compute_chunk(rows, prices)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Fill missing cost/price snapshots of sold orders, using purchase prices as of each sale date.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Orders per chunk (default 500).')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes computing chunks (default 1).')
+        parser.add_argument('--dry-run', action='store_true', help='Compute and report, without writing.')
+        parser.add_argument('--checkpoint', help='JSON file with the last written id; resumes from it if present.')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint.')
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options['chunk_size'])
+        workers = max(1, options['workers'])
+        dry_run = options['dry_run']
+        checkpoint = options['checkpoint']
+        last_id = 0 if options['restart'] else self._load_checkpoint(checkpoint)
+
+        pending = missing_snapshots().filter(id__gt=last_id)
+        total = pending.count()
+        if not total:
+            self.stdout.write('No orders with missing snapshots.')
+            return
+        self.stdout.write(f'{total} orders with missing snapshots (from id > {last_id}).')
+
+        prices = self.prices = current_prices()
+        self.first_failed = None
+        chunks = self._chunks(pending, chunk_size)
+        done = updated = failed = 0
+        started = time.monotonic()
+
+        pool = None
+        if workers > 1:
+            # fork: los hijos heredan Django ya configurado y abren sus propias conexiones.
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        try:
+            queue = []
+            for rows in chunks:
+                if pool:
+                    # Los hijos se forkean en el primer submit(), después de que _chunks ya consultó:
+                    # sin conexiones abiertas en el padre no heredan su socket.
+                    connections.close_all()
+                    queue.append((rows, pool.submit(_compute_in_worker, rows, prices)))
+                    if len(queue) < workers * 2:
+                        continue
+                    rows, future = queue.pop(0)
+                    result = future.result()
+                else:
+                    result = compute_chunk(rows, prices)
+                updated_now, failed_now = self._write(rows, result, dry_run, checkpoint)
+                done += len(rows)
+                updated += updated_now
+                failed += failed_now
+                self._progress(done, total, rows[-1]['id'], started)
+            for rows, future in queue:
+                updated_now, failed_now = self._write(rows, future.result(), dry_run, checkpoint)
+                done += len(rows)
+                updated += updated_now
+                failed += failed_now
+                self._progress(done, total, rows[-1]['id'], started)
+        finally:
+            if pool:
+                pool.shutdown()
+
+        verb = 'Would update' if dry_run else 'Updated'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {updated} orders; {failed} failed.'))
+
+    def _chunks(self, pending, chunk_size):
+        """Bloques por id ascendente (keyset), sin OFFSET."""
+        after = 0
+        while True:
+            rows = list(pending.filter(id__gt=after).order_by('id').values(*READ_FIELDS)[:chunk_size])
+            if not rows:
+                return
+            after = rows[-1]['id']
+            yield rows
+
+    def _write(self, rows, result, dry_run, checkpoint):
+        results, errors = result
+        for order_id, error in errors:
+            self.stderr.write(f'order id={order_id}: {error}')
+            if self.first_failed is None or order_id < self.first_failed:
+                self.first_failed = order_id
+        if dry_run or not results:
+            if not dry_run:
+                self._save_checkpoint(checkpoint, rows[-1]['id'])
+            return len(results), len(errors)
+
+        by_id = {row['id']: row for row in rows}
+        orders = []
+        deltas = {}
+        for order_id, changes in results:
+            before = by_id[order_id]
+            after = {**before, **changes}
+            orders.append(Order(id=order_id, **{f: after[f] for f in FIELDS}))
+            self._delta(deltas, sale_contribution(before, self.prices), -1)
+            self._delta(deltas, sale_contribution(after, self.prices), 1)
+        with transaction.atomic():
+            Order.objects.bulk_update(orders, FIELDS)
+            apply_deltas(deltas)
+        self._save_checkpoint(checkpoint, rows[-1]['id'])
+        return len(results), len(errors)
+
+    def _delta(self, deltas, contribution, sign):
+        if contribution is None:
+            return
+        key, revenue, cost = contribution
+        count, rev, cst = deltas.get(key, (0, Decimal(0), Decimal(0)))
+        deltas[key] = (count + sign, rev + sign * revenue, cst + sign * cost)
+
+    def _progress(self, done, total, last_id, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f'[{done}/{total}] last id={last_id} ({rate:.0f} orders/s)')
+
+    def _load_checkpoint(self, path):
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path) as f:
+                return int(json.load(f)['last_id'])
+        except (ValueError, KeyError, TypeError) as e:
+            raise CommandError(f'Invalid checkpoint {path}: {e}')
+
+    def _save_checkpoint(self, path, last_id):
+        if not path:
+            return
+        if self.first_failed is not None:
+            # Nunca más allá de un fallido: al reanudar se vuelve a intentar.
+            last_id = min(last_id, self.first_failed - 1)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'last_id': last_id}, f)
+        os.replace(tmp, path)
@@ -0,0 +1,16 @@
+"""
+Guarda un checkpoint (StockSnapshot) del saldo de cada ítem de stock y empaque.
+Pensado para cron (p. ej. diario): acota la cantidad de movimientos que hay que sumar
+para obtener el saldo a una fecha (stock/balance/?at=...).
+"""
+from django.core.management.base import BaseCommand
+
+from orders.stock import take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Snapshot current stock/packaging balances as ledger checkpoints.'
+
+    def handle(self, *args, **options):
+        count = take_snapshots()
+        self.stdout.write(self.style.SUCCESS(f'Saved {count} stock snapshots.'))
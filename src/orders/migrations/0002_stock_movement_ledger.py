@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def opening_snapshots(apps, schema_editor):
+    """Saldo inicial de cada fila de Stock/PackagingStock, anterior al ledger."""
+    Stock = apps.get_model('orders', 'Stock')
+    PackagingStock = apps.get_model('orders', 'PackagingStock')
+    StockSnapshot = apps.get_model('orders', 'StockSnapshot')
+    snapshots = [
+        StockSnapshot(item_kind='box', item=f'{variant}:{box_type}', balance=quantity)
+        for variant, box_type, quantity in Stock.objects.values_list('variant', 'box_type', 'quantity')
+    ]
+    snapshots += [
+        StockSnapshot(item_kind='packaging', item=item_type, balance=quantity)
+        for item_type, quantity in PackagingStock.objects.values_list('item_type', 'quantity')
+    ]
+    StockSnapshot.objects.bulk_create(snapshots)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0003_latest_purchase_price_index'),
+        ('orders', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_kind', models.CharField(choices=[('box', 'Box (Stock)'), ('packaging', 'Packaging')], max_length=20)),
+                ('item', models.CharField(max_length=60)),
+                ('balance', models.PositiveIntegerField()),
+                ('last_movement_id', models.PositiveBigIntegerField(default=0)),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-taken_at', '-id'],
+                'indexes': [models.Index(fields=['item', 'taken_at'], name='stocksnap_item_time_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_kind', models.CharField(choices=[('box', 'Box (Stock)'), ('packaging', 'Packaging')], max_length=20)),
+                ('item', models.CharField(help_text="'variant:box_type' for boxes, item_type for packaging", max_length=60)),
+                ('kind', models.CharField(choices=[('purchase', 'Purchase receipt'), ('finalization', 'Order finalization'), ('set', 'Manual set'), ('adjustment', 'Manual adjustment')], max_length=20)),
+                ('delta', models.IntegerField()),
+                ('balance_after', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='orders.order')),
+                ('purchase', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='expenses.purchase')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['item', 'created_at', 'id'], name='stockmove_item_time_idx')],
+            },
+        ),
+        migrations.RunPython(opening_snapshots, migrations.RunPython.noop),
+    ]
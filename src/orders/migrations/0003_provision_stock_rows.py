@@ -0,0 +1,36 @@
+from django.db import migrations
+
+STOCK_VARIANTS = ['graphite', 'wood', 'black', 'marble']
+PACKAGING_ITEMS = ['caja_carton', 'bolsa_ecommerce']
+
+
+def provision_stock_rows(apps, schema_editor):
+    """Filas de Stock (sin luz) por variante y de PackagingStock, antes creadas en cada listado."""
+    Stock = apps.get_model('orders', 'Stock')
+    PackagingStock = apps.get_model('orders', 'PackagingStock')
+    BoxVariant = apps.get_model('config', 'BoxVariant')
+    codes = [
+        code.strip().lower().removesuffix('_light')
+        for code in BoxVariant.objects.values_list('code', flat=True) if code
+    ]
+    variants = list(dict.fromkeys(STOCK_VARIANTS + codes))
+    Stock.objects.bulk_create(
+        [Stock(variant=v, box_type='no_light', quantity=0) for v in variants],
+        ignore_conflicts=True,
+    )
+    PackagingStock.objects.bulk_create(
+        [PackagingStock(item_type=item, quantity=0) for item in PACKAGING_ITEMS],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('config', '0001_initial'),
+        ('orders', '0002_stock_movement_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(provision_stock_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_status_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='finalized_at',
+            field=models.DateTimeField(blank=True, help_text='When the order was finalized (sale date).', null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='production_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='cost_snapshot.total as a column.', max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='sale_price',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='price_snapshot.precio_venta as a column.', max_digits=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['finalized_at', 'sale_price', 'production_cost'], name='order_finalized_sale_idx'),
+        ),
+    ]
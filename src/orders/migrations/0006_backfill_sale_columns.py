@@ -0,0 +1,55 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, transaction
+
+SALE_STATUSES = ('processing', 'delivered')
+CHUNK_SIZE = 1000
+CENTS = Decimal('0.01')
+
+
+def _amount(snapshot, key):
+    value = (snapshot or {}).get(key) if isinstance(snapshot, dict) else None
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return Decimal(str(value)).quantize(CENTS)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def backfill_sale_columns(apps, schema_editor):
+    """
+    finalized_at, sale_price y production_cost de las ventas existentes, desde los snapshots.
+    Sin fecha de finalización guardada, la mejor aproximación es updated_at (lo que usaban las
+    estadísticas). Por bloques de CHUNK_SIZE ids, cada uno en su transacción.
+    """
+    Order = apps.get_model('orders', 'Order')
+    pending = Order.objects.filter(status__in=SALE_STATUSES, finalized_at__isnull=True).order_by('id')
+    last_id = 0
+    while True:
+        chunk = list(
+            pending.filter(id__gt=last_id)
+            .only('id', 'updated_at', 'created_at', 'price_snapshot', 'cost_snapshot')[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        for order in chunk:
+            order.finalized_at = order.updated_at or order.created_at
+            order.sale_price = _amount(order.price_snapshot, 'precio_venta')
+            order.production_cost = _amount(order.cost_snapshot, 'total')
+        with transaction.atomic():
+            Order.objects.bulk_update(chunk, ['finalized_at', 'sale_price', 'production_cost'])
+        last_id = chunk[-1].id
+
+
+class Migration(migrations.Migration):
+    # Cada bloque commitea por separado: tablas grandes no quedan bloqueadas en una sola transacción.
+    atomic = False
+
+    dependencies = [
+        ('orders', '0005_order_sale_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sale_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:30
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Case, Count, DecimalField, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+
+SALE_STATUSES = ('processing', 'delivered')
+
+
+def populate_sales_daily(apps, schema_editor):
+    """Rollup inicial desde los pedidos existentes (un GROUP BY por día, box_type y variante)."""
+    Order = apps.get_model('orders', 'Order')
+    SalesDaily = apps.get_model('orders', 'SalesDaily')
+    SiteSettings = apps.get_model('config', 'SiteSettings')
+    site = SiteSettings.objects.first()
+    sin_luz = Decimal(site.price_sin_luz if site else 24000)
+    con_luz = Decimal((site.price_con_luz + site.price_pilas) if site else 42000 + 2500)
+    amount = DecimalField(max_digits=14, decimal_places=2)
+    revenue = Coalesce(
+        'sale_price',
+        Case(When(box_type='with_light', then=Value(con_luz)), default=Value(sin_luz), output_field=amount),
+        output_field=amount,
+    )
+    cost = Coalesce('production_cost', Value(Decimal('0')), output_field=amount)
+    rows = (
+        Order.objects
+        .filter(status__in=SALE_STATUSES, finalized_at__isnull=False)
+        .annotate(day=TruncDate('finalized_at'))
+        .values('day', 'box_type', 'variant')
+        .annotate(count=Count('id'), revenue=Sum(revenue), cost=Sum(cost))
+        .order_by()
+    )
+    SalesDaily.objects.bulk_create([
+        SalesDaily(
+            date=row['day'], box_type=row['box_type'] or '', variant=row['variant'] or '',
+            count=row['count'], revenue=row['revenue'], cost=row['cost'], margin=row['revenue'] - row['cost'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('config', '0001_initial'),
+        ('orders', '0006_backfill_sale_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('box_type', models.CharField(blank=True, choices=[('no_light', 'No light'), ('with_light', 'With light')], max_length=20)),
+                ('variant', models.CharField(blank=True, max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('margin', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Sales daily',
+                'ordering': ['-date', 'box_type', 'variant'],
+                'unique_together': {('date', 'box_type', 'variant')},
+            },
+        ),
+        migrations.RunPython(populate_sales_daily, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_export_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('cost_snapshot__isnull', True), ('price_snapshot__isnull', True), _connector='OR'), fields=['id'], name='order_missing_snapshot_idx'),
+        ),
+    ]
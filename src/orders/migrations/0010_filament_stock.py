@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_missing_snapshot_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilamentStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variant', models.CharField(help_text='Normalized PLA variant (Purchase.variant_key)', max_length=80, unique=True)),
+                ('grams', models.PositiveIntegerField(default=0)),
+                ('low_threshold', models.PositiveIntegerField(blank=True, help_text='Alert below this many grams (empty: PLA_LOW_STOCK_GRAMS)', null=True)),
+            ],
+            options={
+                'verbose_name': 'PLA filament stock',
+                'verbose_name_plural': 'PLA filament stock',
+            },
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='item',
+            field=models.CharField(help_text="'variant:box_type' for boxes, item_type for packaging, 'pla:variant' for filament", max_length=60),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='item_kind',
+            field=models.CharField(choices=[('box', 'Box (Stock)'), ('packaging', 'Packaging'), ('filament', 'PLA filament (grams)')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='stocksnapshot',
+            name='item_kind',
+            field=models.CharField(choices=[('box', 'Box (Stock)'), ('packaging', 'Packaging'), ('filament', 'PLA filament (grams)')], max_length=20),
+        ),
+    ]
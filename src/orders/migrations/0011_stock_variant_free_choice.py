@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_filament_stock'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stock',
+            name='variant',
+            field=models.CharField(help_text='Base variant code (STOCK_VARIANTS or BoxVariant)', max_length=50),
+        ),
+    ]
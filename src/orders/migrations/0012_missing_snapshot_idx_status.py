@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_stock_variant_free_choice'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_missing_snapshot_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status__in', ('processing', 'delivered')), models.Q(('cost_snapshot__isnull', True), ('price_snapshot__isnull', True), _connector='OR')), fields=['id'], name='order_missing_snapshot_idx'),
+        ),
+    ]
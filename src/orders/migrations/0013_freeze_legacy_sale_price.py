@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+from django.db import migrations, transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+SALE_STATUSES = ('processing', 'delivered')
+
+
+def freeze_sale_price(apps, schema_editor):
+    """
+    sale_price de las ventas que no lo tenían, con los precios actuales de SiteSettings, y el rollup
+    reconstruido con esos mismos valores: desde acá lo que resta un pedido es lo que sumó.
+    """
+    Order = apps.get_model('orders', 'Order')
+    SalesDaily = apps.get_model('orders', 'SalesDaily')
+    SiteSettings = apps.get_model('config', 'SiteSettings')
+    site = SiteSettings.objects.first()
+    sin_luz = Decimal(site.price_sin_luz if site else 24000)
+    con_luz = Decimal((site.price_con_luz + site.price_pilas) if site else 42000 + 2500)
+    pending = Order.objects.filter(status__in=SALE_STATUSES, sale_price__isnull=True)
+    with transaction.atomic():
+        pending.filter(box_type='with_light').update(sale_price=con_luz)
+        pending.update(sale_price=sin_luz)
+        rows = (
+            Order.objects
+            .filter(status__in=SALE_STATUSES, finalized_at__isnull=False)
+            .annotate(day=TruncDate('finalized_at'))
+            .values('day', 'box_type', 'variant')
+            .annotate(count=Count('id'), revenue=Sum('sale_price'),
+                      cost=Sum(Coalesce('production_cost', Value(Decimal('0')))))
+            .order_by()
+        )
+        SalesDaily.objects.all().delete()
+        SalesDaily.objects.bulk_create([
+            SalesDaily(
+                date=row['day'], box_type=row['box_type'] or '', variant=row['variant'] or '',
+                count=row['count'], revenue=row['revenue'], cost=row['cost'], margin=row['revenue'] - row['cost'],
+            )
+            for row in rows
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('config', '0003_chunked_upload'),
+        ('orders', '0012_missing_snapshot_idx_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(freeze_sale_price, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 from decimal import Decimal
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class BoxType(models.TextChoices):
@@ -37,6 +39,13 @@ class OrderStatus(models.TextChoices):
     DELIVERED = 'delivered', 'Delivered'
 
 
+# Estados que cuentan como venta (estadísticas, reportes).
+SALE_STATUSES = (OrderStatus.PROCESSING, OrderStatus.DELIVERED)
+
+# Estados en los que el pedido todavía acepta imágenes (submit_images y subidas image_crop).
+IMAGE_STATUSES = (OrderStatus.DRAFT, OrderStatus.IN_PROGRESS)
+
+
 class Order(models.Model):
     """Order (client data + status)."""
     # Ephemeral session/token to associate crops before submitting (optional)
@@ -77,15 +86,47 @@ class Order(models.Model):
         blank=True, null=True,
         help_text='Sale price when finalized: precio_venta (no_light or with_light+batteries).'
     )
+    # Fecha de venta y montos del snapshot como columnas (indexables/sumables en SQL).
+    # Se completan al finalizar; updated_at cambia con cualquier edición posterior.
+    finalized_at = models.DateTimeField(blank=True, null=True, help_text='When the order was finalized (sale date).')
+    sale_price = models.DecimalField(
+        max_digits=12, decimal_places=2, blank=True, null=True,
+        help_text='price_snapshot.precio_venta as a column.'
+    )
+    production_cost = models.DecimalField(
+        max_digits=12, decimal_places=2, blank=True, null=True,
+        help_text='cost_snapshot.total as a column.'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            # Reportes de ventas: rango por finalized_at; precio y costo se leen del índice.
+            models.Index(fields=['finalized_at', 'sale_price', 'production_cost'], name='order_finalized_sale_idx'),
+            # Exportación por rango de fechas sin filtro de estado.
+            models.Index(fields=['created_at', 'id'], name='order_created_idx'),
+            # Ventas sin snapshot (backfill_order_snapshots): índice parcial con la misma condición que
+            # missing_snapshots(), chico una vez completos (los borradores no entran). PostgreSQL lo usa
+            # porque Django le pasa los valores del IN ya interpolados; SQLite sólo usa índices parciales
+            # con literales, así que ahí el backfill recorre la clave primaria por rangos de id.
+            models.Index(
+                fields=['id'],
+                condition=models.Q(status__in=SALE_STATUSES)
+                & (models.Q(cost_snapshot__isnull=True) | models.Q(price_snapshot__isnull=True)),
+                name='order_missing_snapshot_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Order #{self.pk} - {self.client_name}"
 
+    def accepts_images(self):
+        """False once finalized: the crops are already in production."""
+        return self.status in IMAGE_STATUSES
+
 
 class ImageCrop(models.Model):
     """Image crop associated with an order (slot 0-9, display order)."""
@@ -114,9 +155,8 @@ STOCK_BOX_TYPES = [BoxType.NO_LIGHT, BoxType.WITH_LIGHT]
 
 class Stock(models.Model):
     """Stock disponible por variante y tipo de cajita (variante + sin/con luz)."""
-    variant = models.CharField(max_length=50, choices=[
-        (v, v) for v in STOCK_VARIANTS
-    ])
+    # Sin choices: además de STOCK_VARIANTS hay filas para las variantes de BoxVariant (orders.stock).
+    variant = models.CharField(max_length=50, help_text='Base variant code (STOCK_VARIANTS or BoxVariant)')
     box_type = models.CharField(
         max_length=20,
         choices=BoxType.choices,
@@ -151,3 +191,123 @@ class PackagingStock(models.Model):
     def __str__(self):
         return f"{self.get_item_type_display()}: {self.quantity}"
 
+
+class FilamentStock(models.Model):
+    """
+    Filamento PLA disponible por variante, en gramos (variant = Purchase.variant_key, p. ej. 'madera').
+    Suma con cada compra de rollos PLA y descuenta al finalizar pedidos sin luz (orders.stock).
+    """
+    variant = models.CharField(max_length=80, unique=True, help_text='Normalized PLA variant (Purchase.variant_key)')
+    grams = models.PositiveIntegerField(default=0)
+    low_threshold = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Alert below this many grams (empty: PLA_LOW_STOCK_GRAMS)'
+    )
+
+    class Meta:
+        verbose_name = 'PLA filament stock'
+        verbose_name_plural = 'PLA filament stock'
+
+    def __str__(self):
+        return f"PLA {self.variant}: {self.grams} g"
+
+
+class StockItemKind(models.TextChoices):
+    BOX = 'box', 'Box (Stock)'
+    PACKAGING = 'packaging', 'Packaging'
+    FILAMENT = 'filament', 'PLA filament (grams)'
+
+
+class StockMovementKind(models.TextChoices):
+    PURCHASE = 'purchase', 'Purchase receipt'
+    FINALIZATION = 'finalization', 'Order finalization'
+    SET = 'set', 'Manual set'
+    ADJUSTMENT = 'adjustment', 'Manual adjustment'
+
+
+def stock_item_key(variant, box_type):
+    """Clave de ledger para una fila de Stock ('wood:no_light'); para empaque es el item_type."""
+    return f'{variant}:{box_type}'
+
+
+def filament_item_key(variant):
+    """Clave de ledger del filamento PLA de una variante ('pla:madera')."""
+    return f'pla:{variant}'
+
+
+class StockMovement(models.Model):
+    """
+    Ledger append-only de movimientos de Stock, PackagingStock y FilamentStock (orders.stock). Cada
+    entrada guarda el delta y el saldo resultante (gramos para el filamento); quantity/grams son el
+    saldo materializado.
+    """
+    item_kind = models.CharField(max_length=20, choices=StockItemKind.choices)
+    item = models.CharField(
+        max_length=60, help_text="'variant:box_type' for boxes, item_type for packaging, 'pla:variant' for filament"
+    )
+    kind = models.CharField(max_length=20, choices=StockMovementKind.choices)
+    delta = models.IntegerField()
+    balance_after = models.PositiveIntegerField()
+    order = models.ForeignKey(
+        Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements'
+    )
+    purchase = models.ForeignKey(
+        'expenses.Purchase', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['item', 'created_at', 'id'], name='stockmove_item_time_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.item} {self.delta:+d} -> {self.balance_after} ({self.kind})'
+
+
+class StockSnapshot(models.Model):
+    """
+    Checkpoint del saldo de un ítem (manage.py snapshot_stock): saldo al último movimiento
+    incluido. El saldo histórico es el snapshot más reciente + los movimientos posteriores.
+    """
+    item_kind = models.CharField(max_length=20, choices=StockItemKind.choices)
+    item = models.CharField(max_length=60)
+    balance = models.PositiveIntegerField()
+    # Último movimiento incluido en balance (0 = saldo inicial, anterior al ledger).
+    last_movement_id = models.PositiveBigIntegerField(default=0)
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-taken_at', '-id']
+        indexes = [
+            models.Index(fields=['item', 'taken_at'], name='stocksnap_item_time_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.item} = {self.balance} @ {self.taken_at:%Y-%m-%d %H:%M}'
+
+
+class SalesDaily(models.Model):
+    """
+    Rollup de ventas por día (fecha local de finalized_at), box_type y variante. Se mantiene
+    incrementalmente al guardar/borrar pedidos (orders.sales); manage.py rebuild_sales_rollup
+    lo reconstruye desde los pedidos.
+    """
+    date = models.DateField()
+    box_type = models.CharField(max_length=20, blank=True, choices=BoxType.choices)
+    variant = models.CharField(max_length=50, blank=True)
+    count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    margin = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+
+    class Meta:
+        verbose_name_plural = 'Sales daily'
+        ordering = ['-date', 'box_type', 'variant']
+        unique_together = [['date', 'box_type', 'variant']]
+
+    def __str__(self):
+        return f'{self.date} {self.box_type or "-"} {self.variant or "-"}: {self.count}'
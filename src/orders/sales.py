@@ -0,0 +1,235 @@
+"""
+Rollup diario de ventas (SalesDaily): fecha × box_type × variante con cantidad, ingresos, costo y margen.
+
+Cada pedido aporta a una sola fila mientras su estado sea de venta (SALE_STATUSES) y tenga
+finalized_at. orders.signals lee el aporte previo antes de guardar y aplica la diferencia
+después (finalizar, entregar, volver a en curso, cambiar precio o variante) y lo resta al borrar,
+con UPDATEs F(): dentro de la transacción del cambio cuando el llamador es atómico (perform_update,
+admin, borrados). Los update()/bulk_* sobre Order no pasan por las señales: para eso está
+manage.py rebuild_sales_rollup.
+
+La versión 'sales' sube con cualquier cambio visible en las estadísticas de un pedido vendido
+(aporte al rollup, fecha exacta, cost_snapshot) y con las reconstrucciones: la usan las respuestas
+cacheadas de EstadisticasView.
+
+Un pedido que pasa a venta sin sale_price (entregado sin finalizar, snapshot fallido) lo guarda
+al aplicarse su aporte (freeze_sale_price), desde su price_snapshot o el precio actual de
+SiteSettings: lo que se resta al cambiarlo o borrarlo es exactamente lo que se sumó, aunque los
+precios cambien en el medio. Las ventas anteriores lo recibieron en la migración 0013. Solo los
+update()/bulk_* que dejan ventas sin precio caen al precio actual (sale_price_expr) hasta el
+próximo rebuild.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from memory_box.versioning import bump_version_on_commit
+from .models import BoxType, Order, SALE_STATUSES, SalesDaily
+
+SALES_VERSION = 'sales'
+
+# Campos de Order de los que depende el aporte al rollup.
+SALE_FIELDS = ('status', 'finalized_at', 'box_type', 'variant', 'sale_price', 'production_cost')
+# Campos que muestran las estadísticas (detalle incluido).
+STATS_FIELDS = SALE_FIELDS + ('cost_snapshot',)
+
+_AMOUNT = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+
+def current_prices():
+    """{box_type: precio actual} según SiteSettings (con luz incluye pilas)."""
+    from config.views import get_settings
+    site = get_settings()
+    with_light = Decimal((site.price_con_luz or 0) + (site.price_pilas or 0))
+    return {BoxType.WITH_LIGHT: with_light, None: Decimal(site.price_sin_luz or 0)}
+
+
+def sale_price_expr():
+    """Precio de venta en SQL: sale_price, sino el precio actual según box_type."""
+    prices = current_prices()
+    current = Case(
+        When(box_type=BoxType.WITH_LIGHT, then=Value(prices[BoxType.WITH_LIGHT])),
+        default=Value(prices[None]),
+        output_field=_AMOUNT,
+    )
+    return Coalesce('sale_price', current, output_field=_AMOUNT)
+
+
+def production_cost_expr():
+    """Costo de producción en SQL: production_cost (0 sin snapshot)."""
+    return Coalesce('production_cost', Value(ZERO), output_field=_AMOUNT)
+
+
+def sale_contribution(values, prices=None):
+    """
+    ((date, box_type, variant), revenue, cost) que aporta un pedido al rollup, o None si no es venta.
+    ``values`` es un dict con SALE_FIELDS (o un Order).
+    """
+    get = values.get if isinstance(values, dict) else lambda f: getattr(values, f)
+    if get('status') not in SALE_STATUSES or get('finalized_at') is None:
+        return None
+    box_type = get('box_type') or ''
+    revenue = get('sale_price')
+    if revenue is None:
+        prices = prices or current_prices()
+        revenue = prices.get(box_type, prices[None])
+    key = (timezone.localtime(get('finalized_at')).date(), box_type, get('variant') or '')
+    return key, Decimal(revenue), Decimal(get('production_cost') or 0)
+
+
+def sale_state(values):
+    """Valores de STATS_FIELDS de un pedido vendido (dict u Order); None si no es venta o no existe."""
+    if values is None:
+        return None
+    get = values.get if isinstance(values, dict) else lambda f: getattr(values, f)
+    if get('status') not in SALE_STATUSES or get('finalized_at') is None:
+        return None
+    return tuple(get(f) for f in STATS_FIELDS)
+
+
+def stored_values(pk):
+    """STATS_FIELDS del pedido tal como está guardado (antes de un save), o None."""
+    return Order.objects.filter(pk=pk).values(*STATS_FIELDS).first()
+
+
+def _changed():
+    bump_version_on_commit(SALES_VERSION)
+
+
+def _apply(key, count, revenue, cost):
+    date, box_type, variant = key
+    lookup = {'date': date, 'box_type': box_type, 'variant': variant}
+    changes = {
+        'count': F('count') + count,
+        'revenue': F('revenue') + revenue,
+        'cost': F('cost') + cost,
+        'margin': F('margin') + (revenue - cost),
+    }
+    if SalesDaily.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SalesDaily.objects.create(count=count, revenue=revenue, cost=cost, margin=revenue - cost, **lookup)
+    except IntegrityError:
+        # Otro pedido del mismo día creó la fila entre el UPDATE y el INSERT.
+        SalesDaily.objects.filter(**lookup).update(**changes)
+
+
+def _move(before, after):
+    if before == after:
+        return
+    if before is not None:
+        key, revenue, cost = before
+        _apply(key, -1, -revenue, -cost)
+    if after is not None:
+        key, revenue, cost = after
+        _apply(key, 1, revenue, cost)
+
+
+def apply_change(before, after):
+    """Pasa el aporte de un pedido de ``before`` a ``after`` (cualquiera puede ser None)."""
+    if before == after:
+        return
+    with transaction.atomic():
+        _move(before, after)
+        _changed()
+
+
+def apply_deltas(deltas):
+    """
+    Suma {key: (count, revenue, cost)} al rollup en una transacción: para cambios masivos
+    (bulk_update) que no pasan por las señales, agrupados por fila.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    with transaction.atomic():
+        for key, (count, revenue, cost) in deltas.items():
+            _apply(key, count, revenue, cost)
+        _changed()
+
+
+def freeze_sale_price(order):
+    """
+    Guarda sale_price de una venta que no lo tiene (un UPDATE): el precio_venta de su price_snapshot
+    o, sin él, el precio actual.
+    """
+    snapshot = order.price_snapshot if isinstance(order.price_snapshot, dict) else {}
+    if isinstance(snapshot.get('precio_venta'), (int, float)):
+        order.sale_price = Decimal(str(snapshot['precio_venta'])).quantize(CENT)
+    else:
+        prices = current_prices()
+        order.sale_price = prices.get(order.box_type, prices[None])
+    Order.objects.filter(pk=order.pk, sale_price__isnull=True).update(sale_price=order.sale_price)
+
+
+def order_saved(before, order):
+    """
+    Después de guardar ``order``: ``before`` son sus stored_values() previos (None si era nuevo).
+    Cambios que no mueven el rollup (hora de finalización, desglose de costos) igual suben la versión.
+    """
+    if sale_state(before) == sale_state(order):
+        return
+    with transaction.atomic():
+        if order.sale_price is None and sale_state(order) is not None:
+            freeze_sale_price(order)
+        _move(sale_contribution(before) if before else None, sale_contribution(order))
+        _changed()
+
+
+def order_deleted(order):
+    if sale_state(order) is not None:
+        apply_change(sale_contribution(order), None)
+
+
+def day_bounds(first_day, last_day):
+    """[inicio de first_day, inicio del día siguiente a last_day) en hora local, como datetimes."""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(first_day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def aggregate_range(first_day, last_day):
+    """Filas del rollup [first_day, last_day] calculadas desde los pedidos (un GROUP BY)."""
+    start, end = day_bounds(first_day, last_day)
+    rows = (
+        Order.objects
+        .filter(status__in=SALE_STATUSES, finalized_at__gte=start, finalized_at__lt=end)
+        .annotate(day=TruncDate('finalized_at'))
+        .values('day', 'box_type', 'variant')
+        .annotate(count=Count('id'), revenue=Sum(sale_price_expr()), cost=Sum(production_cost_expr()))
+        .order_by()
+    )
+    return [
+        SalesDaily(
+            date=row['day'], box_type=row['box_type'] or '', variant=row['variant'] or '',
+            count=row['count'], revenue=row['revenue'] or ZERO, cost=row['cost'] or ZERO,
+            margin=(row['revenue'] or ZERO) - (row['cost'] or ZERO),
+        )
+        for row in rows
+    ]
+
+
+def replace_range(first_day, last_day, rows):
+    """Reemplaza las filas del rollup del rango por ``rows`` en una transacción."""
+    with transaction.atomic():
+        SalesDaily.objects.filter(date__gte=first_day, date__lte=last_day).delete()
+        SalesDaily.objects.bulk_create(rows)
+        _changed()
+
+
+def sales_date_range():
+    """(primer día, último día) con ventas, en fecha local; None si no hay."""
+    qs = Order.objects.filter(status__in=SALE_STATUSES, finalized_at__isnull=False)
+    first = qs.order_by('finalized_at').values_list('finalized_at', flat=True).first()
+    if first is None:
+        return None
+    last = qs.order_by('-finalized_at').values_list('finalized_at', flat=True).first()
+    return timezone.localtime(first).date(), timezone.localtime(last).date()
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import (
     Order, ImageCrop, BoxType, LedType, ShippingOption, Stock, STOCK_VARIANTS,
-    PackagingStock,
+    PackagingStock, StockMovement,
 )
 from expenses.models import Purchase, PurchaseCategory
 
@@ -56,6 +56,17 @@ class PackagingStockSerializer(serializers.ModelSerializer):
         fields = ['id', 'item_type', 'item_type_display', 'quantity']
 
 
+class StockMovementSerializer(serializers.ModelSerializer):
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+
+    class Meta:
+        model = StockMovement
+        fields = [
+            'id', 'item_kind', 'item', 'kind', 'kind_display', 'delta', 'balance_after',
+            'order', 'purchase', 'user', 'created_at',
+        ]
+
+
 class PurchaseSerializer(serializers.ModelSerializer):
     category_display = serializers.CharField(source='get_category_display', read_only=True)
 
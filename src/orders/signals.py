@@ -0,0 +1,55 @@
+"""
+Stock rows provisioning, 'stock'/'orders' data version bumps (see orders.stock, memory_box.versioning)
+and the SalesDaily rollup upkeep (orders.sales).
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from config.models import BoxVariant
+from memory_box.versioning import bump_version_on_commit
+from .models import Order, PackagingStock, Stock
+from .sales import STATS_FIELDS, order_deleted, order_saved, stored_values
+from .stock import STOCK_VERSION, provision_rows, stock_variant_code
+
+ORDERS_VERSION = 'orders'
+
+
+@receiver([post_save, post_delete], sender=Order)
+def order_changed(sender, **kwargs):
+    bump_version_on_commit(ORDERS_VERSION)
+
+
+@receiver(pre_save, sender=Order)
+def order_sale_before(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(STATS_FIELDS):
+        return
+    instance._sale_before = stored_values(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Order)
+def order_sale_after(sender, instance, **kwargs):
+    if hasattr(instance, '_sale_before'):
+        order_saved(instance.__dict__.pop('_sale_before'), instance)
+
+
+@receiver(post_delete, sender=Order)
+def order_sale_deleted(sender, instance, **kwargs):
+    order_deleted(instance)
+
+
+@receiver([post_save, post_delete], sender=Stock)
+@receiver([post_save, post_delete], sender=PackagingStock)
+def stock_row_changed(sender, **kwargs):
+    # Row saves outside orders.stock (admin, shell); the service's F() updates bump on commit too.
+    bump_version_on_commit(STOCK_VERSION)
+
+
+@receiver(post_save, sender=BoxVariant)
+def box_variant_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw and instance.code:
+        provision_rows([stock_variant_code(instance.code)])
+
+
+def provision_after_migrate(sender, **kwargs):
+    """post_migrate: las filas existen desde el arranque (el contenedor migra en cada inicio)."""
+    provision_rows()
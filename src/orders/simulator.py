@@ -0,0 +1,336 @@
+"""
+Simulador de precios/costos sobre el historial de ventas, vectorizado con NumPy.
+
+El historial (ventas de los últimos ``days`` días) se carga una vez en arrays: con/sin luz,
+variante PLA, gramos, precio y costo del snapshot. Como el precio y el costo de un pedido sólo
+dependen de su grupo (con luz, variante PLA, gramos), los escenarios se evalúan sobre una matriz
+escenarios × grupos y se ponderan por la cantidad de pedidos de cada grupo: el costo de evaluar
+no depende de cuántos pedidos haya.
+
+El costo simulado replica expenses.cost_model.CostModel._compute (componentes redondeados hacia
+arriba); el precio, _compute_order_price_snapshot. Los parámetros que un escenario no fija toman el
+valor vigente (SiteSettings y modelo de costos). El historial se carga una sola vez para la
+ventana máxima (MAX_WINDOW_DAYS), ordenado por fecha de venta, y cada pedido recorta sus ``days``
+con una búsqueda binaria: una sola copia en memoria, cacheada por las versiones 'sales' y
+'cost_model'.
+"""
+import itertools
+
+import numpy as np
+from django.utils import timezone
+
+from expenses.cost_model import COST_MODEL_VERSION, get_cost_model, pla_variant_name
+from expenses.models import normalize_variant
+from memory_box.versioning import VersionedCache
+from .models import BoxType, Order, SALE_STATUSES
+from .sales import SALES_VERSION
+
+PRICE_PARAMS = ('price_sin_luz', 'price_con_luz', 'price_pilas')
+COST_PARAMS = ('cost_con_luz', 'cost_empaque', 'cost_troqueles', 'pla_cost_per_gram', 'pla_cost_factor')
+PARAMS = PRICE_PARAMS + COST_PARAMS
+MAX_SCENARIOS = 20000
+DEFAULT_WINDOW_DAYS = 365
+MAX_WINDOW_DAYS = 3650
+PERCENTILES = (10, 50, 90)
+
+
+class SimulationError(ValueError):
+    pass
+
+
+class History:
+    """Ventas de una ventana agrupadas por (with_light, variante PLA, gramos), con el conteo de cada grupo."""
+
+    def __init__(self, groups, group_of, counts, sale_price, production_cost, pla_variants):
+        self.size = len(group_of)
+        self.pla_variants = pla_variants
+        self.sale_price = sale_price
+        self.production_cost = production_cost
+        self.group_of = group_of
+        self.g_with_light = groups[:, 0].astype(bool)
+        self.g_pla_index = groups[:, 1].astype(np.int64)
+        self.g_grams = groups[:, 2]
+        self.counts = counts.astype(np.float64)
+
+
+class SalesHistory:
+    """
+    Ventas de los últimos MAX_WINDOW_DAYS días por fecha de venta, agrupadas una vez al cargar;
+    ``window(days)`` arma el History de una ventana contando los grupos de su recorte.
+    """
+
+    def __init__(self, finalized, with_light, pla_index, grams, sale_price, production_cost, pla_variants):
+        self.finalized = finalized
+        self.sale_price = sale_price
+        self.production_cost = production_cost
+        self.pla_variants = pla_variants
+        keys = np.stack([with_light.astype(np.float64), pla_index.astype(np.float64), grams], axis=1)
+        if len(keys):
+            self.groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        else:
+            self.groups, inverse = np.empty((0, 3)), np.empty(0, dtype=np.int64)
+        self.group_of = inverse.reshape(-1)
+
+    @classmethod
+    def load(cls):
+        model = get_cost_model()
+        since = timezone.now() - timezone.timedelta(days=MAX_WINDOW_DAYS)
+        rows = list(
+            Order.objects.filter(status__in=SALE_STATUSES, finalized_at__gte=since)
+            .order_by('finalized_at')
+            .values_list('finalized_at', 'box_type', 'variant', 'sale_price', 'production_cost')
+        )
+        pla_variants = []
+        pla_positions = {}
+        size = len(rows)
+        finalized = np.zeros(size)
+        with_light = np.zeros(size, dtype=bool)
+        pla_index = np.full(size, -1, dtype=np.int64)
+        grams = np.zeros(size)
+        sale_price = np.full(size, np.nan)
+        production_cost = np.full(size, np.nan)
+        variant_info = {}
+        for i, (finalized_at, box_type, variant, price, cost) in enumerate(rows):
+            finalized[i] = finalized_at.timestamp()
+            if box_type == BoxType.WITH_LIGHT:
+                with_light[i] = True
+            else:
+                info = variant_info.get(variant)
+                if info is None:
+                    name = pla_variant_name(variant)
+                    key = normalize_variant(name)
+                    if name and key not in pla_positions:
+                        pla_positions[key] = len(pla_variants)
+                        pla_variants.append(key)
+                    info = variant_info[variant] = (pla_positions.get(key, -1) if name else -1, model.grams_for(name))
+                pla_index[i], grams[i] = info
+            if price is not None:
+                sale_price[i] = price
+            if cost is not None:
+                production_cost[i] = cost
+        return cls(finalized, with_light, pla_index, grams, sale_price, production_cost, pla_variants)
+
+    def window(self, days):
+        """History de las ventas con finalized_at >= ahora - ``days``: un recorte de los arrays cargados."""
+        since = (timezone.now() - timezone.timedelta(days=days)).timestamp()
+        start = int(np.searchsorted(self.finalized, since, side='left'))
+        group_of = self.group_of[start:]
+        counts = np.bincount(group_of, minlength=len(self.groups))
+        present = np.flatnonzero(counts)
+        group_remap = np.full(len(self.groups), -1, dtype=np.int64)
+        group_remap[present] = np.arange(len(present))
+        groups = self.groups[present]
+        # Sólo las variantes PLA presentes en la ventana; el -1 (sin PLA) cae en la última posición.
+        pla_index = groups[:, 1].astype(np.int64)
+        used = np.unique(pla_index[pla_index >= 0])
+        pla_remap = np.full(len(self.pla_variants) + 1, -1, dtype=np.int64)
+        pla_remap[used] = np.arange(len(used))
+        groups[:, 1] = pla_remap[pla_index]
+        return History(
+            groups, group_remap[group_of], counts[present], self.sale_price[start:],
+            self.production_cost[start:], [self.pla_variants[i] for i in used],
+        )
+
+
+_sales_history = VersionedCache(SalesHistory.load, SALES_VERSION, COST_MODEL_VERSION)
+
+
+def get_history(days=DEFAULT_WINDOW_DAYS):
+    return _sales_history.get().window(min(days, MAX_WINDOW_DAYS))
+
+
+def current_params(history):
+    """Parámetros vigentes: precios de SiteSettings y costos del modelo compilado."""
+    from config.views import get_settings
+    site = get_settings()
+    model = get_cost_model()
+    return {
+        'price_sin_luz': float(site.price_sin_luz or 0),
+        'price_con_luz': float(site.price_con_luz or 0),
+        'price_pilas': float(site.price_pilas or 0),
+        'cost_con_luz': float(model.cost_con_luz),
+        'cost_empaque': float(model.cost_empaque),
+        'cost_troqueles': float(model.cost_troqueles),
+        'pla_cost_per_gram': {
+            key: (float(model.pla_cost_per_gram[key]) if model.pla_cost_per_gram.get(key) is not None else None)
+            for key in history.pla_variants
+        },
+        'pla_cost_factor': 1.0,
+    }
+
+
+def _number(name, value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value) or value < 0:
+        raise SimulationError(f'{name} must be a non-negative number.')
+    return float(value)
+
+
+def expand_grid(grid):
+    """{param: [valores]} -> lista de escenarios (producto cartesiano)."""
+    if not isinstance(grid, dict) or not grid:
+        raise SimulationError('grid must be an object of {param: [values]}.')
+    names = list(grid)
+    values = []
+    total = 1
+    for name in names:
+        options = grid[name]
+        if name not in PARAMS or name == 'pla_cost_per_gram' and isinstance(options, dict):
+            raise SimulationError(f'Unknown or non-scalar grid parameter: {name}.')
+        if not isinstance(options, list) or not options:
+            raise SimulationError(f'grid.{name} must be a non-empty list.')
+        total *= len(options)
+        if total > MAX_SCENARIOS:
+            raise SimulationError(f'At most {MAX_SCENARIOS} scenarios per request.')
+        values.append(options)
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def _matrices(history, scenarios, base):
+    """Vectores de parámetros (S,) y costo por gramo (S, V) con los valores vigentes por defecto."""
+    count = len(scenarios)
+    vectors = {name: np.full(count, base[name], dtype=np.float64) for name in PARAMS if name != 'pla_cost_per_gram'}
+    base_pla = np.array(
+        [np.nan if base['pla_cost_per_gram'][key] is None else base['pla_cost_per_gram'][key]
+         for key in history.pla_variants],
+        dtype=np.float64,
+    )
+    pla = np.tile(base_pla, (count, 1))
+    for s, scenario in enumerate(scenarios):
+        if not isinstance(scenario, dict):
+            raise SimulationError('Each scenario must be an object.')
+        for name, value in scenario.items():
+            if name not in PARAMS:
+                raise SimulationError(f'Unknown parameter: {name}.')
+            if name == 'pla_cost_per_gram':
+                if isinstance(value, dict):
+                    for key, per_gram in value.items():
+                        column = history.pla_variants.index(normalize_variant(key)) \
+                            if normalize_variant(key) in history.pla_variants else None
+                        if column is not None:
+                            pla[s, column] = _number(f'pla_cost_per_gram.{key}', per_gram)
+                else:
+                    pla[s, :] = _number(name, value)
+            else:
+                vectors[name][s] = _number(name, value)
+    return vectors, pla
+
+
+def _weighted_percentiles(values, weights, total):
+    """Percentiles PERCENTILES de cada fila de ``values`` (S, K) con pesos (K,)."""
+    order = np.argsort(values, axis=1)
+    ordered = np.take_along_axis(values, order, axis=1)
+    cumulative = np.cumsum(weights[order], axis=1)
+    result = {}
+    for q in PERCENTILES:
+        position = np.argmax(cumulative >= total * q / 100, axis=1)
+        result[f'p{q}'] = np.take_along_axis(ordered, position[:, None], axis=1)[:, 0]
+    return result
+
+
+def evaluate(history, scenarios, base):
+    """Dict de arrays (S,) con los totales y la distribución del margen por pedido de cada escenario."""
+    v, pla = _matrices(history, scenarios, base)
+    light = history.g_with_light[None, :]
+    # Precio por escenario y grupo (S, K)
+    price = np.where(light, (v['price_con_luz'] + v['price_pilas'])[:, None], v['price_sin_luz'][:, None])
+    # Costo: mismo redondeo por componente que CostModel._compute
+    if history.pla_variants:
+        per_gram = pla[:, np.clip(history.g_pla_index, 0, None)] * v['pla_cost_factor'][:, None]
+    else:
+        per_gram = np.full(price.shape, np.nan)
+    has_pla = (~light) & (history.g_pla_index >= 0)[None, :] & (history.g_grams > 0)[None, :] & ~np.isnan(per_gram)
+    cost_pla = np.where(has_pla, np.ceil(np.nan_to_num(per_gram) * history.g_grams[None, :]), 0.0)
+    cost_caja = np.where(light, np.ceil(v['cost_con_luz'])[:, None], 0.0)
+    fixed = np.ceil(v['cost_empaque']) + np.ceil(v['cost_troqueles'])
+    cost = cost_caja + cost_pla + fixed[:, None]
+    margin = price - cost
+
+    counts = history.counts
+    n = counts.sum()
+    revenue = price @ counts
+    total_cost = cost @ counts
+    total_margin = margin @ counts
+    result = {
+        'revenue': revenue,
+        'cost': total_cost,
+        'margin': total_margin,
+        'margin_pct': np.divide(total_margin * 100, revenue, out=np.full(len(revenue), np.nan), where=revenue > 0),
+        'mean': total_margin / n if n else np.full(len(revenue), np.nan),
+        'min': margin.min(axis=1) if n else np.full(len(revenue), np.nan),
+        'max': margin.max(axis=1) if n else np.full(len(revenue), np.nan),
+        'negative_share': ((margin < 0) @ counts) / n if n else np.full(len(revenue), np.nan),
+    }
+    if n:
+        result.update(_weighted_percentiles(margin, counts, n))
+    return result
+
+
+def historical_summary(history):
+    """Margen real del historial (sale_price - production_cost de los snapshots)."""
+    known = ~np.isnan(history.sale_price) & ~np.isnan(history.production_cost)
+    margin = history.sale_price[known] - history.production_cost[known]
+    if not margin.size:
+        return {'orders': int(history.size), 'with_snapshot': 0}
+    revenue = history.sale_price[known].sum()
+    return {
+        'orders': int(history.size),
+        'with_snapshot': int(margin.size),
+        'revenue': _round(revenue),
+        'cost': _round(history.production_cost[known].sum()),
+        'margin': _round(margin.sum()),
+        'margin_pct': _round(margin.sum() * 100 / revenue) if revenue else None,
+        'per_order': {
+            'mean': _round(margin.mean()),
+            'min': _round(margin.min()),
+            **{f'p{q}': _round(value) for q, value in zip(PERCENTILES, np.percentile(margin, PERCENTILES))},
+            'max': _round(margin.max()),
+        },
+        'negative_share': _round(float((margin < 0).mean()), 4),
+    }
+
+
+def _round(value, digits=2):
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def simulate(scenarios, days=DEFAULT_WINDOW_DAYS):
+    """Resultados por escenario (más el escenario vigente como referencia) sobre ``days`` días de ventas."""
+    if not isinstance(scenarios, list) or not scenarios:
+        raise SimulationError('Provide a non-empty list of scenarios or a grid.')
+    if len(scenarios) > MAX_SCENARIOS:
+        raise SimulationError(f'At most {MAX_SCENARIOS} scenarios per request.')
+    history = get_history(days)
+    base = current_params(history)
+    results = evaluate(history, [{}] + scenarios, base)
+    months = days / 30
+    rows = []
+    for s in range(len(scenarios) + 1):
+        margin = results['margin'][s]
+        rows.append({
+            'revenue': _round(results['revenue'][s]),
+            'cost': _round(results['cost'][s]),
+            'margin': _round(margin),
+            'margin_pct': _round(results['margin_pct'][s]),
+            'monthly_margin': _round(margin / months),
+            'delta_margin': _round(margin - results['margin'][0]),
+            'per_order': {
+                'mean': _round(results['mean'][s]),
+                'min': _round(results['min'][s]),
+                **{f'p{q}': _round(results[f'p{q}'][s]) if f'p{q}' in results else None for q in PERCENTILES},
+                'max': _round(results['max'][s]),
+            },
+            'negative_share': _round(results['negative_share'][s], 4),
+        })
+    current = rows.pop(0)
+    for row, scenario in zip(rows, scenarios):
+        row['params'] = scenario
+    return {
+        'window_days': days,
+        'orders': int(history.size),
+        'groups': int(len(history.counts)),
+        'current_params': base,
+        'historical': historical_summary(history),
+        'current': current,
+        'scenarios': rows,
+    }
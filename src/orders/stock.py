@@ -0,0 +1,335 @@
+"""
+Mutaciones de stock (Stock por variante, PackagingStock, FilamentStock en gramos) con F() y ledger
+de movimientos.
+
+Nada lee la cantidad en Python para después escribirla sin tener la fila bloqueada: dos admins
+cargando stock a la vez o dos pedidos finalizados en paralelo no pisan sus cambios. Los descuentos
+llevan guardia de no negativo en el WHERE (quantity >= n), así que una fila en 0 queda en 0 en vez
+de fallar. consume_packaging lee con SELECT ... FOR UPDATE (en SQLite las transacciones son
+IMMEDIATE, ver settings) para descontar todos los ítems en un solo UPDATE.
+Si la fila todavía no existe se crea; si otro proceso la crea primero, se reintenta el UPDATE.
+
+Cada mutación agrega un StockMovement (delta + saldo resultante) en la misma transacción: el
+UPDATE bloquea la fila hasta el commit, así que el saldo leído después es exactamente el propio.
+balance_at() reconstruye el saldo a una fecha desde el último StockSnapshot.
+
+Las filas requeridas (variantes de STOCK_VARIANTS y de BoxVariant, tipos de empaque) se crean una
+sola vez: migración de datos + post_migrate + alta de BoxVariant (orders.signals). Cada mutación
+sube la versión 'stock' al commitear, lo que invalida los listados cacheados (orders.views).
+
+Las notificaciones por WebSocket (send_stock_update/send_orders_update) siguen a cargo de las vistas.
+"""
+import math
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Sum, When
+
+from memory_box.versioning import bump_version_on_commit
+from .models import (
+    BoxType, FilamentStock, PackagingStock, Stock, StockItemKind, StockMovement, StockMovementKind,
+    StockSnapshot, STOCK_VARIANTS, Variant, filament_item_key, stock_item_key,
+)
+
+STOCK_VERSION = 'stock'
+
+PACKAGING_PER_ORDER = (PackagingStock.CAJA_CARTON, PackagingStock.BOLSA_ECOMMERCE)
+
+
+def stock_variant_code(code):
+    """Variante de stock para un código de BoxVariant/Order ('wood_light' -> 'wood')."""
+    return (code or '').strip().lower().removesuffix('_light')
+
+
+def stock_variants():
+    """STOCK_VARIANTS más las variantes base de los BoxVariant cargados en el catálogo."""
+    from config.models import BoxVariant
+    codes = BoxVariant.objects.values_list('code', flat=True)
+    return list(dict.fromkeys([*STOCK_VARIANTS, *(stock_variant_code(c) for c in codes if c)]))
+
+
+def provision_rows(variants=None):
+    """
+    Crea (si faltan) las filas de Stock sin luz de cada variante y las de PackagingStock.
+    Idempotente: un INSERT ... ON CONFLICT DO NOTHING por modelo.
+    """
+    variants = stock_variants() if variants is None else variants
+    Stock.objects.bulk_create(
+        [Stock(variant=v, box_type=BoxType.NO_LIGHT, quantity=0) for v in variants],
+        ignore_conflicts=True,
+    )
+    PackagingStock.objects.bulk_create(
+        [PackagingStock(item_type=item, quantity=0) for item, _ in PackagingStock.ITEM_TYPE_CHOICES],
+        ignore_conflicts=True,
+    )
+    bump_version_on_commit(STOCK_VERSION)
+
+
+def _changed():
+    bump_version_on_commit(STOCK_VERSION)
+
+
+def _current(model, lookup, field='quantity'):
+    return model.objects.filter(**lookup).values_list(field, flat=True).get()
+
+
+def _increment(model, lookup, amount, field='quantity'):
+    """``field`` += amount (amount >= 0) on the row matching ``lookup``, creating it if missing. Returns the balance."""
+    if model.objects.filter(**lookup).update(**{field: F(field) + amount}):
+        return _current(model, lookup, field)
+    try:
+        with transaction.atomic():
+            model.objects.create(**{field: amount}, **lookup)
+        return amount
+    except IntegrityError:
+        # Another request created the row between our UPDATE and INSERT.
+        model.objects.filter(**lookup).update(**{field: F(field) + amount})
+        return _current(model, lookup, field)
+
+
+def _assign(model, lookup, quantity, field='quantity'):
+    """``field`` = quantity; returns the previous balance (0 if the row did not exist)."""
+    previous = model.objects.select_for_update().filter(**lookup).values_list(field, flat=True).first()
+    if previous is not None:
+        model.objects.filter(**lookup).update(**{field: quantity})
+        return previous
+    try:
+        with transaction.atomic():
+            model.objects.create(**{field: quantity}, **lookup)
+        return 0
+    except IntegrityError:
+        return _assign(model, lookup, quantity, field)
+
+
+def _record(item_kind, item, kind, delta, balance, **links):
+    if delta:
+        StockMovement.objects.create(
+            item_kind=item_kind, item=item, kind=kind, delta=delta, balance_after=balance, **links
+        )
+
+
+def add_stock(variant, amount, box_type=BoxType.NO_LIGHT, user=None):
+    """Suma ``amount`` (>= 0) al stock de la variante. Devuelve la fila actualizada."""
+    lookup = {'variant': variant, 'box_type': box_type}
+    with transaction.atomic():
+        balance = _increment(Stock, lookup, amount)
+        _record(StockItemKind.BOX, stock_item_key(variant, box_type), StockMovementKind.ADJUSTMENT,
+                amount, balance, user=user)
+        _changed()
+    return Stock.objects.get(**lookup)
+
+
+def set_stock(variant, quantity, box_type=BoxType.NO_LIGHT, user=None):
+    """Fija el stock físico de la variante. Devuelve la fila actualizada."""
+    lookup = {'variant': variant, 'box_type': box_type}
+    with transaction.atomic():
+        previous = _assign(Stock, lookup, quantity)
+        _record(StockItemKind.BOX, stock_item_key(variant, box_type), StockMovementKind.SET,
+                quantity - previous, quantity, user=user)
+        _changed()
+    return Stock.objects.get(**lookup)
+
+
+def add_packaging(item_type, amount, purchase=None):
+    """Suma ``amount`` (>= 0) al stock de empaque (recepción de una compra de cajas/bolsas)."""
+    with transaction.atomic():
+        balance = _increment(PackagingStock, {'item_type': item_type}, amount)
+        _record(StockItemKind.PACKAGING, item_type, StockMovementKind.PURCHASE, amount, balance, purchase=purchase)
+        _changed()
+
+
+def set_packaging(item_type, quantity, user=None):
+    """Fija el stock de empaque (edición manual desde el admin)."""
+    with transaction.atomic():
+        previous = _assign(PackagingStock, {'item_type': item_type}, quantity)
+        _record(StockItemKind.PACKAGING, item_type, StockMovementKind.SET, quantity - previous, quantity, user=user)
+        _changed()
+
+
+def consume_packaging(deltas, order=None):
+    """
+    Descuenta varios ítems de empaque en una transacción: ``deltas`` = {item_type: cantidad}.
+    Lee las filas bloqueadas y descuenta las que alcanzan en un solo UPDATE (CASE por ítem, con
+    quantity >= cantidad en el WHERE); los movimientos van en un bulk_create. Los que no alcanzan
+    quedan igual y no generan movimiento. Tres queries sin importar cuántos ítems haya.
+    Devuelve cuántos ítems se descontaron.
+    """
+    deltas = {item: n for item, n in deltas.items() if n > 0}
+    if not deltas:
+        return 0
+    with transaction.atomic():
+        rows = PackagingStock.objects.select_for_update().filter(item_type__in=deltas)
+        balances = {
+            item: quantity - deltas[item]
+            for item, quantity in rows.values_list('item_type', 'quantity')
+            if quantity >= deltas[item]
+        }
+        if not balances:
+            return 0
+        guard = Q()
+        for item in balances:
+            guard |= Q(item_type=item, quantity__gte=deltas[item])
+        PackagingStock.objects.filter(guard).update(quantity=Case(
+            *(When(item_type=item, then=F('quantity') - deltas[item]) for item in balances),
+            default=F('quantity'), output_field=PositiveIntegerField(),
+        ))
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                item_kind=StockItemKind.PACKAGING, item=item, kind=StockMovementKind.FINALIZATION,
+                delta=-deltas[item], balance_after=balance, order=order,
+            )
+            for item, balance in balances.items()
+        ])
+        _changed()
+    return len(balances)
+
+
+def consume_packaging_for_order(order=None):
+    """1 caja de cartón + 1 bolsa ecommerce por pedido finalizado. Devuelve cuántos se descontaron."""
+    return consume_packaging({item: 1 for item in PACKAGING_PER_ORDER}, order=order)
+
+
+def add_filament(variant, grams, purchase=None):
+    """Suma ``grams`` (>= 0) al filamento PLA de la variante (compra de rollos)."""
+    with transaction.atomic():
+        balance = _increment(FilamentStock, {'variant': variant}, grams, field='grams')
+        _record(StockItemKind.FILAMENT, filament_item_key(variant), StockMovementKind.PURCHASE,
+                grams, balance, purchase=purchase)
+        _changed()
+
+
+def set_filament(variant, grams, user=None):
+    """Fija los gramos de filamento de la variante (pesaje de los rollos abiertos)."""
+    with transaction.atomic():
+        previous = _assign(FilamentStock, {'variant': variant}, grams, field='grams')
+        _record(StockItemKind.FILAMENT, filament_item_key(variant), StockMovementKind.SET,
+                grams - previous, grams, user=user)
+        _changed()
+    return FilamentStock.objects.get(variant=variant)
+
+
+def low_threshold(threshold):
+    return settings.PLA_LOW_STOCK_GRAMS if threshold is None else threshold
+
+
+def consume_filament(variant, grams, order=None):
+    """
+    Descuenta ``grams`` del filamento de la variante. A diferencia del empaque, si no alcanza el
+    saldo queda en 0: el filamento se usó igual y el saldo cargado estaba desactualizado.
+    Devuelve la alerta {'variant', 'grams', 'low_threshold'} si el saldo cruzó el umbral, sino None.
+    """
+    lookup = {'variant': variant}
+    with transaction.atomic():
+        if FilamentStock.objects.filter(grams__gte=grams, **lookup).update(grams=F('grams') - grams):
+            balance, threshold = FilamentStock.objects.filter(**lookup).values_list('grams', 'low_threshold').get()
+            previous = balance + grams
+        else:
+            previous = _assign(FilamentStock, lookup, 0, field='grams')
+            balance, threshold = 0, FilamentStock.objects.filter(**lookup).values_list('low_threshold', flat=True).get()
+        _record(StockItemKind.FILAMENT, filament_item_key(variant), StockMovementKind.FINALIZATION,
+                balance - previous, balance, order=order)
+        if balance != previous:
+            _changed()
+    threshold = low_threshold(threshold)
+    if balance < threshold <= previous:
+        return {'variant': variant, 'grams': balance, 'low_threshold': threshold}
+    return None
+
+
+def consume_filament_for_order(order):
+    """Gramos de PLA de una caja sin luz, calculados como cost_pla (modelo de costos). Devuelve la alerta o None."""
+    from expenses.cost_model import get_cost_model
+    usage = get_cost_model().pla_usage(order.box_type, order.variant)
+    if usage is None:
+        return None
+    variant, grams = usage
+    return consume_filament(variant, int(math.ceil(grams)), order=order)
+
+
+def filament_summary():
+    """Filamento por variante: gramos, umbral, si está bajo y cuántas cajas sin luz alcanzan."""
+    from expenses.cost_model import get_cost_model
+    model = get_cost_model()
+    per_box = {}
+    for code in Variant.values:
+        usage = model.pla_usage(BoxType.NO_LIGHT, code)
+        if usage:
+            per_box.setdefault(*usage)
+    rows = []
+    for variant, grams, threshold in FilamentStock.objects.order_by('variant').values_list(
+            'variant', 'grams', 'low_threshold'):
+        threshold = low_threshold(threshold)
+        box_grams = per_box.get(variant)
+        rows.append({
+            'variant': variant,
+            'grams': grams,
+            'low_threshold': threshold,
+            'low': grams < threshold,
+            'grams_per_box': box_grams,
+            'boxes_left': int(grams // box_grams) if box_grams else None,
+        })
+    return rows
+
+
+def current_items():
+    """[(item_kind, item, quantity)] de todas las filas de Stock y PackagingStock."""
+    items = [
+        (StockItemKind.BOX, stock_item_key(variant, box_type), quantity)
+        for variant, box_type, quantity in Stock.objects.values_list('variant', 'box_type', 'quantity')
+    ]
+    items += [
+        (StockItemKind.PACKAGING, item_type, quantity)
+        for item_type, quantity in PackagingStock.objects.values_list('item_type', 'quantity')
+    ]
+    items += [
+        (StockItemKind.FILAMENT, filament_item_key(variant), grams)
+        for variant, grams in FilamentStock.objects.values_list('variant', 'grams')
+    ]
+    return items
+
+
+def take_snapshots():
+    """Checkpoint por ítem con el saldo de su último movimiento (o el actual si no tiene). Devuelve cuántos."""
+    snapshots = []
+    for item_kind, item, quantity in current_items():
+        last = StockMovement.objects.filter(item=item).order_by('-id').values_list('id', 'balance_after').first()
+        last_id, balance = last if last else (0, quantity)
+        snapshots.append(StockSnapshot(item_kind=item_kind, item=item, balance=balance, last_movement_id=last_id))
+    StockSnapshot.objects.bulk_create(snapshots)
+    return len(snapshots)
+
+
+def balance_at(item, when):
+    """
+    Saldo de ``item`` al momento ``when``: último snapshot anterior (query indexada por item,
+    taken_at) más los movimientos posteriores. Antes del primer snapshot se deshacen hacia atrás
+    los movimientos incluidos en él; un ítem sin snapshots se reconstruye desde 0.
+    """
+    movements = StockMovement.objects.filter(item=item)
+    snapshot = StockSnapshot.objects.filter(item=item, taken_at__lte=when).order_by('-taken_at', '-id').first()
+    if snapshot is None:
+        first = StockSnapshot.objects.filter(item=item).order_by('taken_at', 'id').first()
+        if first is not None:
+            undo = movements.filter(id__lte=first.last_movement_id, created_at__gt=when)
+            return max(0, first.balance - (undo.aggregate(total=Sum('delta'))['total'] or 0))
+    base, last_id = (snapshot.balance, snapshot.last_movement_id) if snapshot else (0, 0)
+    replay = movements.filter(id__gt=last_id, created_at__lte=when)
+    return base + (replay.aggregate(total=Sum('delta'))['total'] or 0)
+
+
+def balances_at(when):
+    """{'stock': [...], 'packaging': [...], 'filament': [...]} con el saldo de cada ítem existente al momento ``when``."""
+    stock = [
+        {'variant': variant, 'box_type': box_type,
+         'quantity': balance_at(stock_item_key(variant, box_type), when)}
+        for variant, box_type in Stock.objects.order_by('variant', 'box_type').values_list('variant', 'box_type')
+    ]
+    packaging = [
+        {'item_type': item_type, 'quantity': balance_at(item_type, when)}
+        for item_type in PackagingStock.objects.order_by('item_type').values_list('item_type', flat=True)
+    ]
+    filament = [
+        {'variant': variant, 'grams': balance_at(filament_item_key(variant), when)}
+        for variant in FilamentStock.objects.order_by('variant').values_list('variant', flat=True)
+    ]
+    return {'stock': stock, 'packaging': packaging, 'filament': filament}
@@ -1 +1,523 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.utils import timezone
+
+from config.models import BoxVariant
+from config.views import _site_settings, get_settings
+from expenses.models import CostSettings, Purchase, PurchaseCategory
+from orders import coverage, simulator, stock as stock_service
+from orders.management.commands import backfill_order_snapshots as backfill
+from orders.models import (
+    FilamentStock, Order, OrderStatus, PackagingStock, SalesDaily, Stock, StockItemKind, StockMovement,
+    StockSnapshot, stock_item_key,
+)
+from orders.views import EstadisticasView
+from users.models import AdminUser
+
+
+class SubmitImagesTests(TestCase):
+
+    def test_finalized_order_rejects_images(self):
+        order = Order.objects.create(
+            client_name='Ana', box_type='no_light', variant='wood', status=OrderStatus.PROCESSING
+        )
+        response = self.client.post(f'/api/orders/{order.pk}/submit_images/', {})
+        self.assertEqual(response.status_code, 409)
+
+
+class FinalizeOrderTests(TestCase):
+    """Finalizar descuenta empaque y filamento; un CostSettings inválido no lo impide."""
+
+    def setUp(self):
+        cache.clear()
+        self.order = Order.objects.create(
+            client_name='Ana', box_type='no_light', variant='wood', status=OrderStatus.IN_PROGRESS
+        )
+        stock_service.add_filament('madera', 1000)
+
+    def _finalize(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(
+                f'/api/orders/{self.order.pk}/', {'status': OrderStatus.PROCESSING}, content_type='application/json'
+            )
+
+    def test_finalize_consumes_filament(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CostSettings.objects.update_or_create(id=1, defaults={'data': {'grams_caja_sin_luz': 60}})
+        response = self._finalize()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FilamentStock.objects.get(variant='madera').grams, 940)
+
+    def test_bad_cost_settings_still_finalize(self):
+        for data in ({'grams_caja_sin_luz': 'abc'}, {'variant_grams': 'x'}):
+            with self.subTest(data=data):
+                Order.objects.filter(pk=self.order.pk).update(status=OrderStatus.IN_PROGRESS, finalized_at=None)
+                with self.captureOnCommitCallbacks(execute=True):
+                    CostSettings.objects.update_or_create(id=1, defaults={'data': data})
+                with self.assertLogs('orders.views', 'WARNING'):
+                    response = self._finalize()
+                self.assertEqual(response.status_code, 200)
+                self.order.refresh_from_db()
+                self.assertEqual(self.order.status, OrderStatus.PROCESSING)
+                self.assertIsNotNone(self.order.finalized_at)
+                self.assertEqual(FilamentStock.objects.get(variant='madera').grams, 1000)
+
+
+class BackfillSnapshotsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.orders = [
+            Order.objects.create(
+                client_name=f'c{i}', box_type='no_light', variant='wood',
+                status=OrderStatus.DELIVERED, finalized_at=now,
+            )
+            for i in range(4)
+        ]
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+        self.addCleanup(lambda: os.path.exists(self.checkpoint) and os.remove(self.checkpoint))
+
+    def _run(self):
+        call_command('backfill_order_snapshots', '--chunk-size', '1', '--checkpoint', self.checkpoint,
+                     stdout=io.StringIO(), stderr=io.StringIO())
+        with open(self.checkpoint) as f:
+            return json.load(f)['last_id']
+
+    def test_checkpoint_stops_before_a_failed_order(self):
+        failing = self.orders[1].id
+        original = backfill.compute_chunk
+
+        def compute(rows, prices):
+            results, errors = original([r for r in rows if r['id'] != failing], prices)
+            return results, errors + [(r['id'], 'boom') for r in rows if r['id'] == failing]
+
+        with mock.patch.object(backfill, 'compute_chunk', side_effect=compute):
+            self.assertEqual(self._run(), failing - 1)
+        self.assertEqual(list(backfill.missing_snapshots().values_list('id', flat=True)), [failing])
+
+        # Al reanudar se reintenta el fallido y el checkpoint llega al final.
+        self.assertEqual(self._run(), failing)
+        self.assertFalse(backfill.missing_snapshots().exists())
+
+
+class SalesRollupTests(TestCase):
+    """Lo que un pedido suma al rollup es lo que resta después, aunque cambien los precios."""
+
+    def setUp(self):
+        cache.clear()
+        _site_settings.clear()
+        self._set_prices(20000)
+
+    def _set_prices(self, sin_luz):
+        site = get_settings()
+        site.price_sin_luz = sin_luz
+        with self.captureOnCommitCallbacks(execute=True):
+            site.save()
+
+    def _totals(self):
+        rows = SalesDaily.objects.all()
+        return (sum(r.count for r in rows), sum(r.revenue for r in rows), sum(r.margin for r in rows))
+
+    def test_price_change_between_sale_and_delete(self):
+        order = Order.objects.create(
+            client_name='Ana', box_type='no_light', variant='wood', status=OrderStatus.IN_PROGRESS,
+        )
+        # Entregado sin pasar por _finalize_order: no hay snapshot de precio.
+        order.status, order.finalized_at = OrderStatus.DELIVERED, timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        order.refresh_from_db()
+        self.assertEqual(order.sale_price, 20000)
+        self.assertEqual(self._totals(), (1, 20000, 20000))
+
+        self._set_prices(25000)
+        order.variant = 'black'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertEqual(self._totals(), (1, 20000, 20000))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(self._totals(), (0, 0, 0))
+
+
+class StockVariantTests(TestCase):
+
+    def test_box_variant_rows_pass_full_clean(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            BoxVariant.objects.create(code='sage_light', name='Salvia')
+        row = Stock.objects.get(variant='sage', box_type='no_light')
+        row.full_clean()
+
+
+class StockLedgerTests(TestCase):
+    """Cada cambio de stock deja su movimiento con el saldo exacto; balance_at reconstruye saldos pasados."""
+    ITEM = stock_item_key('wood', 'no_light')
+
+    def setUp(self):
+        StockSnapshot.objects.all().delete()
+        self.start = timezone.now() - timedelta(days=3)
+        self._at(0, stock_service.add_stock, 'wood', 10)
+        self._at(1, stock_service.set_stock, 'wood', 4)
+        stock_service.take_snapshots()
+        StockSnapshot.objects.update(taken_at=self.start + timedelta(days=1, hours=1))
+        self._at(2, stock_service.add_stock, 'wood', 7)
+
+    def _at(self, day, action, *args):
+        """Ejecuta ``action`` y lleva su movimiento al día ``day`` desde self.start."""
+        action(*args)
+        latest = StockMovement.objects.order_by('-id').values_list('id', flat=True)[:1]
+        StockMovement.objects.filter(id__in=list(latest)).update(created_at=self.start + timedelta(days=day))
+
+    def test_movements_record_delta_and_balance(self):
+        movements = StockMovement.objects.filter(item=self.ITEM).order_by('id')
+        self.assertEqual(list(movements.values_list('delta', 'balance_after')), [(10, 10), (-6, 4), (7, 11)])
+        self.assertEqual(Stock.objects.get(variant='wood', box_type='no_light').quantity, 11)
+
+    def test_balance_at(self):
+        cases = [(-1, 0), (0, 10), (0.5, 10), (1, 4), (1.5, 4), (2, 11), (3, 11)]
+        for offset, expected in cases:
+            # Media hora después de cada punto: antes del snapshot, entre snapshot y movimiento, etc.
+            when = self.start + timedelta(days=offset, minutes=30)
+            with self.subTest(offset=offset):
+                self.assertEqual(stock_service.balance_at(self.ITEM, when), expected)
+
+    def test_balance_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(AdminUser.objects.create_user('admin', 'admin@example.com', 'x'))
+        when = self.start + timedelta(days=1, hours=2)
+        response = client.get('/api/stock/balance/', {'at': when.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        wood = next(row for row in response.json()['stock'] if row['variant'] == 'wood')
+        self.assertEqual(wood['quantity'], 4)
+        self.assertEqual(client.get('/api/stock/balance/', {'at': 'ayer'}).status_code, 400)
+
+
+class ConsumePackagingTests(TestCase):
+    """consume_packaging: lectura bloqueada, un UPDATE y un bulk_create, sin importar cuántos ítems."""
+
+    def setUp(self):
+        cache.clear()
+        stock_service.set_packaging(PackagingStock.CAJA_CARTON, 5)
+        stock_service.set_packaging(PackagingStock.BOLSA_ECOMMERCE, 1)
+
+    def _quantities(self):
+        return dict(PackagingStock.objects.values_list('item_type', 'quantity'))
+
+    def test_query_count_is_constant(self):
+        with self.assertNumQueries(5):
+            self.assertEqual(stock_service.consume_packaging({PackagingStock.CAJA_CARTON: 1}), 1)
+        with self.assertNumQueries(5):
+            self.assertEqual(stock_service.consume_packaging_for_order(), 2)
+        self.assertEqual(self._quantities(), {PackagingStock.CAJA_CARTON: 3, PackagingStock.BOLSA_ECOMMERCE: 0})
+
+    def test_items_without_stock_are_skipped(self):
+        self.assertEqual(stock_service.consume_packaging(
+            {PackagingStock.CAJA_CARTON: 2, PackagingStock.BOLSA_ECOMMERCE: 2}), 1)
+        self.assertEqual(self._quantities(), {PackagingStock.CAJA_CARTON: 3, PackagingStock.BOLSA_ECOMMERCE: 1})
+        movements = StockMovement.objects.filter(item_kind=StockItemKind.PACKAGING, delta__lt=0)
+        self.assertEqual(list(movements.values_list('item', 'delta', 'balance_after')),
+                         [(PackagingStock.CAJA_CARTON, -2, 3)])
+
+
+class CoverageTests(TestCase):
+    """Cobertura: el GROUP BY coincide con un conteo manual por variante; se invalida con pedidos y stock."""
+    DAYS = 30
+
+    def setUp(self):
+        cache.clear()
+        coverage._caches.clear()
+        stock_service.set_stock('wood', 5)
+        stock_service.set_stock('black', 1)
+        stock_service.set_packaging(PackagingStock.CAJA_CARTON, 2)
+        now = timezone.now()
+        statuses = [OrderStatus.DRAFT, OrderStatus.IN_PROGRESS, OrderStatus.PROCESSING, OrderStatus.DELIVERED]
+        variants = [('wood', 'no_light'), ('wood_light', 'with_light'), ('black', 'no_light'), ('marble', 'no_light')]
+        for i in range(40):
+            variant, box_type = variants[i % len(variants)]
+            order = Order.objects.create(
+                client_name=f'c{i}', box_type=box_type, variant=variant, status=statuses[i % len(statuses)],
+            )
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=i * 1.7))
+
+    def _manual(self):
+        since = timezone.now() - timedelta(days=self.DAYS)
+        counts = {}
+        for order in Order.objects.all():
+            row = counts.setdefault((stock_service.stock_variant_code(order.variant), order.box_type),
+                                    {'in_progress': 0, 'processing': 0, 'recent': 0})
+            if order.status in (OrderStatus.IN_PROGRESS, OrderStatus.PROCESSING):
+                row[order.status] += 1
+            if order.created_at >= since and order.status != OrderStatus.DRAFT:
+                row['recent'] += 1
+        return counts
+
+    def test_matches_manual_count(self):
+        with self.assertNumQueries(3):
+            data = coverage.build_coverage(self.DAYS)
+        rows = {(row['variant'], row['box_type']): row for row in data['variants']}
+        stock = {(v, b): q for v, b, q in Stock.objects.values_list('variant', 'box_type', 'quantity')}
+        for key, expected in self._manual().items():
+            with self.subTest(key=key):
+                row = rows[key]
+                self.assertEqual((row['in_progress'], row['processing']), (expected['in_progress'], expected['processing']))
+                self.assertEqual(row['daily_rate'], round(expected['recent'] / self.DAYS, 3))
+                open_orders = expected['in_progress'] + expected['processing']
+                self.assertEqual(row['shortfall'], max(0, open_orders - (stock.get(key) or 0)))
+
+        pending = sum(row['in_progress'] for row in self._manual().values())
+        caja = next(p for p in data['packaging'] if p['item_type'] == PackagingStock.CAJA_CARTON)
+        self.assertEqual((caja['pending_orders'], caja['shortfall']), (pending, max(0, pending - 2)))
+
+    def _wood(self):
+        data = coverage.get_coverage(self.DAYS)
+        return next(r for r in data['variants'] if (r['variant'], r['box_type']) == ('wood', 'no_light'))
+
+    def test_cached_until_orders_or_stock_change(self):
+        before = self._wood()
+        with self.assertNumQueries(0):
+            self._wood()
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(client_name='x', box_type='no_light', variant='wood', status=OrderStatus.IN_PROGRESS)
+        self.assertEqual(self._wood()['in_progress'], before['in_progress'] + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stock_service.add_stock('wood', 100)
+        self.assertEqual(self._wood()['stock'], 105)
+
+
+class EstadisticasQueryTests(TestCase):
+    """build(): series del rollup, detalle y resumen en 3 queries, sin importar cuántas ventas haya."""
+
+    def setUp(self):
+        cache.clear()
+        _site_settings.clear()
+        get_settings()
+        self.today = timezone.localdate()
+
+    def _sell(self, count):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                Order.objects.create(
+                    client_name=f'c{i}', box_type='no_light' if i % 2 else 'with_light', variant='wood',
+                    status=OrderStatus.DELIVERED, finalized_at=now - timedelta(days=i % 20),
+                    price_snapshot={'precio_venta': 20000} if i % 3 else None,
+                    cost_snapshot={'total': 5000, 'cost_caja': 3000, 'cost_pla': 1500, 'cost_empaque': 500},
+                )
+
+    def _build(self):
+        return EstadisticasView().build(30, 12, self.today)
+
+    def test_query_count_does_not_grow_with_sales(self):
+        with self.assertNumQueries(3):
+            empty = self._build()
+        self.assertEqual(empty['summary']['cantidad_ventas'], 0)
+
+        self._sell(60)
+        with self.assertNumQueries(3):
+            data = self._build()
+        self.assertEqual(data['summary']['cantidad_ventas'], 60)
+        self.assertEqual(len(data['detail']), 60)
+        self.assertEqual(sum(d['count'] for d in data['sales_by_day']), 60)
+
+
+class EstadisticasCacheTests(TestCase):
+    """Respuesta cacheada por versión de ventas: HIT/304 sin queries, nueva al cambiar una venta."""
+    URL = '/api/estadisticas/?days=30&months=12'
+
+    def setUp(self):
+        cache.clear()
+        caches['responses'].clear()
+        _site_settings.clear()
+        get_settings()
+        self.client = APIClient()
+        self.client.force_authenticate(AdminUser.objects.create_user('admin', 'admin@example.com', 'x'))
+        self.client.delete('/api/estadisticas/cache/')
+        self.sale = self._order(OrderStatus.DELIVERED)
+        self.draft = self._order(OrderStatus.DRAFT)
+
+    def _order(self, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Order.objects.create(
+                client_name='Ana', box_type='no_light', variant='wood', status=status,
+                finalized_at=timezone.now() if status == OrderStatus.DELIVERED else None,
+                price_snapshot={'precio_venta': 20000}, sale_price=20000,
+            )
+
+    def test_hit_and_304_without_queries(self):
+        first = self.client.get(self.URL)
+        self.assertEqual((first.status_code, first['X-Cache']), (200, 'MISS'))
+        with self.assertNumQueries(0):
+            hit = self.client.get(self.URL)
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        self.assertEqual(hit.content, first.content)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/api/estadisticas/cache/').json(),
+                         {'hits': 1, 'misses': 1, 'not_modified': 1, 'hit_ratio': 0.667})
+
+    def test_sale_changes_invalidate_other_orders_do_not(self):
+        etag = self.client.get(self.URL)['ETag']
+        self.draft.client_name = 'Bea'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.draft.save()
+        self.assertEqual(self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self._order(OrderStatus.DELIVERED)
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['X-Cache']), (200, 'MISS'))
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['summary']['cantidad_ventas'], 2)
+
+
+class ExportTests(TestCase):
+    """Exportaciones por streaming (ASGI): filas ordenadas por fecha, filtros y formato."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = AdminUser.objects.create_user('admin', 'admin@example.com', 'x')
+        cls.auth = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+        sales = [
+            (5, OrderStatus.DELIVERED, 31500, 9000),
+            (1, OrderStatus.PROCESSING, 20000, 5000),
+            (2, OrderStatus.DELIVERED, 20000, 6000),
+        ]
+        for day, status, price, cost in sales:
+            Order.objects.create(
+                client_name=f'c{day}', box_type='no_light', variant='wood', status=status,
+                finalized_at=timezone.make_aware(datetime(2025, 3, day, 12)), sale_price=price, production_cost=cost,
+            )
+        Order.objects.create(client_name='borrador', box_type='no_light', variant='wood')
+        for day in (3, 1):
+            Purchase.objects.create(
+                category=PurchaseCategory.OTRO, date=date(2025, 3, day), total_cost=Decimal(100 * day),
+            )
+
+    async def _get(self, path, **params):
+        response = await AsyncClient().get(f'/api/exports/{path}', params, headers=self.auth)
+        if not response.streaming:
+            return response, None
+        self.assertTrue(response.is_async)
+        return response, b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    async def test_sales_csv(self):
+        response, body = await self._get('sales.csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="sales.csv"')
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'id,finalized_at,status,box_type,variant,sale_price,production_cost,margin')
+        # Ordenadas por finalized_at; margen = precio - costo.
+        self.assertEqual([[Decimal(v) for v in line.split(',')[5:]] for line in lines[1:]],
+                         [[20000, 5000, 15000], [20000, 6000, 14000], [31500, 9000, 22500]])
+
+        response, body = await self._get('sales.csv', **{'from': '2025-03-02', 'status': 'delivered'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="sales_from-2025-03-02.csv"')
+        self.assertEqual(len(body.splitlines()), 3)
+
+    async def test_purchases_jsonl(self):
+        _, body = await self._get('purchases.jsonl', to='2025-03-02')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([(row['date'], Decimal(row['total_cost'])) for row in rows], [('2025-03-01', 100)])
+
+    async def test_errors(self):
+        response = await AsyncClient().get('/api/exports/orders.csv')
+        self.assertEqual(response.status_code, 401)
+        for path, params in (('purchases.csv', {'status': 'delivered'}), ('sales.csv', {'status': 'draft'}),
+                             ('orders.csv', {'from': 'ayer'})):
+            response, _ = await self._get(path, **params)
+            self.assertEqual(response.status_code, 400)
+
+
+class SimulatorHistoryTests(TestCase):
+    """Una sola carga del historial para la ventana máxima; cada ``days`` es un recorte, sin más queries."""
+
+    def setUp(self):
+        cache.clear()
+        simulator._sales_history.clear()
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            for days_ago in (5, 50, 500, 5000):
+                Order.objects.create(
+                    client_name='c', box_type='no_light', variant='wood', status=OrderStatus.DELIVERED,
+                    finalized_at=now - timedelta(days=days_ago), sale_price=20000, production_cost=5000,
+                )
+
+    def test_windows_slice_one_loaded_history(self):
+        simulator.get_history(30)
+        with self.assertNumQueries(0):
+            sizes = [simulator.get_history(days).size for days in (1, 30, 365, 1000, simulator.MAX_WINDOW_DAYS)]
+        self.assertEqual(sizes, [0, 1, 2, 3, 3])
+
+
+class ConcurrentStockTests(TransactionTestCase):
+    """
+    add_stock y descuentos de finalización desde varios hilos, cada uno con su conexión a la base
+    real: los saldos finales tienen que ser exactos (sin actualizaciones perdidas ni negativos).
+    """
+    THREADS = 4
+    ADDS_PER_THREAD = 25
+    FINALIZATIONS_PER_THREAD = 10
+    PACKAGING = 30
+
+    def _run_threads(self, target, count):
+        errors = []
+        barrier = threading.Barrier(count)
+
+        def run(i):
+            try:
+                barrier.wait()
+                target(i)
+            except Exception as e:  # noqa: BLE001 - se reporta en el hilo principal
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_add_stock_and_finalizations(self):
+        for item in stock_service.PACKAGING_PER_ORDER:
+            stock_service.set_packaging(item, self.PACKAGING)
+        consumed = []
+
+        def add(i):
+            for _ in range(self.ADDS_PER_THREAD):
+                stock_service.add_stock('wood', 1)
+
+        def finalize(i):
+            for _ in range(self.FINALIZATIONS_PER_THREAD):
+                consumed.append(stock_service.consume_packaging_for_order())
+
+        self._run_threads(lambda i: (add if i % 2 else finalize)(i // 2), self.THREADS * 2)
+
+        adds = self.THREADS * self.ADDS_PER_THREAD
+        self.assertEqual(Stock.objects.get(variant='wood', box_type='no_light').quantity, adds)
+        for item in stock_service.PACKAGING_PER_ORDER:
+            self.assertEqual(PackagingStock.objects.get(item_type=item).quantity, 0)
+        # Cada finalización descuenta los dos ítems o ninguno; alcanzan exactamente PACKAGING.
+        self.assertEqual(sum(consumed), self.PACKAGING * len(stock_service.PACKAGING_PER_ORDER))
+
+        # Cada movimiento registra su propio saldo: 1..adds sin repetir.
+        balances = StockMovement.objects.filter(
+            item_kind=StockItemKind.BOX, item=stock_item_key('wood', 'no_light')
+        ).values_list('balance_after', flat=True)
+        self.assertEqual(sorted(balances), list(range(1, adds + 1)))
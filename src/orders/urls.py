@@ -1,9 +1,9 @@
-from django.urls import path, include
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 from .views import (
     OrderViewSet, ImageCropViewSet, StockViewSet,
     PackagingStockViewSet, PurchaseViewSet,
-    EstadisticasView,
+    EstadisticasView, EstadisticasCacheView, ExportView, SimulacionView, OrderDetailAsyncView, StockListAsyncView,
 )
 
 router = DefaultRouter()
@@ -15,5 +15,11 @@ router.register(r'purchases', PurchaseViewSet, basename='purchase')
 
 urlpatterns = [
     path('estadisticas/', EstadisticasView.as_view(), name='estadisticas'),
+    path('estadisticas/cache/', EstadisticasCacheView.as_view(), name='estadisticas-cache'),
+    path('estadisticas/simulacion/', SimulacionView.as_view(), name='estadisticas-simulacion'),
+    re_path(r'^exports/(?P<dataset>sales|orders|purchases)\.(?P<fmt>csv|jsonl)$', ExportView.as_view(), name='export'),
+    # Lecturas más frecuentes servidas async bajo ASGI (antes que las rutas del router).
+    path('orders/<int:pk>/', OrderDetailAsyncView.as_view(), name='order-detail-async'),
+    path('stock/', StockListAsyncView.as_view(), name='stock-list-async'),
     path('', include(router.urls)),
 ]
@@ -4,39 +4,56 @@ import logging
 import math
 import os
 import re
+import time as time_module
 import unicodedata
+import uuid
 import zipfile
+from datetime import date, datetime, time
+from decimal import Decimal
 import qrcode
 import urllib.request
 import urllib.error
 from PIL import Image, ImageOps
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from rest_framework import viewsets, status, mixins
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, JSONParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
 from django.core.files.base import ContentFile
 from django.db import transaction
-from django.http import FileResponse
-from django.db.models import Count
-from django.db.models.functions import TruncDate, TruncMonth
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 logger = logging.getLogger(__name__)
 
 from .models import (
-    Order, ImageCrop, OrderStatus, Stock, STOCK_VARIANTS, BoxType, PackagingStock,
+    Order, ImageCrop, OrderStatus, Stock, BoxType, PackagingStock, StockMovement, SalesDaily, SALE_STATUSES,
 )
 from .serializers import (
     OrderSerializer, OrderListSerializer, ImageCropSerializer, StockSerializer,
-    PackagingStockSerializer, PurchaseSerializer,
+    PackagingStockSerializer, PurchaseSerializer, StockMovementSerializer,
 )
+from . import exports, simulator, stock as stock_service
+from .coverage import DEFAULT_WINDOW_DAYS, get_coverage
+from .sales import SALES_VERSION, production_cost_expr, sale_price_expr
 from .websocket_utils import send_orders_update, send_stock_update
+from memory_box.async_views import AsyncReadView, aiterate, json_response, render_json, run_cpu
+from memory_box.response_cache import ResponseCache
+from memory_box.versioning import VersionedCache
+from config.models import ChunkedUpload
+from config.uploads import discard as discard_upload, open_assembled
+from config.signals import SITE_SETTINGS_VERSION
 from config.views import get_settings
-from expenses.views import get_cost_settings
-from expenses.models import Purchase, PurchaseCategory
+from expenses.cost_model import COST_MODEL_VERSION, get_cost_model
+from expenses.models import Purchase, PurchaseCategory, normalize_variant
 
 REQUIRED_IMAGE_COUNT = 10
 
@@ -73,107 +90,13 @@ def _normalize_crop_payload(crop_data: dict, slot: int) -> dict:
     return {'x': x, 'y': y, 'width': width, 'height': height}
 
 
-# Mapeo variant del pedido -> nombre variante para PLA (Grafito, Madera, etc.)
-ORDER_VARIANT_TO_PLA_VARIANTE = {
-    'graphite': 'Grafito',
-    'wood': 'Madera',
-    'black': 'Negro',
-    'marble': 'Mármol',
-    'graphite_light': 'Grafito',
-    'wood_light': 'Madera',
-    'black_light': 'Negro',
-    'marble_light': 'Mármol',
-}
-
-
-def _get_packaging_unit_costs():
-    """
-    Costo unitario de caja de cartón y bolsa ecommerce desde la última compra de cada tipo.
-    unit_cost = total_cost / quantity (o unit_cost del registro si está definido).
-    """
-    result = {'caja_carton': 0.0, 'bolsa_ecommerce': 0.0}
-    for category in (PurchaseCategory.CAJA_CARTON, PurchaseCategory.BOLSA_ECOMMERCE):
-        last = Purchase.objects.filter(category=category).order_by('-date', '-id').first()
-        if last and last.quantity and last.quantity > 0:
-            total = float(last.total_cost or 0)
-            if last.unit_cost is not None:
-                result[category] = float(last.unit_cost)
-            else:
-                result[category] = total / last.quantity
-    return result
-
-
 def _compute_order_cost_snapshot(order):
     """
-    Calcula el snapshot de costos del pedido con los valores actuales (referencia + PLA + empaque).
-    Se guarda al finalizar; así si después cambian precios/PLA/empaque, este pedido mantiene su costo.
-    - Sin luz: cost_pla = caja base = 63g × (precio rollo PLA/1000) según variante; cost_caja = 0 (todo el costo de caja es PLA).
-    - Con luz: cost_caja = suma de componentes de referencia; cost_pla = 0 (no entra en la fórmula).
-    - Empaque: 1 caja de cartón + 1 bolsa a costo unitario (total compra / cantidad) de la última compra.
+    Snapshot de costos del pedido con los valores actuales (referencia + PLA + empaque), desde el
+    modelo de costos compilado (expenses.cost_model). Se guarda al finalizar; así si después cambian
+    precios/PLA/empaque, este pedido mantiene su costo.
     """
-    cost_data = get_cost_settings().data or {}
-    cost_caja = 0
-    cost_pla = 0
-
-    if order.box_type == BoxType.WITH_LIGHT:
-        componentes = cost_data.get('cost_con_luz_componentes') or []
-        cost_caja = sum(
-            float(c.get('valor') or c.get('value') or 0)
-            for c in componentes
-        )
-        # Con luz: no se incluye PLA en la fórmula (solo cost_caja = componentes + empaque + troqueles).
-    else:
-        # Sin luz: toda la caja base = 63g × (precio rollo/1000); no se desglosa PLA por separado
-        variante_name = ORDER_VARIANT_TO_PLA_VARIANTE.get(
-            (order.variant or '').strip().lower(),
-            (order.variant or '').strip()
-        )
-        if variante_name:
-            pla_purchase = (
-                Purchase.objects.filter(
-                    category=PurchaseCategory.PLA_ROLL,
-                    variant__iexact=variante_name,
-                )
-                .order_by('-date', '-id')
-                .first()
-            )
-            if pla_purchase:
-                cost_per_gram = pla_purchase.pla_cost_per_gram()
-                if cost_per_gram is not None:
-                    variant_grams_map = cost_data.get('variant_grams') or {}
-                    grams = cost_data.get('grams_caja_sin_luz')
-                    if grams is None or grams == '':
-                        grams = variant_grams_map.get(variante_name)
-                    if grams is not None and grams != '':
-                        grams = float(grams)
-                    else:
-                        grams = 63  # default for no-light box
-                    if grams > 0:
-                        base_cost = float(cost_per_gram) * grams
-                        # Para sin luz el costo de la caja base es 100% PLA; guardamos en cost_pla para desglose.
-                        cost_pla = base_cost
-                        cost_caja = 0
-        # (si no hubo variante/PLA, cost_pla y cost_caja siguen en 0)
-
-    packaging_units = _get_packaging_unit_costs()
-    cost_empaque = packaging_units['caja_carton'] + packaging_units['bolsa_ecommerce']
-
-    # Troqueles: costo fijo por cajita (aplica a con luz y sin luz)
-    cost_troqueles = float(cost_data.get('cost_troqueles_por_cajita') or 0)
-
-    # Redondear hacia arriba, sin decimales (igual que en el front)
-    cost_caja_int = int(math.ceil(cost_caja))
-    cost_pla_int = int(math.ceil(cost_pla))
-    cost_empaque_int = int(math.ceil(cost_empaque))
-    cost_troqueles_int = int(math.ceil(cost_troqueles))
-    total = cost_caja_int + cost_pla_int + cost_empaque_int + cost_troqueles_int
-    return {
-        'cost_caja': cost_caja_int,
-        'cost_pla': cost_pla_int,
-        'cost_empaque': cost_empaque_int,
-        'cost_troqueles': cost_troqueles_int,
-        'total': total,
-    }
+    return get_cost_model().snapshot(order.box_type, order.variant)
 
 
 def _compute_order_price_snapshot(order):
@@ -186,6 +109,30 @@ def _compute_order_price_snapshot(order):
     return {'precio_venta': float(precio)}
 
 
+def _finalize_order(order):
+    """
+    Fecha de venta, snapshots de costo/precio y sus columnas numéricas, en un solo UPDATE
+    (no se recalculan si después cambian precios/PLA). Sin snapshot, los montos quedan en null.
+    """
+    order.finalized_at = timezone.now()
+    try:
+        order.cost_snapshot = _compute_order_cost_snapshot(order)
+        order.price_snapshot = _compute_order_price_snapshot(order)
+        order.production_cost = _snapshot_amount(order.cost_snapshot, 'total')
+        order.sale_price = _snapshot_amount(order.price_snapshot, 'precio_venta')
+        logger.info('order id=%s: cost_snapshot total=%s price_snapshot=%s', order.id, order.cost_snapshot.get('total'), order.price_snapshot.get('precio_venta'))
+    except Exception as e:
+        logger.warning('order id=%s: could not compute cost/price snapshot: %s', order.id, e)
+    order.save(update_fields=['finalized_at', 'cost_snapshot', 'price_snapshot', 'production_cost', 'sale_price'])
+
+
+def _snapshot_amount(snapshot, key):
+    value = (snapshot or {}).get(key)
+    if value is None:
+        return None
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
 def _notify_n8n_new_order(order):
     """POST to n8n webhook when order goes IN_PROGRESS (WhatsApp/Telegram). No-op if N8N_WEBHOOK_URL not set."""
     url = getattr(settings, 'N8N_WEBHOOK_URL', None)
@@ -294,6 +241,27 @@ def _notify_n8n_order_finalized(order):
         logger.exception('n8n finalized webhook error for order %s: %s', order.id, e)
 
 
+def _completed_crop_uploads(order, data):
+    """{slot: ChunkedUpload} for the upload_<i> ids sent to submit_images (unknown ids are ignored)."""
+    ids = {}
+    for i in range(REQUIRED_IMAGE_COUNT):
+        value = data.get(f'upload_{i}')
+        if value:
+            try:
+                ids[uuid.UUID(str(value))] = i
+            except ValueError:
+                continue
+    if not ids:
+        return {}
+    uploads = ChunkedUpload.objects.filter(
+        pk__in=ids,
+        order=order,
+        purpose=ChunkedUpload.PURPOSE_IMAGE_CROP,
+        status=ChunkedUpload.STATUS_COMPLETE,
+    )
+    return {ids[upload.pk]: upload for upload in uploads}
+
+
 class OrderViewSet(viewsets.ModelViewSet):
     """CRUD for orders. List/retrieve require auth; create can be AllowAny for public flow."""
     queryset = Order.objects.all()
@@ -324,40 +292,41 @@ class OrderViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         instance = serializer.instance
         old_status = instance.status
-        serializer.save()
-        new_status = instance.status
-        will_notify = old_status != OrderStatus.PROCESSING and new_status == OrderStatus.PROCESSING
-        logger.info(
-            'order perform_update id=%s old_status=%s new_status=%s will_notify_finalized=%s',
-            instance.id, old_status, new_status, will_notify,
-        )
+        filament_alert = None
+        with transaction.atomic():
+            serializer.save()
+            new_status = instance.status
+            will_notify = old_status != OrderStatus.PROCESSING and new_status == OrderStatus.PROCESSING
+            logger.info(
+                'order perform_update id=%s old_status=%s new_status=%s will_notify_finalized=%s',
+                instance.id, old_status, new_status, will_notify,
+            )
+            if will_notify:
+                # Descontar 1 caja de cartón y 1 bolsa ecommerce por pedido finalizado (un solo UPDATE).
+                consumed = stock_service.consume_packaging_for_order(order=instance)
+                if consumed < len(stock_service.PACKAGING_PER_ORDER):
+                    logger.warning('order id=%s: packaging out of stock, decremented %s of %s items',
+                                   instance.id, consumed, len(stock_service.PACKAGING_PER_ORDER))
+                else:
+                    logger.info('order id=%s: packaging decremented', instance.id)
+                # Gramos de PLA de la caja (sin luz), igual que el costo. Como en _finalize_order,
+                # un CostSettings inválido (gramos no numéricos) no impide finalizar.
+                try:
+                    filament_alert = stock_service.consume_filament_for_order(instance)
+                except Exception as e:
+                    logger.warning('order id=%s: could not decrement PLA filament: %s', instance.id, e)
+                _finalize_order(instance)
+            elif new_status in SALE_STATUSES and instance.finalized_at is None:
+                # Entregado sin pasar por finalizado: la venta se fecha igual.
+                instance.finalized_at = timezone.now()
+                instance.save(update_fields=['finalized_at'])
         if not will_notify and new_status != OrderStatus.PROCESSING:
             logger.debug('order id=%s: no finalized webhook (new_status=%s, need processing)', instance.id, new_status)
         if will_notify:
             logger.info('order id=%s: calling _notify_n8n_order_finalized', instance.id)
             _notify_n8n_order_finalized(instance)
-            # Descontar 1 caja de cartón y 1 bolsa ecommerce por pedido finalizado.
-            for item_type in (PackagingStock.CAJA_CARTON, PackagingStock.BOLSA_ECOMMERCE):
-                try:
-                    stock = PackagingStock.objects.get(item_type=item_type)
-                    if stock.quantity > 0:
-                        stock.quantity -= 1
-                        stock.save(update_fields=['quantity'])
-                        logger.info('order id=%s: packaging %s decremented to %s', instance.id, item_type, stock.quantity)
-                    else:
-                        logger.warning('order id=%s: packaging %s already 0, not decremented', instance.id, item_type)
-                except PackagingStock.DoesNotExist:
-                    pass
-            # Snapshot de costos y precio de venta (no se recalculan si después cambian precios/PLA).
-            try:
-                instance.cost_snapshot = _compute_order_cost_snapshot(instance)
-                instance.price_snapshot = _compute_order_price_snapshot(instance)
-                instance.save(update_fields=['cost_snapshot', 'price_snapshot'])
-                logger.info('order id=%s: cost_snapshot total=%s price_snapshot=%s', instance.id, instance.cost_snapshot.get('total'), instance.price_snapshot.get('precio_venta'))
-            except Exception as e:
-                logger.warning('order id=%s: could not save cost/price snapshot: %s', instance.id, e)
         send_orders_update()
-        send_stock_update()
+        send_stock_update({'filament_low': [filament_alert]} if filament_alert else None)
 
     def perform_destroy(self, instance):
         instance.delete()
@@ -405,13 +374,21 @@ class OrderViewSet(viewsets.ModelViewSet):
         """
         Submit 10 images with crop_data. Creates/updates ImageCrop records.
         Expects multipart/form-data: image_0..image_9, crop_data_0..crop_data_9 (JSON strings).
+        Instead of image_<i>, upload_<i> may carry the id of a completed image_crop chunked upload
+        for this order (settings/uploads/).
         """
         order = self.get_object()
+        if not order.accepts_images():
+            return Response(
+                {'error': f'Order is {order.status}: images can no longer be changed.'},
+                status=status.HTTP_409_CONFLICT
+            )
 
         # Validate we have all 10 images and crop_data
         images_data = []
+        uploads = _completed_crop_uploads(order, request.data)
         for i in range(REQUIRED_IMAGE_COUNT):
-            img_file = request.FILES.get(f'image_{i}')
+            img_file = request.FILES.get(f'image_{i}') or uploads.get(i)
             crop_str = request.data.get(f'crop_data_{i}')
             if not img_file:
                 return Response(
@@ -456,14 +433,19 @@ class OrderViewSet(viewsets.ModelViewSet):
                     norm = data['crop_norm']
                     x, y = norm['x'], norm['y']
                     w, h = norm['width'], norm['height']
-                    img_file.seek(0)
+                    # Chunked uploads are opened here and closed once Pillow has decoded them.
+                    source = open_assembled(img_file) if isinstance(img_file, ChunkedUpload) else img_file
                     try:
-                        img = Image.open(img_file).convert('RGB')
+                        source.seek(0)
+                        img = Image.open(source).convert('RGB')
                     except OSError as exc:
                         logger.warning('submit_images: slot %s no se pudo abrir imagen: %s', i, exc)
                         raise ValueError(
                             f'Imagen {i + 1}: archivo ilegible o formato no soportado'
                         ) from exc
+                    finally:
+                        if source is not img_file:
+                            source.close()
                     img = ImageOps.exif_transpose(img)
                     img_w, img_h = img.size
                     left = max(0, min(x, img_w - 1))
@@ -481,7 +463,7 @@ class OrderViewSet(viewsets.ModelViewSet):
                     buffer = io.BytesIO()
                     final.save(buffer, format='PNG', dpi=CROP_OUTPUT_DPI)
                     buffer.seek(0)
-                    name = getattr(img_file, 'name', f'crop_{i}.png') or f'crop_{i}.png'
+                    name = getattr(source, 'name', f'crop_{i}.png') or f'crop_{i}.png'
                     if not name.lower().endswith('.png'):
                         name = f'{name.rsplit(".", 1)[0] if "." in name else name}_crop.png'
 
@@ -497,6 +479,9 @@ class OrderViewSet(viewsets.ModelViewSet):
         except ValueError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        for upload in uploads.values():
+            discard_upload(upload)
+            upload.delete()
         logger.info('submit_images: order=%s saved %s crops', order.id, len(prepared))
         return Response(OrderSerializer(order).data)
 
@@ -582,6 +567,26 @@ class OrderViewSet(viewsets.ModelViewSet):
         )
 
 
+class OrderDetailAsyncView(AsyncReadView):
+    """
+    GET async del detalle de pedido (público: página del cliente y QR).
+    PUT/PATCH/DELETE se delegan a OrderViewSet.
+    """
+    write_view = OrderViewSet.as_view({
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    })
+
+    async def get(self, request, pk):
+        try:
+            order = await Order.objects.prefetch_related('image_crops').aget(pk=pk)
+        except Order.DoesNotExist:
+            return json_response({'detail': 'No Order matches the given query.'}, status=404)
+        data = await run_cpu(lambda: OrderSerializer(order, context={'request': request}).data)
+        return json_response(data)
+
+
 class ImageCropViewSet(viewsets.ModelViewSet):
     """CRUD for image crops associated with an order (save_crop / get_existing_crops)."""
     serializer_class = ImageCropSerializer
@@ -601,24 +606,19 @@ class ImageCropViewSet(viewsets.ModelViewSet):
         serializer.save(order_id=order_id)
 
 
-class StockViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
-    """Stock por variante (4 variantes). List requiere auth; add_stock suma cantidad."""
+class StockViewSet(viewsets.GenericViewSet):
+    """Stock por variante (STOCK_VARIANTS + BoxVariant). El listado lo sirve StockListAsyncView; add_stock suma cantidad."""
     permission_classes = [IsAuthenticated]
     serializer_class = StockSerializer
 
-    def list(self, request):
-        for v in STOCK_VARIANTS:
-            Stock.objects.get_or_create(variant=v, defaults={'quantity': 0})
-        items = Stock.objects.filter(variant__in=STOCK_VARIANTS).order_by('variant')
-        return Response(StockSerializer(items, many=True).data)
-
     @action(detail=False, methods=['post'])
     def add_stock(self, request):
         variant = request.data.get('variant')
         amount = request.data.get('amount', 0)
-        if variant not in STOCK_VARIANTS:
+        variants = stock_service.stock_variants()
+        if variant not in variants:
             return Response(
-                {'error': f'variant must be one of: {STOCK_VARIANTS}'},
+                {'error': f'variant must be one of: {variants}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         try:
@@ -627,9 +627,7 @@ class StockViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
                 return Response({'error': 'amount must be >= 0'}, status=status.HTTP_400_BAD_REQUEST)
         except (TypeError, ValueError):
             return Response({'error': 'amount must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
-        stock, _ = Stock.objects.get_or_create(variant=variant, defaults={'quantity': 0})
-        stock.quantity += amount
-        stock.save()
+        stock = stock_service.add_stock(variant, amount, user=request.user)
         send_stock_update()
         send_orders_update()
         return Response(StockSerializer(stock).data)
@@ -639,9 +637,10 @@ class StockViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
         """Fija el stock físico de una variante (reemplaza el valor actual)."""
         variant = request.data.get('variant')
         quantity = request.data.get('quantity', 0)
-        if variant not in STOCK_VARIANTS:
+        variants = stock_service.stock_variants()
+        if variant not in variants:
             return Response(
-                {'error': f'variant must be one of: {STOCK_VARIANTS}'},
+                {'error': f'variant must be one of: {variants}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         try:
@@ -650,13 +649,113 @@ class StockViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
                 return Response({'error': 'quantity must be >= 0'}, status=status.HTTP_400_BAD_REQUEST)
         except (TypeError, ValueError):
             return Response({'error': 'quantity must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
-        stock, _ = Stock.objects.get_or_create(variant=variant, defaults={'quantity': 0})
-        stock.quantity = quantity
-        stock.save()
+        stock = stock_service.set_stock(variant, quantity, user=request.user)
         send_stock_update()
         send_orders_update()
         return Response(StockSerializer(stock).data)
 
+    @action(detail=False, methods=['get'])
+    def balance(self, request):
+        """Saldo de stock y empaque a una fecha: ?at=YYYY-MM-DD (fin del día) o datetime ISO."""
+        at = request.query_params.get('at', '').strip()
+        try:
+            day = parse_date(at) if len(at) == 10 else None
+            when = timezone.make_aware(datetime.combine(day, time.max)) if day else parse_datetime(at)
+        except ValueError:
+            when = None
+        if when is None:
+            return Response({'error': 'at must be a date (YYYY-MM-DD) or ISO datetime'}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+        return Response({'at': when.isoformat(), **stock_service.balances_at(when)})
+
+    @action(detail=False, methods=['get'])
+    def coverage(self, request):
+        """
+        Cobertura por variante/tipo y de empaque: pedidos abiertos, faltante y días de cobertura
+        según el ritmo de pedidos de los últimos ?days= días (default 30, máx. 365).
+        """
+        try:
+            days = min(365, max(1, int(request.query_params.get('days', DEFAULT_WINDOW_DAYS))))
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_coverage(days))
+
+    @action(detail=False, methods=['get'])
+    def filament(self, request):
+        """Filamento PLA por variante en gramos: umbral, si está bajo y cajas sin luz que alcanzan."""
+        return Response(_filament_summary.get())
+
+    @action(detail=False, methods=['post'])
+    def set_filament(self, request):
+        """Fija los gramos de filamento de una variante PLA (y opcionalmente su low_threshold)."""
+        variant = normalize_variant(request.data.get('variant'))
+        if not variant:
+            return Response({'error': 'variant is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            grams = int(request.data.get('grams', 0))
+            if grams < 0:
+                return Response({'error': 'grams must be >= 0'}, status=status.HTTP_400_BAD_REQUEST)
+        except (TypeError, ValueError):
+            return Response({'error': 'grams must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        threshold = request.data.get('low_threshold', '')
+        if threshold not in ('', None):
+            try:
+                threshold = int(threshold)
+                if threshold < 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                return Response({'error': 'low_threshold must be an integer >= 0'}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            row = stock_service.set_filament(variant, grams, user=request.user)
+            if 'low_threshold' in request.data:
+                row.low_threshold = None if threshold in ('', None) else threshold
+                row.save(update_fields=['low_threshold'])
+        send_stock_update()
+        return Response({'variant': row.variant, 'grams': row.grams, 'low_threshold': row.low_threshold})
+
+    @action(detail=False, methods=['get'])
+    def movements(self, request):
+        """Ledger de movimientos (más recientes primero). Filtros: item, kind, order, purchase, limit (máx. 1000)."""
+        qs = StockMovement.objects.all()
+        for param in ('item', 'kind', 'order', 'purchase'):
+            value = request.query_params.get(param, '').strip()
+            if value:
+                qs = qs.filter(**{param: value})
+        try:
+            limit = min(1000, max(1, int(request.query_params.get('limit', 100))))
+        except ValueError:
+            limit = 100
+        return Response(StockMovementSerializer(qs[:limit], many=True).data)
+
+
+# Listados de stock: una query, cacheados hasta la próxima mutación (versión 'stock') y como
+# mucho STOCK_LIST_TTL segundos. Las filas ya existen (orders.stock.provision_rows).
+STOCK_LIST_TTL = 30
+
+
+def _build_stock_list():
+    return render_json(StockSerializer(Stock.objects.order_by('variant', 'box_type'), many=True).data)
+
+
+def _build_packaging_list():
+    return PackagingStockSerializer(PackagingStock.objects.all(), many=True).data
+
+
+_stock_list = VersionedCache(_build_stock_list, stock_service.STOCK_VERSION, ttl=STOCK_LIST_TTL)
+_packaging_list = VersionedCache(_build_packaging_list, stock_service.STOCK_VERSION, ttl=STOCK_LIST_TTL)
+_filament_summary = VersionedCache(
+    stock_service.filament_summary, stock_service.STOCK_VERSION, COST_MODEL_VERSION, ttl=STOCK_LIST_TTL
+)
+
+
+class StockListAsyncView(AsyncReadView):
+    """GET async de StockViewSet.list (requiere auth)."""
+    require_auth = True
+
+    async def get(self, request):
+        return HttpResponse(await _stock_list.aget(), content_type='application/json')
+
 
 class PackagingStockViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     """Stock de cajas de cartón y bolsas ecommerce. Se descuenta al finalizar pedidos."""
@@ -665,10 +764,13 @@ class PackagingStockViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     queryset = PackagingStock.objects.all()
 
     def list(self, request, *args, **kwargs):
-        # Asegurar que existan ambos tipos
-        for item_type in (PackagingStock.CAJA_CARTON, PackagingStock.BOLSA_ECOMMERCE):
-            PackagingStock.objects.get_or_create(item_type=item_type, defaults={'quantity': 0})
-        return super().list(request, *args, **kwargs)
+        return Response(_packaging_list.get())
+
+
+class PurchasePagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
 
 
 class PurchaseViewSet(
@@ -679,30 +781,65 @@ class PurchaseViewSet(
     mixins.DestroyModelMixin,
     viewsets.GenericViewSet,
 ):
-    """List, create, update and delete purchases/expenses (including PLA rolls)."""
+    """
+    List, create, update and delete purchases/expenses (including PLA rolls).
+    El listado es paginado (page, page_size) y filtra por category (lista separada por comas),
+    variant (PLA) y from/to (YYYY-MM-DD, inclusive); ``totals`` suma todo el conjunto filtrado,
+    no sólo la página. Cada filtro va por un índice: (category, date, id), (category, variant_key,
+    date, id) o (date, id).
+    """
     permission_classes = [IsAuthenticated]
     serializer_class = PurchaseSerializer
     queryset = Purchase.objects.all()
+    pagination_class = PurchasePagination
 
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action != 'list':
+            return qs
+        params = self.request.query_params
+        categories = [c for c in params.get('category', '').split(',') if c]
+        if categories:
+            if any(c not in PurchaseCategory.values for c in categories):
+                raise ValidationError({'error': f'category must be one of: {", ".join(PurchaseCategory.values)}'})
+            qs = qs.filter(category__in=categories)
+        variant = normalize_variant(params.get('variant'))
+        if variant:
+            qs = qs.filter(category=PurchaseCategory.PLA_ROLL, variant_key=variant)
+        for param, lookup in (('from', 'date__gte'), ('to', 'date__lte')):
+            value = params.get(param)
+            if value:
+                day = parse_date(value)
+                if day is None:
+                    raise ValidationError({'error': f'{param} must be a date (YYYY-MM-DD)'})
+                qs = qs.filter(**{lookup: day})
+        return qs.order_by('-date', '-id')
 
-STATUS_VENTA = [OrderStatus.PROCESSING, OrderStatus.DELIVERED]
+    def list(self, request, *args, **kwargs):
+        qs = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(qs)
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response.data['totals'] = self.totals(qs)
+        return response
 
+    def totals(self, qs):
+        """Totales del conjunto filtrado: un GROUP BY por categoría."""
+        by_category = {}
+        total = Decimal('0')
+        for row in qs.order_by().values('category').annotate(count=Count('id'), total=Sum('total_cost')):
+            amount = row['total'] or Decimal('0')
+            by_category[row['category']] = {'count': row['count'], 'total_cost': float(amount)}
+            total += amount
+        return {
+            'count': sum(row['count'] for row in by_category.values()),
+            'total_cost': float(total),
+            'by_category': by_category,
+        }
 
-def _precio_venta_for_order(order):
-    """Precio de venta: price_snapshot si existe, sino desde SiteSettings actual."""
-    if order.price_snapshot and 'precio_venta' in order.price_snapshot:
-        return float(order.price_snapshot['precio_venta'])
-    site = get_settings()
-    if order.box_type == BoxType.WITH_LIGHT:
-        return float((site.price_con_luz or 0) + (site.price_pilas or 0))
-    return float(site.price_sin_luz or 0)
 
+STATUS_VENTA = SALE_STATUSES
 
-def _costo_prod_for_order(order):
-    """Costo de producción desde cost_snapshot."""
-    if not order.cost_snapshot or 'total' not in order.cost_snapshot:
-        return 0.0
-    return float(order.cost_snapshot['total'])
+_stats_cache = ResponseCache('estadisticas', SALES_VERSION, SITE_SETTINGS_VERSION)
 
 
 class EstadisticasView(APIView):
@@ -711,76 +848,85 @@ class EstadisticasView(APIView):
     Query params: days=30, months=12.
     Devuelve sales_by_day, sales_by_month, summary (cantidad_ventas, total_ventas, total_costos),
     detail (lista de ventas con id, date, box_type, precio_venta, costo_prod, margen).
+    La fecha de venta es finalized_at (editar un pedido entregado no lo mueve de día).
+    Las series salen del rollup SalesDaily (orders.sales), así no dependen del largo del historial;
+    el detalle y el resumen, de una query por rango sobre finalized_at.
+    La respuesta se cachea por (days, months, día) y versiones 'sales'/'site_settings', con ETag/304.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         days = min(365, max(1, int(request.query_params.get('days', 30))))
         months = min(24, max(1, int(request.query_params.get('months', 12))))
+        today = timezone.now().date()
+        return _stats_cache.respond(request, (days, months, today), lambda: self.build(days, months, today))
 
-        since_date = timezone.now().date() - timezone.timedelta(days=days)
-        ventas_qs = (
-            Order.objects.filter(status__in=STATUS_VENTA, updated_at__date__gte=since_date)
-            .order_by('-updated_at')
-        )
-        ventas_list = list(ventas_qs)
+    def build(self, days, months, today):
+        since_date = today - timezone.timedelta(days=days)
+        since = timezone.make_aware(datetime.combine(since_date, time.min))
+        ventas_qs = Order.objects.filter(status__in=STATUS_VENTA, finalized_at__gte=since)
 
         # Ventas por día (últimos N días)
+        first_day = today - timezone.timedelta(days=days - 1)
         per_day = (
-            Order.objects.filter(status__in=STATUS_VENTA, updated_at__date__gte=since_date)
-            .annotate(day=TruncDate('updated_at'))
-            .values('day')
-            .annotate(count=Count('id'))
-            .order_by('day')
+            SalesDaily.objects.filter(date__gte=first_day)
+            .values('date')
+            .annotate(count=Sum('count'))
+            .order_by('date')
         )
-        day_map = {str(item['day']): item['count'] for item in per_day if item['day']}
+        day_map = {str(item['date']): item['count'] for item in per_day}
         sales_by_day = []
         for i in range(days):
-            d = timezone.now().date() - timezone.timedelta(days=days - 1 - i)
+            d = today - timezone.timedelta(days=days - 1 - i)
             key = d.isoformat()
             sales_by_day.append({'date': key, 'count': day_map.get(key, 0)})
 
         # Ventas por mes (últimos N meses)
-        per_month = (
-            Order.objects.filter(status__in=STATUS_VENTA)
-            .annotate(month=TruncMonth('updated_at'))
-            .values('month')
-            .annotate(count=Count('id'))
-            .order_by('month')
-        )
-        month_map = {}
-        for item in per_month:
-            if item['month']:
-                key = item['month'].strftime('%Y-%m')
-                month_map[key] = item['count']
-        sales_by_month = []
-        today = timezone.now().date()
+        month_keys = []
         for i in range(months):
             offset = months - 1 - i  # 0 = mes actual, 1 = hace un mes, ...
             y, m = today.year, today.month - offset
             while m <= 0:
                 m += 12
                 y -= 1
+            month_keys.append((y, m))
+        per_month = (
+            SalesDaily.objects.filter(date__gte=date(*month_keys[0], 1))
+            .annotate(month=TruncMonth('date'))
+            .values('month')
+            .annotate(count=Sum('count'))
+            .order_by('month')
+        )
+        month_map = {item['month'].strftime('%Y-%m'): item['count'] for item in per_month if item['month']}
+        sales_by_month = []
+        for y, m in month_keys:
             key = f'{y}-{m:02d}'
             sales_by_month.append({'month': key, 'count': month_map.get(key, 0)})
 
-        total_ventas = sum(_precio_venta_for_order(o) for o in ventas_list)
-        total_costos = sum(_costo_prod_for_order(o) for o in ventas_list)
-
         def _int_cost(x):
             """Valor de costo como entero (snapshot ya viene redondeado hacia arriba)."""
             v = float(x) if x is not None else 0
             return int(round(v))
 
         detail = []
-        for o in ventas_list:
-            precio = _precio_venta_for_order(o)
-            costo = _costo_prod_for_order(o)
-            snap = o.cost_snapshot or {}
+        cantidad_ventas = 0
+        total_ventas = Decimal('0')
+        total_costos = Decimal('0')
+        ventas_rows = (
+            ventas_qs
+            .annotate(precio=sale_price_expr(), costo=production_cost_expr())
+            .order_by('-finalized_at')
+            .values_list('id', 'finalized_at', 'box_type', 'precio', 'costo', 'cost_snapshot')
+        )
+        for order_id, finalized_at, box_type, precio, costo, snap in ventas_rows:
+            snap = snap or {}
+            cantidad_ventas += 1
+            total_ventas += precio
+            total_costos += costo
             detail.append({
-                'id': o.id,
-                'date': (o.updated_at or o.created_at).isoformat() if (o.updated_at or o.created_at) else None,
-                'box_type': o.box_type or '',
+                'id': order_id,
+                'date': finalized_at.isoformat() if finalized_at else None,
+                'box_type': box_type or '',
                 'precio_venta': _int_cost(precio),
                 'costo_prod': _int_cost(costo),
                 'margen': _int_cost(precio - costo),
@@ -792,13 +938,84 @@ class EstadisticasView(APIView):
                 } if snap else None,
             })
 
-        return Response({
+        return {
             'sales_by_day': sales_by_day,
             'sales_by_month': sales_by_month,
             'summary': {
-                'cantidad_ventas': len(ventas_list),
+                'cantidad_ventas': cantidad_ventas,
                 'total_ventas': _int_cost(total_ventas),
                 'total_costos': _int_cost(total_costos),
             },
             'detail': detail,
-        })
+        }
+
+
+class EstadisticasCacheView(APIView):
+    """GET: contadores del caché de estadísticas (hits, misses, not_modified, hit_ratio). DELETE: los pone en 0."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(_stats_cache.stats())
+
+    def delete(self, request):
+        _stats_cache.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SimulacionView(APIView):
+    """
+    POST: simulación de precios/costos sobre el historial de ventas (orders.simulator).
+    Body: {"days": 365, "scenarios": [{"price_sin_luz": 26000, ...}, ...]} o {"grid": {"param": [valores]}}.
+    Parámetros: price_sin_luz, price_con_luz, price_pilas, cost_con_luz, cost_empaque, cost_troqueles,
+    pla_cost_per_gram (número o {variante: número}), pla_cost_factor.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        data = request.data if isinstance(request.data, dict) else {}
+        try:
+            days = min(simulator.MAX_WINDOW_DAYS, max(1, int(data.get('days', simulator.DEFAULT_WINDOW_DAYS))))
+        except (TypeError, ValueError):
+            return Response({'detail': 'days must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        started = time_module.perf_counter()
+        try:
+            scenarios = simulator.expand_grid(data['grid']) if 'grid' in data else data.get('scenarios')
+            result = simulator.simulate(scenarios, days=days)
+        except simulator.SimulationError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        result['elapsed_ms'] = round((time_module.perf_counter() - started) * 1000, 1)
+        return Response(result)
+
+
+class ExportView(AsyncReadView):
+    """
+    GET exports/<sales|orders|purchases>.<csv|jsonl>: historial completo por streaming (orders.exports).
+    Query params: from, to (YYYY-MM-DD, inclusive) y status (lista separada por comas; no en purchases).
+    """
+    require_auth = True
+
+    async def get(self, request, dataset, fmt):
+        rows_for, with_status = exports.DATASETS[dataset]
+        filters = {}
+        for param, key in (('from', 'date_from'), ('to', 'date_to')):
+            value = request.GET.get(param)
+            if value:
+                filters[key] = parse_date(value)
+                if filters[key] is None:
+                    return json_response({'error': f'{param} must be a date (YYYY-MM-DD)'}, status=400)
+        statuses = [s for s in request.GET.get('status', '').split(',') if s]
+        if statuses:
+            if not with_status:
+                return json_response({'error': f'status filter is not supported for {dataset}'}, status=400)
+            allowed = SALE_STATUSES if dataset == 'sales' else OrderStatus.values
+            if any(s not in allowed for s in statuses):
+                return json_response({'error': f'status must be one of: {", ".join(allowed)}'}, status=400)
+            filters['statuses'] = statuses
+        columns, rows = await sync_to_async(rows_for)(**filters)
+        response = StreamingHttpResponse(
+            aiterate(exports.render(fmt, columns, rows)), content_type=exports.CONTENT_TYPES[fmt]
+        )
+        name = exports.filename(dataset, fmt, filters.get('date_from'), filters.get('date_to'))
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        response['Cache-Control'] = 'private, no-store'
+        return response
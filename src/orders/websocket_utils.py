@@ -28,8 +28,8 @@ def send_orders_update(order_id=None, client_name=None, variant=None, with_light
         pass
 
 
-def send_stock_update():
-    """Notify clients connected to ws/stock/ to reload stock and orders."""
+def send_stock_update(data=None):
+    """Notify clients connected to ws/stock/ to reload stock and orders. ``data`` carries alerts (e.g. filament_low)."""
     try:
         from channels.layers import get_channel_layer
         from asgiref.sync import async_to_sync
@@ -37,7 +37,7 @@ def send_stock_update():
         if channel_layer:
             async_to_sync(channel_layer.group_send)(
                 'stock',
-                {'type': 'stock_update', 'data': {}},
+                {'type': 'stock_update', 'data': data or {}},
             )
     except Exception:
         pass